@@ -0,0 +1 @@
+# Benchmarks (run as modules from python-backend/, e.g. python -m benchmarks.bench_rate_limiter)
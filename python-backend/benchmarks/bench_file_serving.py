@@ -0,0 +1,150 @@
+"""
+File serving benchmark: server CPU time per GB, FileResponse vs SendfileResponse
+
+    python -m benchmarks.bench_file_serving [--size-mb 256] [--requests 16] [--concurrency 4]
+
+Starts a uvicorn server (this module's `app`) that serves one test file
+through both response classes, downloads it repeatedly from each, and
+reports the server process's CPU seconds per GB sent. The server's
+pathsend/zerocopysend support is reported too; without it
+SendfileResponse uses its chunked fallback.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import aiohttp
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app():
+    from starlette.applications import Starlette
+    from starlette.responses import FileResponse, JSONResponse
+    from starlette.routing import Route
+    from file_responses import SendfileResponse, PATHSEND, ZEROCOPYSEND
+
+    path = os.environ["BENCH_FILE"]
+
+    async def file_response(request):
+        return FileResponse(path)
+
+    async def sendfile_response(request):
+        return SendfileResponse(path)
+
+    async def cpu(request):
+        extensions = request.scope.get("extensions") or {}
+        return JSONResponse({
+            "cpu_seconds": time.process_time(),
+            "pathsend": PATHSEND in extensions,
+            "zerocopysend": ZEROCOPYSEND in extensions,
+        })
+
+    return Starlette(routes=[
+        Route("/fileresponse", file_response),
+        Route("/sendfile", sendfile_response),
+        Route("/cpu", cpu),
+    ])
+
+
+if "BENCH_FILE" in os.environ:
+    app = create_app()
+
+
+async def fetch(session: aiohttp.ClientSession, url: str) -> int:
+    received = 0
+    async with session.get(url) as response:
+        response.raise_for_status()
+        async for chunk in response.content.iter_chunked(1024 * 1024):
+            received += len(chunk)
+    return received
+
+
+async def measure(base_url: str, variant: str, requests: int, concurrency: int) -> dict:
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(timeout=timeout, auto_decompress=False) as session:
+        async with session.get(f"{base_url}/cpu") as response:
+            before = await response.json()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await fetch(session, f"{base_url}/{variant}")
+
+        start = time.perf_counter()
+        received = sum(await asyncio.gather(*[one() for _ in range(requests)]))
+        elapsed = time.perf_counter() - start
+        async with session.get(f"{base_url}/cpu") as response:
+            after = await response.json()
+
+    gigabytes = received / 1e9
+    cpu_seconds = after["cpu_seconds"] - before["cpu_seconds"]
+    return {
+        "variant": variant,
+        "gb": gigabytes,
+        "seconds": elapsed,
+        "gb_per_second": gigabytes / elapsed,
+        "cpu_seconds": cpu_seconds,
+        "cpu_seconds_per_gb": cpu_seconds / gigabytes,
+        "pathsend": before["pathsend"],
+        "zerocopysend": before["zerocopysend"],
+    }
+
+
+async def wait_ready(base_url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/cpu") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("Benchmark server did not start")
+            await asyncio.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=256, help="Size of the served file")
+    parser.add_argument("--requests", type=int, default=16, help="Downloads per variant")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8190)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(prefix="bench_serve_", delete=False) as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            f.write(block)
+        path = f.name
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_file_serving:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "BENCH_FILE": path},
+    )
+    try:
+        asyncio.run(wait_ready(base_url))
+        results = [asyncio.run(measure(base_url, variant, args.requests, args.concurrency)) for variant in ("fileresponse", "sendfile")]
+    finally:
+        server.terminate()
+        server.wait()
+        os.remove(path)
+
+    print(f"server pathsend: {results[0]['pathsend']}, zerocopysend: {results[0]['zerocopysend']}")
+    print(f"{'variant':>14} {'GB':>7} {'GB/s':>7} {'CPU s':>7} {'CPU s/GB':>9}")
+    for r in results:
+        print(f"{r['variant']:>14} {r['gb']:>7.2f} {r['gb_per_second']:>7.2f} {r['cpu_seconds']:>7.2f} {r['cpu_seconds_per_gb']:>9.3f}")
+    ratio = results[1]["cpu_seconds_per_gb"] / results[0]["cpu_seconds_per_gb"]
+    print(f"sendfile CPU per GB vs FileResponse: {ratio:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
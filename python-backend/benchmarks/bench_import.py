@@ -0,0 +1,140 @@
+"""
+Worker startup benchmark: import-time breakdown and time to the first health check
+
+    python -m benchmarks.bench_import [--runs 5] [--top 15]
+
+Imports `main` under `python -X importtime` and reports the total and
+the slowest packages (self time summed per top-level package, so
+"fastapi" includes fastapi.routing, fastapi.params and so on), and
+whether yt-dlp and aiohttp were imported at all; both should be left to
+first use and the background pre-warm.
+
+Then it starts `uvicorn main:app` --runs times and measures, from process
+start, when /health and /health/ready first answer 200, and when the
+pre-warm has finished (`warming_up` false in the readiness snapshot).
+FFmpeg and FFprobe are no-op stand-ins on PATH; nothing is downloaded.
+Each figure is the median over the runs.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("yt_dlp", "aiohttp")
+
+
+def import_times(env: Dict) -> Tuple[float, Dict[str, float], set]:
+    """(total seconds, self seconds per top-level package, modules imported) for `import main`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    packages: Dict[str, float] = defaultdict(float)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        modules.add(name)
+        packages[name.split(".")[0]] += int(self_us) / 1e6
+        if name == "main":
+            total = int(cumulative_us) / 1e6
+    return total, packages, modules
+
+
+def wait_for(url: str, deadline: float, done: Callable[[Dict], bool] = lambda body: True) -> Optional[float]:
+    """Monotonic time url first answered 200 with a body done() accepts, or None at the deadline"""
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200 and done(json.load(response)):
+                    return time.monotonic()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def startup_times(env: Dict, port: int, timeout: float) -> Tuple[Optional[float], ...]:
+    """Seconds from process start to the first 200 from /health, from /health/ready, and to a finished pre-warm"""
+    start = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        health = wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        ready = wait_for(f"http://127.0.0.1:{port}/health/ready", deadline) if health else None
+        warm = wait_for(f"http://127.0.0.1:{port}/health/ready", deadline, lambda body: not body.get("warming_up")) if ready else None
+        return tuple(t - start if t else None for t in (health, ready, warm))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def make_env(work_dir: str) -> Dict:
+    bin_dir = os.path.join(work_dir, "bin")
+    os.makedirs(bin_dir)
+    for tool in ("ffmpeg", "ffprobe"):  # Only checked for at startup
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\necho "{tool} (offline stand-in)"\n')
+        os.chmod(path, 0o755)
+    env = {
+        **os.environ,
+        "PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+        "STATE_DIR": os.path.join(work_dir, "state"),
+        "READY_MIN_FREE_DISK_MB": "0",
+        "READY_SNAPSHOT_INTERVAL": "0.02",  # So the snapshot shows the end of pre-warming promptly
+    }
+    env.pop("YOUTUBE_API_KEY", None)
+    return env
+
+
+def median(values: List[Optional[float]]) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Packages to list in the import breakdown")
+    parser.add_argument("--port", type=int, default=8295)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each server")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-import-") as work_dir:
+        env = make_env(work_dir)
+
+        runs = [import_times(env) for _ in range(args.runs)]
+        total, packages, modules = min(runs, key=lambda run: run[0])
+        print(f"import main: {total * 1000:.0f} ms (best of {args.runs})\n")
+        print(f"{'package':>28} {'self ms':>9}")
+        for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"{name:>28} {seconds * 1000:>9.1f}")
+        for name in LAZY_MODULES:
+            print(f"\n{name} imported at startup: {'YES' if name in modules else 'no'}", end="")
+        print("\n")
+
+        health, ready, warm = zip(*[startup_times(env, args.port, args.timeout) for _ in range(args.runs)])
+        for label, values in (("first /health 200", health), ("first /health/ready 200", ready), ("pre-warm finished", warm)):
+            value = median(list(values))
+            print(f"{label:>28}: " + (f"{value * 1000:.0f} ms (median of {args.runs})" if value is not None else "timed out"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+End-to-end load benchmark, fully offline
+
+    python -m benchmarks.bench_load [--concurrency 8] [--requests 200] [--scenarios fetch_formats,download_mp3]
+    python -m benchmarks.bench_load --compare latest
+
+Runs the app (stubs.offline_app: yt-dlp replaced by stubs.fake_youtube)
+in a uvicorn process, with stubs/fake_ffmpeg.py as `ffmpeg` (plus a no-op
+`ffprobe`) and the Data API served by stubs.youtube_data_api. Then it
+drives each scenario at the given concurrency:
+
+    fetch_formats   POST /api/fetch-formats
+    download_mp4    POST /api/download, muxed 360p (itag 18), served from storage
+    download_mp3    POST /api/download, itag 140 converted by (fake) FFmpeg
+    search          POST /api/search, hydrated
+
+For each scenario it reports throughput, p50/p95/p99 latency, the server
+process's CPU seconds (and its FFmpeg children's), RSS, and event-loop
+lag and blocks from the server's loop monitor; --fail-on-blocking exits
+with status 1 if any request blocked the loop. Each run is saved as
+JSON under benchmarks/results/ named after the current commit; --compare
+prints the change from an earlier result file ("latest" picks the newest
+one).
+
+Every request uses a new video ID unless --videos is given, so
+fetch_formats measures cold extractions; --videos 10 cycles through ten
+IDs and mostly hits the formats cache. Extractor latency, CPU cost and
+download speed are set with --extract-ms, --extract-cpu-ms and
+--download-mbps.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+import aiohttp
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+SCENARIOS = ("fetch_formats", "download_mp4", "download_mp3", "search")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def video_url(scenario: str, index: int, videos: int) -> str:
+    n = index % videos if videos else index
+    return f"https://www.youtube.com/watch?v={(scenario[:3] + format(n, '08d'))[-11:]}"
+
+
+def scenario_request(scenario: str, index: int, videos: int, run_id: str):
+    """(path, JSON body) of the index-th request of a scenario"""
+    if scenario == "fetch_formats":
+        return "/api/fetch-formats", {"url": video_url(run_id + "f", index, videos)}
+    if scenario == "download_mp4":
+        return "/api/download", {"url": video_url(run_id + "v", index, videos), "format_id": "18", "output_format": "mp4"}
+    if scenario == "download_mp3":
+        return "/api/download", {"url": video_url(run_id + "a", index, videos), "format_id": "140", "output_format": "mp3"}
+    if scenario == "search":
+        return "/api/search", {"query": f"offline query {index % 20}", "max_results": 10, "hydrate": True}
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def process_usage(pid: int) -> Dict:
+    """CPU seconds (own and waited-for children) and RSS of a process, from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    memory = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key, value = line.split(":", 1)
+                memory[key] = int(value.split()[0]) / 1024
+    return {
+        "cpu_seconds": (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+        "children_cpu_seconds": (int(fields[13]) + int(fields[14])) / CLOCK_TICKS,
+        "rss_mb": memory.get("VmRSS", 0.0),
+        "peak_rss_mb": memory.get("VmHWM", 0.0),
+    }
+
+
+async def loop_metrics(session: aiohttp.ClientSession, base_url: str) -> Dict:
+    """Event-loop blocks and lag histogram buckets ({le: cumulative count}) from /metrics"""
+    blocks, buckets = 0.0, {}
+    async with session.get(f"{base_url}/metrics") as response:
+        for line in (await response.text()).splitlines():
+            if line.startswith("ytdl_event_loop_blocks_total "):
+                blocks = float(line.split()[1])
+            elif line.startswith("ytdl_event_loop_lag_seconds_bucket{"):
+                le = line.split('le="', 1)[1].split('"', 1)[0]
+                buckets[float(le.replace("+Inf", "inf"))] = float(line.split()[1])
+    return {"blocks": blocks, "buckets": buckets}
+
+
+def lag_percentile_ms(before: Dict, after: Dict, fraction: float) -> float:
+    """Upper bound of the lag bucket holding the given percentile of heartbeats between two scrapes"""
+    counts = sorted((le, after["buckets"][le] - before["buckets"].get(le, 0)) for le in after["buckets"])
+    if not counts or not counts[-1][1]:
+        return 0.0
+    for le, cumulative in counts:
+        if cumulative >= fraction * counts[-1][1]:
+            return le * 1000
+    return counts[-1][0] * 1000
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_scenario(base_url: str, scenario: str, args, pid: int, run_id: str) -> Dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    received = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        async def one(index: int):
+            nonlocal received
+            path, body = scenario_request(scenario, index, args.videos, run_id)
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async with session.post(base_url + path, json=body) as response:
+                        received += len(await response.read())
+                        statuses[response.status] += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        loop_before = await loop_metrics(session, base_url)
+        before = process_usage(pid)
+        start = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(args.requests)])
+        elapsed = time.perf_counter() - start
+        after = process_usage(pid)
+        loop_after = await loop_metrics(session, base_url)
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    return {
+        "scenario": scenario,
+        "requests": args.requests,
+        "ok": ok,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "seconds": elapsed,
+        "requests_per_second": ok / elapsed,
+        "mb_received": received / (1024 * 1024),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "cpu_seconds": after["cpu_seconds"] - before["cpu_seconds"],
+        "cpu_ms_per_request": (after["cpu_seconds"] - before["cpu_seconds"]) * 1000 / max(ok, 1),
+        "ffmpeg_cpu_seconds": after["children_cpu_seconds"] - before["children_cpu_seconds"],
+        "rss_mb": after["rss_mb"],
+        "peak_rss_mb": after["peak_rss_mb"],
+        "loop_blocks": int(loop_after["blocks"] - loop_before["blocks"]),
+        "loop_lag_p99_ms": lag_percentile_ms(loop_before, loop_after, 0.99),
+    }
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up")
+            await asyncio.sleep(0.1)
+
+
+def git_info() -> Dict:
+    def git(*command) -> str:
+        result = subprocess.run(["git", *command], cwd=BACKEND_DIR, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else ""
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "subject": git("log", "-1", "--format=%s"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def start_servers(args, work_dir: str):
+    """Data API stub and the offline app, on args.port + 1 and args.port"""
+    bin_dir = os.path.join(work_dir, "bin")
+    os.makedirs(bin_dir)
+    ffmpeg = os.path.join(bin_dir, "ffmpeg")
+    with open(ffmpeg, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(BACKEND_DIR, "stubs", "fake_ffmpeg.py")}" "$@"\n')
+    os.chmod(ffmpeg, 0o755)
+    ffprobe = os.path.join(bin_dir, "ffprobe")  # Only checked for, never run by the converter
+    with open(ffprobe, "w") as f:
+        f.write('#!/bin/sh\necho "ffprobe (offline stand-in)"\n')
+    os.chmod(ffprobe, 0o755)
+
+    api_port = args.port + 1
+    api = subprocess.Popen(
+        [sys.executable, "-m", "stubs.youtube_data_api", "--port", str(api_port), "--latency-ms", str(args.api_latency_ms)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+    )
+    env = {
+        **os.environ,
+        "PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+        "YOUTUBE_API_KEY": "stub",
+        "YOUTUBE_API_BASE_URL": f"http://127.0.0.1:{api_port}/youtube/v3",
+        "RATE_LIMIT_ENABLED": "false",
+        # Everything the app writes stays in work_dir, away from a dev server or another run
+        "STATE_DIR": os.path.join(work_dir, "state"),
+        "TEMP_DOWNLOAD_DIR": os.path.join(work_dir, "downloads"),
+        "SCRATCH_DIR": os.path.join(work_dir, "scratch"),
+        "FAKE_EXTRACT_MS": str(args.extract_ms),
+        "FAKE_EXTRACT_CPU_MS": str(args.extract_cpu_ms),
+        "FAKE_DOWNLOAD_MBPS": str(args.download_mbps),
+        "FAKE_FFMPEG_CPU_MS_PER_MB": str(args.ffmpeg_cpu_ms_per_mb),
+    }
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "stubs.offline_app:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    return api, app
+
+
+def load_result(path: str) -> Optional[Dict]:
+    if path == "latest":
+        saved = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")), key=os.path.getmtime)
+        if not saved:
+            print("No saved results to compare with")
+            return None
+        path = saved[-1]
+    with open(path) as f:
+        result = json.load(f)
+    result["path"] = path
+    return result
+
+
+def print_report(result: Dict, baseline: Optional[Dict]):
+    print(f"commit {result['git']['commit']}{' (dirty)' if result['git']['dirty'] else ''}, "
+          f"concurrency {result['params']['concurrency']}, {result['params']['requests']} requests per scenario")
+    print(f"{'scenario':>14} {'ok':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'CPU ms/req':>11} {'ffmpeg s':>9} {'RSS MB':>7} {'peak MB':>8} {'lag p99':>8} {'blocks':>7}")
+    for r in result["scenarios"]:
+        print(f"{r['scenario']:>14} {r['ok']:>5} {r['requests_per_second']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['cpu_ms_per_request']:>11.2f} {r['ffmpeg_cpu_seconds']:>9.2f} {r['rss_mb']:>7.1f} {r['peak_rss_mb']:>8.1f} {r['loop_lag_p99_ms']:>8.0f} {r['loop_blocks']:>7}")
+        failures = {status: count for status, count in r["statuses"].items() if status != "200"}
+        if failures:
+            print(f"{'':>14} non-200: {failures}")
+
+    if baseline is None:
+        return
+    print(f"\nchange vs {baseline['git']['commit']} ({os.path.basename(baseline['path'])}):")
+    before = {r["scenario"]: r for r in baseline["scenarios"]}
+    print(f"{'scenario':>14} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'CPU/req':>8} {'RSS':>8}")
+    for r in result["scenarios"]:
+        old = before.get(r["scenario"])
+        if old is None:
+            continue
+
+        def change(key):
+            return f"{(r[key] / old[key] - 1) * 100:+.0f}%" if old[key] else "n/a"
+        print(f"{r['scenario']:>14} {change('requests_per_second'):>8} {change('p50_ms'):>8} {change('p95_ms'):>8} "
+              f"{change('p99_ms'):>8} {change('cpu_ms_per_request'):>8} {change('rss_mb'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run, in order")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--videos", type=int, default=0, help="Cycle through this many video IDs (0: a new ID per request)")
+    parser.add_argument("--extract-ms", type=float, default=150, help="Fake extractor wall time per extraction")
+    parser.add_argument("--extract-cpu-ms", type=float, default=15, help="Fake extractor CPU time per extraction")
+    parser.add_argument("--download-mbps", type=float, default=0, help="Fake download throughput (0: unthrottled)")
+    parser.add_argument("--ffmpeg-cpu-ms-per-mb", type=float, default=0, help="Fake FFmpeg CPU time per input MB")
+    parser.add_argument("--api-latency-ms", type=float, default=20, help="Data API stub latency")
+    parser.add_argument("--port", type=int, default=8290, help="App port; the Data API stub uses the next one")
+    parser.add_argument("--compare", help="Earlier result file to compare with, or 'latest'")
+    parser.add_argument("--fail-on-blocking", action="store_true", help="Exit with status 1 if any scenario blocked the event loop")
+    parser.add_argument("--no-save", action="store_true", help="Don't save this run under benchmarks/results/")
+    parser.add_argument("--verbose", action="store_true", help="Show the server's log output")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    baseline = load_result(args.compare) if args.compare else None
+
+    work_dir = tempfile.mkdtemp(prefix="bench_load_")
+    api, app = start_servers(args, work_dir)
+    base_url = f"http://127.0.0.1:{args.port}"
+    run_id = format(int(time.time()) % 1000, "03d")  # Fresh video IDs per run, even against a warm server
+    try:
+        asyncio.run(wait_ready(f"http://127.0.0.1:{args.port + 1}/stats"))
+        asyncio.run(wait_ready(f"{base_url}/health"))
+        results = [asyncio.run(run_scenario(base_url, scenario, args, app.pid, run_id)) for scenario in scenarios]
+    finally:
+        app.terminate()
+        api.terminate()
+        app.wait()
+        api.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    result = {
+        "git": git_info(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("compare", "no_save", "verbose", "fail_on_blocking")},
+        "scenarios": results,
+    }
+    print_report(result, baseline)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{result['git']['commit']}{'-dirty' if result['git']['dirty'] else ''}.json"
+        path = os.path.join(RESULTS_DIR, name)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved {os.path.relpath(path, BACKEND_DIR)}")
+
+    blocked = [r["scenario"] for r in results if r["loop_blocks"]]
+    if blocked:
+        print(f"\nEvent loop blocked during: {', '.join(blocked)} (the server log has the blocking stacks; run with --verbose)")
+        if args.fail_on_blocking:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Microbenchmarks for the pure-Python helpers on every request's path
+
+    python -m benchmarks.bench_micro                 # run and compare with the stored baseline
+    python -m benchmarks.bench_micro --check         # exit 1 if anything regressed
+    python -m benchmarks.bench_micro --save-baseline # store this run as the new baseline
+    python -m benchmarks.bench_micro --filter sanitize
+
+Reports the time per operation (the best of --repeat runs, each at least
+--min-time seconds long) and the peak memory one operation allocates, as
+traced by tracemalloc. Inputs come from benchmarks.fixtures: an 80-format
+yt-dlp dump, Unicode-heavy titles and the URL shapes users paste.
+
+The baseline (benchmarks/micro_baseline.json) is only comparable on the
+machine and Python version that recorded it; re-record it with
+--save-baseline after changing either. --check fails when an operation is
+slower than the baseline by more than --tolerance (default 25%) in two
+runs, or allocates that much more memory.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+from pydantic import ValidationError
+from benchmarks.fixtures import UNICODE_TITLES, YOUTUBE_URLS, youtube_formats
+from json_responses import dumps
+from middleware.rate_limiting import RateLimiter, parse_rate
+from schemas import DownloadRequest, FetchFormatsRequest
+from services.yt_dlp_service import YtDlpService
+from utils import extract_video_id, sanitize_filename
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "micro_baseline.json")
+INVALID_URLS = ["https://vimeo.com/76979871", "not a url at all", "https://www.youtube.com/embed/dQw4w9WgXcQ"]
+
+
+# Each benchmark returns (fn, ops): fn() performs `ops` operations
+def bench_process_formats() -> Tuple[Callable, int]:
+    formats = youtube_formats(80)
+    return lambda: YtDlpService._process_formats(formats), 1
+
+
+def bench_fetch_formats_response() -> Tuple[Callable, int]:
+    """Everything /api/fetch-formats does with an extraction result: records, content, JSON body"""
+    formats = youtube_formats(80)
+
+    def run():
+        data = {'video_id': 'dQw4w9WgXcQ', 'title': UNICODE_TITLES[0], 'duration': 634,
+                'thumbnail': 'https://i.ytimg.com/vi/dQw4w9WgXcQ/maxresdefault.jpg',
+                'formats': YtDlpService._process_formats(formats),
+                'download_url': YOUTUBE_URLS[0]}
+        dumps(YtDlpService.response_content(data))
+    return run, 1
+
+
+def bench_sanitize_filename() -> Tuple[Callable, int]:
+    titles = UNICODE_TITLES
+
+    def run():
+        for title in titles:
+            sanitize_filename(title)
+    return run, len(titles)
+
+
+def bench_extract_video_id() -> Tuple[Callable, int]:
+    urls = YOUTUBE_URLS
+
+    def run():
+        for url in urls:
+            extract_video_id(url)
+    return run, len(urls)
+
+
+def bench_validate_fetch_request() -> Tuple[Callable, int]:
+    urls = YOUTUBE_URLS[:4] + INVALID_URLS  # Rejections are part of the real mix
+
+    def run():
+        for url in urls:
+            try:
+                FetchFormatsRequest(url=url)
+            except ValidationError:
+                pass
+    return run, len(urls)
+
+
+def bench_validate_download_request() -> Tuple[Callable, int]:
+    bodies = [
+        {"url": YOUTUBE_URLS[0], "format_id": "140", "output_format": "mp3"},
+        {"url": YOUTUBE_URLS[2], "format_id": "137+140", "output_format": "MP4"},
+        {"url": YOUTUBE_URLS[3], "format_id": "18", "output_format": "mp4"},
+        {"url": INVALID_URLS[0], "format_id": "18", "output_format": "mp4"},
+    ]
+
+    def run():
+        for body in bodies:
+            try:
+                DownloadRequest(**body)
+            except ValidationError:
+                pass
+    return run, len(bodies)
+
+
+def bench_rate_limiter() -> Tuple[Callable, int]:
+    limiter = RateLimiter()
+    capacity, period = parse_rate("30/10m")
+    keys = [f"10.0.{i >> 8 & 255}.{i & 255}|fetch" for i in range(10_000)]
+    for key in keys:
+        limiter.is_allowed(key, capacity, period)
+    sample = keys[::7][:1000]
+    is_allowed = limiter.is_allowed
+
+    def run():
+        for key in sample:
+            is_allowed(key, capacity, period)
+    return run, len(sample)
+
+
+BENCHMARKS: Dict[str, Callable[[], Tuple[Callable, int]]] = {
+    "process_formats_80": bench_process_formats,
+    "fetch_formats_response_80": bench_fetch_formats_response,
+    "sanitize_filename": bench_sanitize_filename,
+    "extract_video_id": bench_extract_video_id,
+    "validate_fetch_request": bench_validate_fetch_request,
+    "validate_download_request": bench_validate_download_request,
+    "rate_limiter_is_allowed": bench_rate_limiter,
+}
+
+
+def time_per_op(fn: Callable, ops: int, min_time: float, repeat: int) -> float:
+    """Best nanoseconds per operation over `repeat` runs of at least min_time seconds each"""
+    fn()  # Warm up caches (re, pydantic) before timing
+    loops = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9:
+            break
+        loops *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        gc.collect()
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter_ns() - start)
+    return best / (loops * ops)
+
+
+def peak_bytes_per_op(fn: Callable, ops: int) -> float:
+    """Peak traced memory while running fn once, per operation"""
+    fn()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - before) / ops
+
+
+def run(names: List[str], min_time: float, repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for name in names:
+        fn, ops = BENCHMARKS[name]()
+        results[name] = {
+            "ns_per_op": time_per_op(fn, ops, min_time, repeat),
+            "peak_bytes_per_op": peak_bytes_per_op(fn, ops),
+        }
+    return results
+
+
+def environment() -> Dict:
+    return {"python": platform.python_version(), "machine": platform.machine(), "processor": platform.processor() or platform.node()}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Print results next to the baseline; returns the names that regressed"""
+    recorded = baseline.get("results", {})
+    regressed = []
+    print(f"{'benchmark':>26} {'ns/op':>10} {'base':>10} {'change':>8} {'peak B/op':>10} {'base':>10} {'change':>8}")
+    for name, r in results.items():
+        old = recorded.get(name)
+        if old is None:
+            print(f"{name:>26} {r['ns_per_op']:>10.0f} {'-':>10} {'new':>8} {r['peak_bytes_per_op']:>10.0f} {'-':>10} {'new':>8}")
+            continue
+        time_change = r["ns_per_op"] / old["ns_per_op"] - 1
+        # Small absolute slack: a few stray bytes must not fail a zero-allocation benchmark
+        memory_limit = old["peak_bytes_per_op"] * (1 + tolerance) + 64
+        memory_change = r["peak_bytes_per_op"] / old["peak_bytes_per_op"] - 1 if old["peak_bytes_per_op"] else 0.0
+        flag = ""
+        if time_change > tolerance or r["peak_bytes_per_op"] > memory_limit:
+            regressed.append(name)
+            flag = "  REGRESSED"
+        print(f"{name:>26} {r['ns_per_op']:>10.0f} {old['ns_per_op']:>10.0f} {time_change * 100:>+7.0f}% "
+              f"{r['peak_bytes_per_op']:>10.0f} {old['peak_bytes_per_op']:>10.0f} {memory_change * 100:>+7.0f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if any benchmark regressed")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown or memory growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if not names:
+        parser.error(f"no benchmark matches {args.filter!r}")
+    results = run(names, args.min_time, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != environment():
+            print(f"note: baseline was recorded on {baseline.get('environment')}, this is {environment()}")
+    regressed = compare(results, baseline, args.tolerance)
+    if regressed and not args.save_baseline:
+        # A noisy neighbour can slow one run down; only a repeatable slowdown counts
+        print(f"\nRe-running {', '.join(regressed)} to confirm")
+        for name, rerun in run(regressed, args.min_time, args.repeat).items():
+            results[name]["ns_per_op"] = min(results[name]["ns_per_op"], rerun["ns_per_op"])
+        regressed = compare({name: results[name] for name in regressed}, baseline, args.tolerance)
+
+    if args.save_baseline:
+        # Keep baseline entries for benchmarks this run skipped (--filter)
+        merged = {**baseline.get("results", {}), **results}
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": environment(), "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nSaved baseline to {args.baseline}")
+    elif regressed:
+        print(f"\n{len(regressed)} regressed beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Rate limiter benchmark: per-check cost as the number of distinct clients grows
+
+    python -m benchmarks.bench_rate_limiter [--clients 100000] [--checks 500000]
+
+A token-bucket check should cost the same with 1k or 100k active clients,
+and the number of tracked keys must never exceed the configured cap.
+"""
+
+import argparse
+import random
+import time
+from middleware.rate_limiting import RateLimiter, parse_rate
+
+
+def run(clients: int, checks: int, max_keys: int) -> dict:
+    limiter = RateLimiter(max_keys=max_keys)
+    capacity, period = parse_rate("30/10m")
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}|fetch" for i in range(clients)]
+
+    # Warm up: every client has a bucket
+    for key in keys:
+        limiter.is_allowed(key, capacity, period)
+
+    sample = [random.choice(keys) for _ in range(checks)]
+    is_allowed = limiter.is_allowed
+    start = time.perf_counter_ns()
+    for key in sample:
+        is_allowed(key, capacity, period)
+    elapsed = time.perf_counter_ns() - start
+    return {"clients": clients, "ns_per_check": elapsed / checks, "tracked_keys": len(limiter)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100_000, help="Largest number of distinct clients")
+    parser.add_argument("--checks", type=int, default=500_000)
+    parser.add_argument("--max-keys", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'clients':>10} {'ns/check':>10} {'tracked keys':>14}")
+    counts = sorted({c for c in (1_000, 10_000, args.clients) if c <= args.clients})
+    results = [run(c, args.checks, args.max_keys) for c in counts]
+    for r in results:
+        print(f"{r['clients']:>10} {r['ns_per_check']:>10.0f} {r['tracked_keys']:>14}")
+    ratio = results[-1]["ns_per_check"] / results[0]["ns_per_check"]
+    print(f"cost ratio {results[-1]['clients']} vs {results[0]['clients']} clients: {ratio:.2f}x")
@@ -0,0 +1,176 @@
+"""
+Realistic inputs for the benchmarks: yt-dlp format dumps, titles and URLs
+
+youtube_formats() builds a format list shaped like `yt-dlp -J` output for
+a 4K HDR upload: storyboards, DRC and ultralow audio, HLS and DASH video
+in H.264, VP9 and AV1 (SDR and HDR), and the muxed 360p format, with
+the per-format fields yt-dlp fills in (headers, downloader options,
+fragments for storyboards).
+"""
+
+from typing import Dict, List
+
+# (format_id, ext, vcodec, acodec, height, fps, kbps, protocol, note)
+_FORMATS = [
+    ("sb3", "mhtml", "none", "none", 27, 0.5, 0, "mhtml", "storyboard"),
+    ("sb2", "mhtml", "none", "none", 45, 0.5, 0, "mhtml", "storyboard"),
+    ("sb1", "mhtml", "none", "none", 90, 0.5, 0, "mhtml", "storyboard"),
+    ("sb0", "mhtml", "none", "none", 180, 0.5, 0, "mhtml", "storyboard"),
+    ("599", "m4a", "none", "mp4a.40.5", None, None, 31, "https", "ultralow"),
+    ("600", "webm", "none", "opus", None, None, 35, "https", "ultralow"),
+    ("139-drc", "m4a", "none", "mp4a.40.5", None, None, 49, "https", "low, DRC"),
+    ("139", "m4a", "none", "mp4a.40.5", None, None, 49, "https", "low"),
+    ("249-drc", "webm", "none", "opus", None, None, 53, "https", "low, DRC"),
+    ("249", "webm", "none", "opus", None, None, 53, "https", "low"),
+    ("250-drc", "webm", "none", "opus", None, None, 70, "https", "low, DRC"),
+    ("250", "webm", "none", "opus", None, None, 70, "https", "low"),
+    ("140-drc", "m4a", "none", "mp4a.40.2", None, None, 130, "https", "medium, DRC"),
+    ("140", "m4a", "none", "mp4a.40.2", None, None, 130, "https", "medium"),
+    ("251-drc", "webm", "none", "opus", None, None, 135, "https", "medium, DRC"),
+    ("251", "webm", "none", "opus", None, None, 135, "https", "medium"),
+    ("256", "m4a", "none", "mp4a.40.5", None, None, 192, "https", "high, 5.1"),
+    ("258", "m4a", "none", "mp4a.40.2", None, None, 384, "https", "high, 5.1"),
+    ("91", "mp4", "avc1.4D400C", "mp4a.40.5", 144, 30, 290, "m3u8_native", ""),
+    ("92", "mp4", "avc1.4D4015", "mp4a.40.5", 240, 30, 546, "m3u8_native", ""),
+    ("93", "mp4", "avc1.4D401E", "mp4a.40.2", 360, 30, 1209, "m3u8_native", ""),
+    ("94", "mp4", "avc1.4D401F", "mp4a.40.2", 480, 30, 1568, "m3u8_native", ""),
+    ("95", "mp4", "avc1.4D401F", "mp4a.40.2", 720, 30, 2969, "m3u8_native", ""),
+    ("96", "mp4", "avc1.640028", "mp4a.40.2", 1080, 30, 5420, "m3u8_native", ""),
+    ("269", "mp4", "avc1.4D400C", "none", 144, 30, 160, "m3u8_native", ""),
+    ("229", "mp4", "avc1.4D4015", "none", 240, 30, 300, "m3u8_native", ""),
+    ("230", "mp4", "avc1.4D401E", "none", 360, 30, 700, "m3u8_native", ""),
+    ("231", "mp4", "avc1.4D401F", "none", 480, 30, 1100, "m3u8_native", ""),
+    ("232", "mp4", "avc1.4D401F", "none", 720, 30, 2300, "m3u8_native", ""),
+    ("270", "mp4", "avc1.640028", "none", 1080, 30, 4500, "m3u8_native", ""),
+    ("311", "mp4", "avc1.4D4020", "none", 720, 60, 3700, "m3u8_native", ""),
+    ("312", "mp4", "avc1.64002A", "none", 1080, 60, 6200, "m3u8_native", ""),
+    ("603", "mp4", "vp09.00.11.08", "none", 144, 30, 150, "m3u8_native", ""),
+    ("604", "mp4", "vp09.00.20.08", "none", 240, 30, 280, "m3u8_native", ""),
+    ("605", "mp4", "vp09.00.21.08", "none", 360, 30, 550, "m3u8_native", ""),
+    ("606", "mp4", "vp09.00.30.08", "none", 480, 30, 900, "m3u8_native", ""),
+    ("609", "mp4", "vp09.00.31.08", "none", 720, 30, 1700, "m3u8_native", ""),
+    ("614", "mp4", "vp09.00.40.08", "none", 1080, 30, 3000, "m3u8_native", ""),
+    ("616", "mp4", "vp09.00.40.08", "none", 1080, 30, 5200, "m3u8_native", "Premium"),
+    ("617", "mp4", "vp09.00.41.08", "none", 1080, 60, 5700, "m3u8_native", ""),
+    ("18", "mp4", "avc1.42001E", "mp4a.40.2", 360, 30, 520, "https", "360p"),
+    ("22", "mp4", "avc1.64001F", "mp4a.40.2", 720, 30, 1100, "https", "720p"),
+    ("160", "mp4", "avc1.4d400c", "none", 144, 30, 80, "https", "144p"),
+    ("278", "webm", "vp9", "none", 144, 30, 90, "https", "144p"),
+    ("394", "mp4", "av01.0.00M.08", "none", 144, 30, 70, "https", "144p"),
+    ("133", "mp4", "avc1.4d4015", "none", 240, 30, 180, "https", "240p"),
+    ("242", "webm", "vp9", "none", 240, 30, 200, "https", "240p"),
+    ("395", "mp4", "av01.0.00M.08", "none", 240, 30, 150, "https", "240p"),
+    ("134", "mp4", "avc1.4d401e", "none", 360, 30, 400, "https", "360p"),
+    ("243", "webm", "vp9", "none", 360, 30, 380, "https", "360p"),
+    ("396", "mp4", "av01.0.01M.08", "none", 360, 30, 300, "https", "360p"),
+    ("135", "mp4", "avc1.4d401f", "none", 480, 30, 750, "https", "480p"),
+    ("244", "webm", "vp9", "none", 480, 30, 700, "https", "480p"),
+    ("397", "mp4", "av01.0.04M.08", "none", 480, 30, 550, "https", "480p"),
+    ("136", "mp4", "avc1.4d401f", "none", 720, 30, 1500, "https", "720p"),
+    ("247", "webm", "vp9", "none", 720, 30, 1400, "https", "720p"),
+    ("398", "mp4", "av01.0.05M.08", "none", 720, 30, 1100, "https", "720p"),
+    ("298", "mp4", "avc1.4d4020", "none", 720, 60, 2600, "https", "720p60"),
+    ("302", "webm", "vp9", "none", 720, 60, 2400, "https", "720p60"),
+    ("137", "mp4", "avc1.640028", "none", 1080, 30, 3000, "https", "1080p"),
+    ("248", "webm", "vp9", "none", 1080, 30, 2700, "https", "1080p"),
+    ("399", "mp4", "av01.0.08M.08", "none", 1080, 30, 2000, "https", "1080p"),
+    ("299", "mp4", "avc1.64002a", "none", 1080, 60, 5200, "https", "1080p60"),
+    ("303", "webm", "vp9", "none", 1080, 60, 4600, "https", "1080p60"),
+    ("400", "mp4", "av01.0.12M.08", "none", 1440, 60, 8000, "https", "1440p60"),
+    ("308", "webm", "vp9", "none", 1440, 60, 9500, "https", "1440p60"),
+    ("401", "mp4", "av01.0.12M.08", "none", 2160, 60, 17000, "https", "2160p60"),
+    ("315", "webm", "vp9", "none", 2160, 60, 21000, "https", "2160p60"),
+    ("694", "mp4", "av01.0.00M.10.0.110.09.16.09.0", "none", 144, 60, 120, "https", "144p60 HDR"),
+    ("330", "webm", "vp09.02.10.10.01.09.16.09.01", "none", 144, 60, 150, "https", "144p60 HDR"),
+    ("695", "mp4", "av01.0.00M.10.0.110.09.16.09.0", "none", 240, 60, 250, "https", "240p60 HDR"),
+    ("331", "webm", "vp09.02.10.10.01.09.16.09.01", "none", 240, 60, 300, "https", "240p60 HDR"),
+    ("696", "mp4", "av01.0.04M.10.0.110.09.16.09.0", "none", 360, 60, 500, "https", "360p60 HDR"),
+    ("332", "webm", "vp09.02.21.10.01.09.16.09.01", "none", 360, 60, 600, "https", "360p60 HDR"),
+    ("697", "mp4", "av01.0.05M.10.0.110.09.16.09.0", "none", 480, 60, 900, "https", "480p60 HDR"),
+    ("333", "webm", "vp09.02.30.10.01.09.16.09.01", "none", 480, 60, 1100, "https", "480p60 HDR"),
+    ("698", "mp4", "av01.0.08M.10.0.110.09.16.09.0", "none", 720, 60, 2000, "https", "720p60 HDR"),
+    ("334", "webm", "vp09.02.31.10.01.09.16.09.01", "none", 720, 60, 2600, "https", "720p60 HDR"),
+    ("699", "mp4", "av01.0.09M.10.0.110.09.16.09.0", "none", 1080, 60, 3800, "https", "1080p60 HDR"),
+    ("335", "webm", "vp09.02.40.10.01.09.16.09.01", "none", 1080, 60, 4800, "https", "1080p60 HDR"),
+]
+
+_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-us,en;q=0.5",
+    "Sec-Fetch-Mode": "navigate",
+}
+
+
+def youtube_formats(count: int = 80, duration: int = 634, video_id: str = "dQw4w9WgXcQ") -> List[Dict]:
+    """The first `count` (at most 80) formats of a yt-dlp dump, as yt-dlp orders them"""
+    formats = []
+    for format_id, ext, vcodec, acodec, height, fps, kbps, protocol, note in _FORMATS[:count]:
+        fmt = {
+            "format_id": format_id,
+            "format_note": note,
+            "ext": ext,
+            "protocol": protocol,
+            "vcodec": vcodec,
+            "acodec": acodec,
+            "url": f"https://rr3---sn-4g5lznes.googlevideo.com/videoplayback?expire=1700000000&ei=abc&ip=203.0.113.7&id=o-{video_id}&itag={format_id}&source=youtube&requiressl=yes&mime=video%2F{ext}&dur={duration}.000&lmt=1690000000000000&sig=AJfQdSswRQIhAO{format_id}",
+            "http_headers": dict(_HEADERS),
+            "audio_ext": ext if vcodec == "none" else "none",
+            "video_ext": "none" if vcodec == "none" else ext,
+            "resolution": "audio only" if height is None else f"{height * 16 // 9}x{height}",
+            "dynamic_range": "HDR10" if "HDR" in note else ("SDR" if height else None),
+            "source_preference": -1 if protocol == "m3u8_native" else 1,
+            "has_drm": False,
+            "quality": float(height or kbps) / 100,
+            "language": "en" if acodec != "none" else None,
+            "format": f"{format_id} - {note or protocol}",
+        }
+        if ext == "mhtml":
+            fmt["fragments"] = [{"url": f"https://i.ytimg.com/sb/{video_id}/storyboard3_L{format_id[2:]}/M{i}.jpg", "duration": 100.0} for i in range(7)]
+        if height:
+            fmt.update(height=height, width=height * 16 // 9, fps=fps, aspect_ratio=1.78)
+        if acodec != "none":
+            fmt.update(asr=48000 if acodec == "opus" else 44100, audio_channels=6 if "5.1" in note else 2)
+        if kbps:
+            fmt["tbr"] = kbps
+            if vcodec == "none":
+                fmt["abr"] = kbps
+            elif acodec == "none":
+                fmt["vbr"] = kbps
+            if protocol == "https":
+                fmt["filesize"] = kbps * 125 * duration
+                fmt["container"] = f"{ext}_dash"
+                fmt["downloader_options"] = {"http_chunk_size": 10485760}
+            else:
+                fmt["filesize_approx"] = kbps * 125 * duration
+        formats.append(fmt)
+    return formats
+
+
+# Titles as they come back from YouTube: emoji, CJK, RTL, combining marks, typographic punctuation
+UNICODE_TITLES = [
+    "Rick Astley - Never Gonna Give You Up (Official Music Video)",
+    "【MV】YOASOBI「アイドル」(Idol) Official Music Video",
+    "BTS (방탄소년단) 'Dynamite' Official MV",
+    "Beyoncé – “Halo” (Live at Wembley) • 4K Remaster…",
+    "Motörhead — Ace of Spades | Live @ Hammersmith 1981 °°°",
+    "عمرو دياب - تملي معاك | Amr Diab - Tamally Maak",
+    "Ленинград — В Питере пить / Leningrad — V Pitere pit'",
+    "🔥🔥 LOFI HIP HOP RADIO 📚 beats to relax/study to 🎧 24/7 🔥🔥",
+    "Café del Mar: Ibiza Sunset Chill 🌅 — Vol. 23 (Mixed by José Padilla)",
+    "Zoë Keating: \"Lost\" <live> at Ça Va? — part 1/3 * extended *",
+    "ज़िन्दगी ना मिलेगी दोबारा | Full Song | Hrithik Roshan",
+    "周杰倫 Jay Chou【告白氣球 Love Confession】Official MV",
+    "Ñandú & Pingüino — niños jugando en la nieve ❄️ (4K HDR 60fps)",
+    "I spent 100 days in Minecraft Hardcore... here's what happened",
+    "A" * 150 + " — extended mix with a title far longer than any filesystem likes " + "Ω" * 40,
+]
+
+YOUTUBE_URLS = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtube.com/watch?v=dQw4w9WgXcQ&list=PLFgquLnL59alCl_2TQvOiD5Vgm1hCaGSI&index=3",
+    "https://youtu.be/dQw4w9WgXcQ?si=Jk2aB3cD4eF5gH6i",
+    "https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=42s",
+    "https://www.youtube.com/embed/dQw4w9WgXcQ?autoplay=1",
+    "www.youtube.com/watch?v=dQw4w9WgXcQ&feature=share",
+]
@@ -1,10 +1,11 @@
 import logging
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from dotenv import load_dotenv
 import os
 from pathlib import Path
 import tempfile
 import shutil
+from typing import Optional
 
 load_dotenv()
 
@@ -57,61 +58,173 @@ class Settings:
         
         return origins
     
-    @property
+    @cached_property
     def ALLOWED_ORIGINS(self):
-        """Dynamic allowed origins property"""
+        """Allowed origins, resolved (including the host lookup) on first use"""
         return self.get_allowed_origins()
     
     # Rate limiting
-    RATE_LIMIT_FETCH = "30/10m"  # 30 requests per 10 minutes
-    RATE_LIMIT_DOWNLOAD = "5/10m"  # 5 requests per 10 minutes
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    RATE_LIMIT_FETCH = os.getenv("RATE_LIMIT_FETCH", "30/10m")  # 30 requests per 10 minutes
+    RATE_LIMIT_DOWNLOAD = os.getenv("RATE_LIMIT_DOWNLOAD", "5/10m")  # 5 requests per 10 minutes
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # Hard cap on tracked clients
+    # Proxies (comma-separated IPs/CIDRs) whose X-Forwarded-For is believed; include cluster peers when routing.
+    # Empty trusts none: clients are keyed by the connecting address.
+    TRUSTED_PROXIES = [p.strip() for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()]
+    
+    # Cost-weighted limiting: 1 unit ~ 1 MB moved; transcoding adds CPU-seconds
+    RATE_LIMIT_COST = os.getenv("RATE_LIMIT_COST", "3000/1h")  # Cost units per client
+    COST_UNITS_PER_CPU_SECOND = 2.0
+    COST_TRANSCODE_CPU_PER_MEDIA_SECOND = 0.02  # MP3 encoding runs at roughly 50x realtime
+    COST_DEFAULT_MB_PER_SECOND = 0.25  # Assumed size when a format has no size estimate
+    COST_DEFAULT_MB = 50.0  # Assumed size when duration is unknown too
     
     # Timeouts
     REQUEST_TIMEOUT = 30
     DOWNLOAD_TIMEOUT = 3600  # 1 hour
     
     # File handling - Use OS-appropriate temp directory
-    TEMP_DOWNLOAD_DIR = os.path.join(tempfile.gettempdir(), "youtube_downloads")
+    TEMP_DOWNLOAD_DIR = os.getenv("TEMP_DOWNLOAD_DIR", os.path.join(tempfile.gettempdir(), "youtube_downloads"))
     MAX_FILE_SIZE_MB = 5000  # 5GB max
+    DOWNLOAD_FILE_TTL = 300  # Seconds a finished download or artifact stays servable
+    DOWNLOAD_DIR_HIGH_WATER_MB = float(os.getenv("DOWNLOAD_DIR_HIGH_WATER_MB", "4096"))  # Evict oldest files above this
+    DOWNLOAD_DIR_LOW_WATER_MB = float(os.getenv("DOWNLOAD_DIR_LOW_WATER_MB", "3072"))  # ... down to this
+    ORPHAN_FILE_AGE = 900  # Seconds before an untracked leftover file (crashed job) is reclaimed
+    
+    # Storage tiers, chosen from the estimated output size
+    SCRATCH_DIR = os.getenv("SCRATCH_DIR", "")  # Fast scratch for intermediates; default /dev/shm if writable
+    MEMORY_TIER_MAX_MB = float(os.getenv("MEMORY_TIER_MAX_MB", "16"))  # Outputs up to this are served from memory
+    MEMORY_TIER_CAP_MB = float(os.getenv("MEMORY_TIER_CAP_MB", "256"))  # Total memory for in-memory outputs
+    SCRATCH_TIER_MAX_MB = float(os.getenv("SCRATCH_TIER_MAX_MB", "512"))  # Larger jobs keep intermediates on disk
+    
+    # Small persistent state (quota ledger, snapshots) - kept outside the cleaned download dir
+    STATE_DIR = os.getenv("STATE_DIR", os.path.join(tempfile.gettempdir(), "youtube_downloader_state"))
+    
+    # Shared state for rate limits, caches, jobs and artifacts: memory (per process), sqlite (per host) or redis
+    STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+    STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", os.path.join(STATE_DIR, "state.db"))
+    STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+    STATE_REDIS_POOL_SIZE = int(os.getenv("STATE_REDIS_POOL_SIZE", "10"))
+    JOB_STATE_TTL = 3600  # Seconds finished job records stay visible
+    
+    # Request tracing: Server-Timing headers, JSON trace logs and optional OTLP/HTTP JSON export
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))  # Fraction of requests traced; 0 disables tracing
+    # Let an incoming traceparent's sampled flag decide (only when every caller is trusted, e.g. internal services)
+    TRACE_TRUST_PARENT: bool = os.getenv("TRACE_TRUST_PARENT", "False").lower() == "true"
+    TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")  # e.g. http://localhost:4318/v1/traces
+    TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "ytdownload-api")
+    TRACE_EXPORT_INTERVAL = 5.0  # Seconds between OTLP export batches
+    TRACE_EXPORT_BATCH_SPANS = 512
+    
+    # Event-loop monitor: lag sampled every interval; a stall over the threshold logs the blocking stack
+    LOOP_MONITOR_INTERVAL = 0.1  # Seconds between heartbeats
+    LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "200"))
+    LOOP_BLOCK_LOG_INTERVAL = float(os.getenv("LOOP_BLOCK_LOG_INTERVAL", "60"))  # Seconds between reports of the same stack
+    
+    # Readiness (/health/ready): not ready above any of these, judged from a snapshot refreshed every interval
+    READY_SNAPSHOT_INTERVAL = float(os.getenv("READY_SNAPSHOT_INTERVAL", "1"))  # Seconds
+    READY_MAX_QUEUE_DEPTH = int(os.getenv("READY_MAX_QUEUE_DEPTH", "16"))  # Work items waiting for an executor thread
+    READY_MAX_FFMPEG_PROCESSES = int(os.getenv("READY_MAX_FFMPEG_PROCESSES", str((os.cpu_count() or 1) * 2)))
+    READY_MIN_FREE_DISK_MB = int(os.getenv("READY_MIN_FREE_DISK_MB", "1024"))  # Free space for TEMP_DOWNLOAD_DIR
+    READY_MAX_LOOP_LAG_MS = float(os.getenv("READY_MAX_LOOP_LAG_MS", "250"))
+    
+    # Sampling profiler: /api/admin/profile and ?profile=1 on fetch-formats/download, with this token in X-Admin-Token.
+    # Empty disables both, and the per-request hook is not installed.
+    PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+    PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))  # Time between stack samples
+    PROFILER_MAX_SECONDS = 60  # Longest run /api/admin/profile accepts
+    
+    # Consistent-hash routing across instances: off, proxy or redirect (needs CLUSTER_SELF_URL and CLUSTER_PEERS)
+    CLUSTER_ROUTING = os.getenv("CLUSTER_ROUTING", "off").lower()
+    CLUSTER_SELF_URL = os.getenv("CLUSTER_SELF_URL", "")  # This node's URL as the peers see it
+    CLUSTER_PEERS = [p.strip() for p in os.getenv("CLUSTER_PEERS", "").split(",") if p.strip()]
+    CLUSTER_VNODES = int(os.getenv("CLUSTER_VNODES", "128"))  # Ring points per node
+    CLUSTER_LOAD_FACTOR = float(os.getenv("CLUSTER_LOAD_FACTOR", "1.25"))  # Max node load vs. average
+    CLUSTER_HEALTH_INTERVAL = float(os.getenv("CLUSTER_HEALTH_INTERVAL", "5"))
+    CLUSTER_HEALTH_FAILURES = 2  # Consecutive failed checks before a peer leaves the ring
+    
+    # Bundles (multi-video ZIP downloads)
+    BUNDLE_CONCURRENCY = int(os.getenv("BUNDLE_CONCURRENCY", "3"))  # Items produced/buffered at once
+    BUNDLE_MAX_ITEMS = 50
+    
+    # YouTube Data API client
+    YOUTUBE_API_BASE_URL = os.getenv("YOUTUBE_API_BASE_URL", "https://www.googleapis.com/youtube/v3")
+    YOUTUBE_API_TIMEOUT = float(os.getenv("YOUTUBE_API_TIMEOUT", "10"))  # Seconds per attempt
+    YOUTUBE_API_MAX_RETRIES = int(os.getenv("YOUTUBE_API_MAX_RETRIES", "2"))
+    YOUTUBE_API_BACKOFF_BASE = 0.25  # Seconds
+    YOUTUBE_API_BACKOFF_MAX = 4.0  # Seconds
+    YOUTUBE_API_POOL_SIZE = int(os.getenv("YOUTUBE_API_POOL_SIZE", "20"))  # Keep-alive connections
+    
+    # YouTube Data API quota
+    YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))  # Data API units per day
+    QUOTA_CONSERVE_FRACTION = 0.25  # Below this remaining fraction: no revalidation, cached hydration only
+    QUOTA_CACHE_ONLY_FRACTION = 0.05  # Below this remaining fraction: searches served from cache only
+    
+    # Search result cache
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+    SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))  # Seconds, with a full quota budget
+    SEARCH_CACHE_MAX_TTL = 86400.0  # Longest TTL as the budget runs out
+    SEARCH_CACHE_STALE_FACTOR = 2.0  # Stale-while-revalidate window as a multiple of the TTL
+    DETAILS_CACHE_MAX_ENTRIES = int(os.getenv("DETAILS_CACHE_MAX_ENTRIES", "20000"))
+    DETAILS_CACHE_TTL = float(os.getenv("DETAILS_CACHE_TTL", "3600"))  # Seconds
+    DETAILS_CACHE_STALE_TTL = 86400.0  # Seconds expired details are still served while the API may not be called
+    
+    # Search suggestions
+    SUGGEST_MAX_TERMS = int(os.getenv("SUGGEST_MAX_TERMS", "50000"))
+    SUGGEST_SNAPSHOT_INTERVAL = 300  # Seconds between snapshots to STATE_DIR
+    
+    # Format metadata cache and prefetch
+    FORMATS_CACHE_MAX_ENTRIES = int(os.getenv("FORMATS_CACHE_MAX_ENTRIES", "2000"))
+    FORMATS_CACHE_TTL = float(os.getenv("FORMATS_CACHE_TTL", "1800"))  # Seconds
+    PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "False").lower() == "true"
+    PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "3"))  # Results warmed per search
+    PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))  # Dedicated prefetch threads
+    PREFETCH_BUSY_THRESHOLD = int(os.getenv("PREFETCH_BUSY_THRESHOLD", "4"))  # Skip prefetch at this many user jobs
     
     # yt-dlp options
     YDL_SOCKET_TIMEOUT = 30
     
+    # Startup: yt-dlp and aiohttp are imported on first use; pre-warming loads them in the background after startup
+    PREWARM_ENABLED: bool = os.getenv("PREWARM_ENABLED", "True").lower() == "true"
+    
     def __init__(self):
-        """Initialize settings and find FFmpeg"""
+        """Initialize settings"""
         # FFmpeg
         self.FFMPEG_QUALITY = "192"  # Default bitrate for MP3
-        
+    
+    @cached_property
+    def FFMPEG_PATH(self) -> Optional[str]:
+        """FFmpeg executable, searched for once on first use"""
         # Try multiple known FFmpeg locations
         ffmpeg_candidates = [
+            os.getenv("FFMPEG_PATH", ""),
             r"C:\Users\SAKETH\.vscode\extensions\video-binaries\ffmpeg.exe",
             r"C:\Program Files\BlueStacks_nxt\ffmpeg.exe",
             "ffmpeg",  # Fallback to PATH
         ]
         
-        self.FFMPEG_PATH = None
-        self.FFPROBE_PATH = None
-        
-        # Find ffmpeg
-        for candidate in ffmpeg_candidates:
+        for candidate in filter(None, ffmpeg_candidates):
             try:
                 # Try direct path first
                 if os.path.exists(candidate):
-                    self.FFMPEG_PATH = candidate
-                    break
-                # Try using shutil.which for PATH
-                elif shutil.which(candidate):
-                    self.FFMPEG_PATH = candidate
-                    break
+                    return candidate
+                # Resolve through PATH once, so later checks are a plain stat
+                found = shutil.which(candidate)
+                if found:
+                    return found
             except Exception:
                 continue
-        
-        # Find ffprobe
+        return None
+    
+    @cached_property
+    def FFPROBE_PATH(self) -> Optional[str]:
+        """FFprobe next to the FFmpeg found, or on PATH"""
         if self.FFMPEG_PATH:
-            if os.path.exists(self.FFMPEG_PATH):
-                ffprobe_candidate = self.FFMPEG_PATH.replace('ffmpeg.exe', 'ffprobe.exe')
-                if os.path.exists(ffprobe_candidate):
-                    self.FFPROBE_PATH = ffprobe_candidate
+            directory, name = os.path.split(self.FFMPEG_PATH)
+            ffprobe_candidate = os.path.join(directory, name.replace('ffmpeg', 'ffprobe'))
+            if os.path.exists(ffprobe_candidate):
+                return ffprobe_candidate
+        return shutil.which('ffprobe')
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -0,0 +1,31 @@
+"""JSON responses for hot endpoints, encoded once and with orjson when it is installed"""
+
+import json
+from typing import Any
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder gives the same JSON, slower
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, as Starlette's JSONResponse renders it"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse for content that is already plain JSON types
+
+    Returned from a handler, a Response skips FastAPI's response_model
+    validation and its jsonable_encoder pass; the model still documents
+    the endpoint in OpenAPI. The content must therefore have exactly the
+    model's fields already.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,19 +1,44 @@
 import logging
 import os
 import asyncio
-from typing import Optional
-from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+import hmac
+import shutil
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple
+from fastapi import FastAPI, Request, Response, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
 from config import get_settings
-from schemas import FetchFormatsRequest, FetchFormatsResponse, DownloadRequest, ErrorResponse, FormatInfo, SearchRequest, SearchResponse, VideoDetailsResponse
+from schemas import FetchFormatsRequest, FetchFormatsResponse, DownloadRequest, ErrorResponse, SearchRequest, SearchResponse, VideoDetailsResponse, TranscodeRequest, TranscodeResponse, ArtifactInfo, BundleRequest, VideoDetailsBatchResponse
 from services import YtDlpService, ConverterService
+from services.artifact_store import ArtifactStore
+from services.bundle_service import BundleService
 from services.youtube_search_service import YouTubeSearchService
-from middleware.rate_limiting import rate_limiter
-from utils import sanitize_filename, ensure_temp_dir, extract_video_id, cleanup_temp_files
+from services.quota_ledger import quota_ledger
+from services.suggestion_index import suggestion_index
+from services.prefetcher import prefetcher
+from services.state_backend import StateBackendError, state_backend
+from services.job_store import JobStore
+from services.single_flight import SingleFlight, Flight, tail_file
+from services.janitor import janitor
+from services.storage import storage, MemoryFile, MEMORY, DISK
+from file_responses import SendfileResponse
+from json_responses import FastJSONResponse
+from middleware.rate_limiting import RateLimitMiddleware, parse_rate, cost_limiter, get_client_ip
+from middleware.routing import ConsistentHashRoutingMiddleware, cluster_router
+from middleware.metrics import MetricsMiddleware
+from services.metrics import registry, errors_total
+from middleware.tracing import TracingMiddleware
+from middleware.profiling import RequestProfilingMiddleware
+from services.profiler import profilers
+from services.health import CountingExecutor, ReadinessMonitor
+from services.loop_monitor import loop_monitor
+from services.prewarm import prewarmer
+from services.tracing import exporter as trace_exporter
+from utils import sanitize_filename, ensure_temp_dir, extract_video_id
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -21,14 +46,20 @@ settings = get_settings()
 # Ensure temp directory exists
 ensure_temp_dir()
 
+# The loop's default executor (installed at startup), counting its work for the readiness probe
+default_executor = CountingExecutor(min(32, (os.cpu_count() or 1) + 4), thread_name_prefix="asyncio")
+ffmpeg_available = False  # Checked once at startup
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage app lifespan"""
     logger.info("YouTube Downloader API starting...")
+    asyncio.get_running_loop().set_default_executor(default_executor)
     
-    # Validate FFmpeg on startup
-    ffmpeg_valid, ffmpeg_msg = await ConverterService.validate_ffmpeg()
-    if not ffmpeg_valid:
+    # Validate FFmpeg on startup; readiness reports this result rather than re-checking
+    global ffmpeg_available
+    ffmpeg_available, ffmpeg_msg = await ConverterService.validate_ffmpeg()
+    if not ffmpeg_available:
         logger.warning(f"FFmpeg validation: {ffmpeg_msg}")
     
     # Initialize YouTube API
@@ -39,10 +70,33 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("YOUTUBE_API_KEY not set - YouTube search features will be unavailable")
     
+    # Warm the suggestion index from the last snapshot
+    suggestion_index.load()
+    snapshot_task = asyncio.create_task(snapshot_suggestions_periodically())
+    
+    cluster_router.start()
+    await janitor.start()
+    await loop_monitor.start()
+    if settings.PREWARM_ENABLED:
+        prewarmer.start()
+    await readiness.start()
+    
     yield
     
     logger.info("YouTube Downloader API shutting down...")
-    cleanup_temp_files()
+    snapshot_task.cancel()
+    prefetcher.shutdown()
+    suggestion_index.save()
+    await YouTubeSearchService.close()
+    await state_backend.close()
+    await cluster_router.close()
+    await quota_ledger.flush()
+    await janitor.close()
+    await prewarmer.close()
+    await readiness.close()
+    await loop_monitor.close()
+    if trace_exporter is not None:
+        await trace_exporter.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -52,6 +106,41 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-request profiling (?profile=1 with the admin token). Innermost, so the profile covers
+# the handler and its response; not installed at all without PROFILER_TOKEN.
+if settings.PROFILER_TOKEN:
+    app.add_middleware(
+        RequestProfilingMiddleware,
+        token=settings.PROFILER_TOKEN,
+        interval=settings.PROFILER_INTERVAL_MS / 1000,
+        paths={"/api/fetch-formats", "/api/download"},
+    )
+
+# Per-client rate limiting (token buckets); downloads, bundles and transcodes share one budget.
+# Added before CORS so that 429 responses still carry CORS headers.
+if settings.RATE_LIMIT_ENABLED:
+    fetch_limit = parse_rate(settings.RATE_LIMIT_FETCH)
+    download_limit = parse_rate(settings.RATE_LIMIT_DOWNLOAD)
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules={
+            "/api/fetch-formats": ("fetch", *fetch_limit),
+            "/api/download": ("download", *download_limit),
+            "/api/download-bundle": ("download", *download_limit),
+            "/api/transcode": ("download", *download_limit),
+        }
+    )
+
+# Route per-video work to the video's owner node. Outside the rate limiter, so a
+# request is only counted by the node that serves it; inside CORS.
+if cluster_router.enabled:
+    app.add_middleware(
+        ConsistentHashRoutingMiddleware,
+        router=cluster_router,
+        paths={"/api/fetch-formats", "/api/download", "/api/transcode"},
+        mode=settings.CLUSTER_ROUTING,
+    )
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -59,19 +148,72 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Job-Id", "X-Served-By", "X-Trace-Id", "Server-Timing"],
 )
 
-# Health check endpoint
+# Sampled request tracing. Not installed at all when sampling is off, so untraced
+# deployments pay nothing; a sampled traceparent header needs it installed too.
+if settings.TRACE_SAMPLE_RATE > 0 or trace_exporter is not None:
+    app.add_middleware(TracingMiddleware)
+
+# Outermost, so rate-limited and proxied requests are measured too
+app.add_middleware(MetricsMiddleware, serve_endpoints={"download", "download_bundle", "get_artifact"})
+
+def free_disk_mb(path: str) -> Optional[float]:
+    try:
+        return shutil.disk_usage(path).free / (1024 * 1024)
+    except OSError:
+        return None
+
+async def collect_readiness() -> Dict:
+    """Load snapshot for the readiness probe, refreshed in the background"""
+    return {
+        "ffmpeg_available": ffmpeg_available,
+        "warming_up": prewarmer.pending,
+        "executor_queue_depth": default_executor.queue_depth,
+        "executor_free_slots": default_executor.free_slots,
+        "ytdlp_jobs": YtDlpService.active_jobs,
+        "ffmpeg_processes": ConverterService.active_processes,
+        "shared_downloads": download_flights.snapshot()["in_flight"],
+        "temp_disk_free_mb": free_disk_mb(settings.TEMP_DOWNLOAD_DIR),
+        "scratch_free_mb": free_disk_mb(storage.scratch_root),
+        "memory_tier_mb": round(storage.memory_used / (1024 * 1024), 1),
+        "cache_entries": {name: stats["entries"] for name, stats in cache_lookups().items()},
+    }
+
+readiness = ReadinessMonitor(collect_readiness, settings.READY_SNAPSHOT_INTERVAL)
+
+# Health check endpoints
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    ffmpeg_valid, _ = await ConverterService.validate_ffmpeg()
+    """Health check endpoint (from the cached readiness snapshot)"""
+    status = readiness.status()
     return {
         "status": "healthy",
+        "ready": status["ready"],
         "version": settings.API_VERSION,
-        "ffmpeg_available": ffmpeg_valid
+        "ffmpeg_available": status.get("ffmpeg_available"),
+        "state_backend": settings.STATE_BACKEND
     }
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and its event loop answers"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_probe():
+    """
+    Readiness probe: 200 when the node can take more work, 503 when it should be routed around
+    
+    Reports executor queue depth and free slots, running FFmpeg processes,
+    free temp disk, event loop lag and cache sizes from a snapshot taken at
+    most READY_SNAPSHOT_INTERVAL seconds ago; `reasons` lists every
+    threshold exceeded.
+    """
+    status = readiness.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 # Main API endpoints
 @app.post("/api/fetch-formats", response_model=FetchFormatsResponse)
 async def fetch_formats(request: Request, body: FetchFormatsRequest):
@@ -81,24 +223,6 @@ async def fetch_formats(request: Request, body: FetchFormatsRequest):
     Returns all available video and audio formats with metadata
     """
     try:
-        # Rate limiting disabled for development
-        # is_allowed, rate_info = rate_limiter.is_allowed(
-        #     request,
-        #     "/api/fetch-formats",
-        #     max_requests=30,
-        #     window_minutes=10
-        # )
-        # 
-        # if not is_allowed:
-        #     raise HTTPException(
-        #         status_code=429,
-        #         detail={
-        #             "error": "Rate limit exceeded",
-        #             "retry_after_seconds": rate_info["retry_after_seconds"],
-        #             "reset_time": rate_info["reset_time"]
-        #         }
-        #     )
-        
         logger.info(f"Fetching formats for: {body.url}")
         
         # Fetch formats using yt-dlp
@@ -115,39 +239,11 @@ async def fetch_formats(request: Request, body: FetchFormatsRequest):
             else:
                 raise HTTPException(status_code=400, detail={"error": error_msg, "error_code": error_code})
         
-        # Build response
-        formats = [
-            FormatInfo(
-                format_id=f.format_id,
-                format_name=f.format_name,
-                ext=f.ext,
-                height=f.height,
-                width=f.width,
-                fps=f.fps,
-                vcodec=f.vcodec,
-                acodec=f.acodec,
-                audio_bitrate=f.audio_bitrate,
-                video_bitrate=f.video_bitrate,
-                estimated_size_mb=f.estimated_size_mb,
-                is_dash=f.is_dash,
-            )
-            for f in data.get('formats', [])
-        ]
-        
-        response = FetchFormatsResponse(
-            success=True,
-            video_id=data.get('video_id'),
-            title=data.get('title'),
-            duration=data.get('duration'),
-            thumbnail=data.get('thumbnail'),
-            formats=formats,
-            age_restricted=data.get('age_restricted', False),
-            is_live=data.get('is_live', False),
-            download_url=data.get('download_url'),
-        )
+        # Encoded directly: the records already have the response model's shape
+        content = YtDlpService.response_content(data)
         
-        logger.info(f"Successfully fetched {len(formats)} formats")
-        return response
+        logger.info(f"Successfully fetched {len(content['formats'])} formats")
+        return FastJSONResponse(content)
     
     except HTTPException:
         raise
@@ -158,136 +254,506 @@ async def fetch_formats(request: Request, body: FetchFormatsRequest):
             detail={"error": f"Server error: {str(e)}", "error_code": "SERVER_ERROR"}
         )
 
+def estimated_size_mb(data: Dict, format_id: str) -> float:
+    """Estimated download size of format_id ("137+140" counts both parts); 0 when unknown"""
+    sizes = {f.format_id: f.estimated_size_mb for f in data.get('formats', [])}
+    return sum(sizes.get(part) or 0 for part in format_id.split('+'))
+
+def estimate_job_cost(data: Dict, format_id: str, transcode: bool) -> float:
+    """Cost units for downloading format_id"""
+    return cost_limiter.estimate(estimated_size_mb(data, format_id), data.get('duration'), transcode)
+
+async def reserve_job_cost(client: Optional[str], estimated: float) -> Optional[Dict]:
+    """
+    Reserve a job's estimated cost against the client's budget
+    
+    Returns the reservation (None when cost limiting is off). Raises a 429
+    HTTPException when the client has used up its budget.
+    """
+    if not client or not settings.RATE_LIMIT_ENABLED:
+        return None
+    allowed, info, reservation = await cost_limiter.reserve(client, estimated)
+    if not allowed:
+        logger.warning(f"Cost limit exceeded for {client} (job estimate {estimated:.0f} units)")
+        raise HTTPException(
+            status_code=429,
+            detail={"error": "Download budget exceeded, please try again later", "error_code": "COST_LIMITED"},
+            headers={"Retry-After": str(info["retry_after_seconds"])}
+        )
+    return reservation
+
+def job_error(exc: HTTPException) -> str:
+    """Error message recorded for a failed job"""
+    return exc.detail.get("error") if isinstance(exc.detail, dict) else str(exc.detail)
+
+async def produce_download(
+    url: str,
+    format_id: str,
+    output_format: str,
+    temp_dir: str,
+    client: Optional[str] = None,
+    on_download_path: Optional[Callable[[str], None]] = None,
+    scratch_dir: Optional[str] = None,
+    stats: Optional[Dict] = None
+) -> Tuple[str, str, str]:
+    """
+    Download a format and convert it if needed
+    
+    When `client` is given, the job's estimated cost is charged to that
+    client up front and reconciled with the measured bytes and CPU time,
+    which are also recorded in `stats` when given. `on_download_path` is
+    told where yt-dlp is about to write. Intermediate files go to
+    `scratch_dir` (default: `temp_dir`).
+    Returns: (output_path, content_type, video_title). Raises HTTPException on failure.
+    """
+    # Fetch video info to get title
+    success, data = await YtDlpService.fetch_formats(url)
+    if not success:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "Could not fetch video information", "error_code": "FETCH_ERROR"}
+        )
+    
+    reservation = await reserve_job_cost(client, estimate_job_cost(data, format_id, output_format == "mp3"))
+    stats = stats if stats is not None else {}
+    stats.update(bytes=0, cpu_seconds=0.0)
+    try:
+        return await _produce_download(url, format_id, output_format, temp_dir, scratch_dir or temp_dir, data, stats, on_download_path)
+    finally:
+        await cost_limiter.reconcile(reservation, cost_limiter.actual(stats['bytes'], stats['cpu_seconds']))
+
+async def _produce_download(
+    url: str,
+    format_id: str,
+    output_format: str,
+    temp_dir: str,
+    scratch_dir: str,
+    data: Dict,
+    stats: Dict,
+    on_download_path: Optional[Callable[[str], None]]
+) -> Tuple[str, str, str]:
+    video_title = data.get('title', 'download')
+    sanitized_title = sanitize_filename(video_title)
+    
+    # Determine output path
+    if output_format == "mp4":
+        output_filename = f"{sanitized_title}.mp4"
+        output_path = os.path.join(temp_dir, output_filename)
+        temp_path = output_path
+        content_type = "video/mp4"
+    else:  # mp3
+        # Download audio first
+        m4a_filename = f"{sanitized_title}_temp.m4a"
+        m4a_path = os.path.join(scratch_dir, m4a_filename)
+        mp3_filename = f"{sanitized_title}.mp3"
+        output_path = os.path.join(temp_dir, mp3_filename)
+        temp_path = m4a_path
+        content_type = "audio/mpeg"
+    
+    # Download the format
+    logger.info(f"Downloading format {format_id} to {temp_path}")
+    if on_download_path:
+        on_download_path(temp_path)
+    success, msg = await YtDlpService.download_format(url, format_id, temp_path, stats=stats)
+    
+    if not success:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": f"Download failed: {msg}", "error_code": "DOWNLOAD_ERROR"}
+        )
+    
+    if not os.path.exists(temp_path):
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "Download file was not created", "error_code": "FILE_NOT_CREATED"}
+        )
+    stats['bytes'] = os.path.getsize(temp_path)
+    
+    # Convert to MP3 if needed
+    if output_format == "mp3":
+        logger.info(f"Converting to MP3: {output_path}")
+        success, msg = await ConverterService.convert_to_mp3(temp_path, output_path, stats=stats)
+        
+        if not success:
+            # Cleanup temp file
+            try:
+                os.remove(temp_path)
+            except:
+                pass
+            raise HTTPException(
+                status_code=500,
+                detail={"error": f"Conversion failed: {msg}", "error_code": "CONVERSION_ERROR"}
+            )
+        
+        # Cleanup temp M4A file
+        try:
+            os.remove(temp_path)
+        except:
+            pass
+    
+    # Check final file exists
+    if not os.path.exists(output_path):
+        raise HTTPException(
+            status_code=500,
+            detail={"error": "Output file was not created", "error_code": "OUTPUT_NOT_CREATED"}
+        )
+    
+    return output_path, content_type, video_title
+
+# Identical downloads in progress, keyed by (video, format, output format)
+download_flights = SingleFlight()
+FLIGHT_HANDOFF_SECONDS = 5.0  # A finished output is held this long for its waiters to pick it up
+
+def attachment_headers(filename: str, job_id: str) -> Dict[str, str]:
+    """Content-Disposition with the filename encoded per RFC 5987, plus the job ID"""
+    from urllib.parse import quote
+    filename_param = quote(filename.encode('utf-8'), safe='')
+    return {"Content-Disposition": f'attachment; filename*=UTF-8\'\'{filename_param}', "X-Job-Id": job_id}
+
+def can_tail(format_id: str, output_format: str) -> bool:
+    """Whether the file yt-dlp writes is the final file (single format, no merge or conversion)"""
+    return output_format == "mp4" and '+' not in format_id
+
+async def run_shared_download(flight: Flight, body: DownloadRequest) -> Tuple[str, str, str, Optional[MemoryFile]]:
+    """
+    Produce a download in its own job directories, so concurrent jobs never share paths
+    
+    The storage tier comes from the format's estimated size. Small outputs
+    are moved into memory once finished (returned as the MemoryFile).
+    Nothing is charged here: the job is shared, so each requester pays for
+    itself from flight.stats.
+    """
+    success, data = await YtDlpService.fetch_formats(body.url)
+    tier = storage.choose(estimated_size_mb(data, body.format_id)) if success else DISK
+    work_dir, output_dir = storage.job_dirs(tier)
+    try:
+        output_path, content_type, video_title = await produce_download(
+            body.url, body.format_id, body.output_format, output_dir,
+            # In-memory outputs are too short-lived on disk to tail
+            on_download_path=flight.set_tail_path if tier != MEMORY and can_tail(body.format_id, body.output_format) else None,
+            scratch_dir=work_dir,
+            stats=flight.stats
+        )
+        memory_file = None
+        if tier == MEMORY:
+            memory_file = await asyncio.get_running_loop().run_in_executor(None, storage.load, output_path)
+            if memory_file is not None:
+                shutil.rmtree(output_dir, ignore_errors=True)
+        if memory_file is None:
+            # Tracked here rather than by the requesters, so the file still expires if
+            # they have all disconnected; held briefly until the waiters acquire it
+            janitor.track(output_path, settings.DOWNLOAD_FILE_TTL)
+            janitor.acquire(output_path)
+            asyncio.get_running_loop().call_later(FLIGHT_HANDOFF_SECONDS, janitor.release, output_path)
+        return output_path, content_type, video_title, memory_file
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    finally:
+        if work_dir != output_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
 @app.post("/api/download")
 async def download(request: Request, body: DownloadRequest, background_tasks: BackgroundTasks):
     """
     Download a specific format from YouTube video
     
-    Supports MP4 for video and MP3 for audio extraction
+    Supports MP4 for video and MP3 for audio extraction. Identical requests
+    (same video, format and output) made while one is running join it
+    instead of starting another download; for plain MP4 downloads they
+    stream the bytes already written and follow the file as it grows.
+    
+    Every requester is charged its own estimated cost before joining, so one
+    client's exhausted budget never fails the others sharing the job. It is
+    reconciled with the job's measured bytes (plus CPU time for the leader).
     """
+    job_id = await JobStore.start('download', url=body.url, format_id=body.format_id, output_format=body.output_format)
+    reservation = None
+    flight, is_leader = None, False
     try:
-        # Rate limiting disabled for development
-        # is_allowed, rate_info = rate_limiter.is_allowed(
-        #     request,
-        #     "/api/download",
-        #     max_requests=5,
-        #     window_minutes=10
-        # )
-        # 
-        # if not is_allowed:
-        #     raise HTTPException(
-        #         status_code=429,
-        #         detail={
-        #             "error": "Rate limit exceeded for downloads",
-        #             "retry_after_seconds": rate_info["retry_after_seconds"],
-        #             "reset_time": rate_info["reset_time"]
-        #         }
-        #     )
-        
         logger.info(f"Download request: {body.url} format={body.format_id} output={body.output_format}")
         
-        # Fetch video info to get title
         success, data = await YtDlpService.fetch_formats(body.url)
         if not success:
             raise HTTPException(
                 status_code=400,
                 detail={"error": "Could not fetch video information", "error_code": "FETCH_ERROR"}
             )
+        reservation = await reserve_job_cost(
+            get_client_ip(request.scope), estimate_job_cost(data, body.format_id, body.output_format == "mp3")
+        )
         
-        video_title = data.get('title', 'download')
-        sanitized_title = sanitize_filename(video_title)
+        key = (extract_video_id(body.url) or body.url, body.format_id, body.output_format)
+        flight, is_leader = download_flights.join(key, lambda f: run_shared_download(f, body))
+        
+        if not is_leader:
+            logger.info(f"Joined in-flight download {key} ({flight.waiters} requesters)")
+            if can_tail(body.format_id, body.output_format):
+                await flight.tail_ready.wait()
+                if flight.tail_path and not flight.task.done():
+                    # Streamed after this handler returns: the estimate stands as the charge
+                    reservation = None
+                    return StreamingResponse(
+                        tail_and_record(flight, job_id),
+                        media_type="video/mp4",
+                        headers=attachment_headers(os.path.basename(flight.tail_path), job_id)
+                    )
+        
+        output_path, content_type, video_title, memory_file = await download_flights.wait(flight)
+        if memory_file is not None:
+            await JobStore.finish(job_id, size_bytes=len(memory_file.data), coalesced=not is_leader)
+            # The task keeps the buffer (and its share of the memory cap) until the response is sent
+            background_tasks.add_task(storage.served, memory_file)
+            return Response(
+                memory_file.data,
+                media_type=content_type,
+                headers=attachment_headers(os.path.basename(output_path), job_id)
+            )
+        
+        file_size = os.path.getsize(output_path)
+        await JobStore.finish(job_id, size_bytes=file_size, coalesced=not is_leader)
+        logger.info(f"File ready for download: {output_path} ({file_size} bytes)")
         
-        # Determine output path
-        temp_dir = settings.TEMP_DOWNLOAD_DIR
-        
-        if body.output_format == "mp4":
-            output_filename = f"{sanitized_title}.mp4"
-            output_path = os.path.join(temp_dir, output_filename)
-            temp_path = output_path
-            content_type = "video/mp4"
-        else:  # mp3
-            # Download audio first
-            m4a_filename = f"{sanitized_title}_temp.m4a"
-            m4a_path = os.path.join(temp_dir, m4a_filename)
-            mp3_filename = f"{sanitized_title}.mp3"
-            output_path = os.path.join(temp_dir, mp3_filename)
-            temp_path = m4a_path
-            content_type = "audio/mpeg"
-        
-        # Download the format
-        logger.info(f"Downloading format {body.format_id} to {temp_path}")
-        success, msg = await YtDlpService.download_format(body.url, body.format_id, temp_path)
+        # The job tracks the file for expiry; it is held until this response has been sent
+        janitor.acquire(output_path)
+        background_tasks.add_task(janitor.release, output_path)
         
+        # Return file
+        return SendfileResponse(
+            output_path,
+            media_type=content_type,
+            filename=os.path.basename(output_path),
+            headers=attachment_headers(os.path.basename(output_path), job_id)
+        )
+    
+    except HTTPException as e:
+        await JobStore.finish(job_id, error=job_error(e))
+        raise
+    except Exception as e:
+        logger.error(f"Error in download: {str(e)}")
+        await JobStore.finish(job_id, error=str(e))
+        raise HTTPException(
+            status_code=500,
+            detail={"error": f"Server error: {str(e)}", "error_code": "SERVER_ERROR"}
+        )
+    finally:
+        if reservation and flight is not None:
+            stats = flight.stats
+            cpu_seconds = stats.get('cpu_seconds', 0.0) if is_leader else 0.0
+            await cost_limiter.reconcile(reservation, cost_limiter.actual(stats.get('bytes', 0), cpu_seconds))
+
+async def tail_and_record(flight: Flight, job_id: str):
+    """Stream a shared download as it is written and record how the follower's job ended"""
+    error = "Client disconnected"
+    janitor.acquire(flight.tail_path)
+    try:
+        async for chunk in tail_file(flight.tail_path, flight.task):
+            yield chunk
+        error = None
+    except HTTPException as e:
+        # The shared job failed after the response started; the stream is cut short
+        error = job_error(e)
+        raise
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        raise
+    finally:
+        janitor.release(flight.tail_path)
+        await JobStore.finish(job_id, error=error, coalesced=True)
+
+@app.post("/api/download-bundle")
+async def download_bundle(request: Request, body: BundleRequest):
+    """
+    Download several videos/tracks as a single ZIP
+    
+    Items are processed through a bounded pipeline and each ZIP member is
+    streamed (store mode, no recompression) as soon as its item finishes.
+    """
+    logger.info(f"Bundle request: {len(body.items)} items")
+    
+    items = [
+        {'url': item.url, 'format_id': item.format_id, 'output_format': item.output_format}
+        for item in body.items
+    ]
+    job_id = await JobStore.start('bundle', items=len(items))
+    
+    async def stream_and_record():
+        error = "Client disconnected"
+        try:
+            # Each item is charged separately; items over budget land in errors.txt
+            async for chunk in BundleService.stream_zip(items, partial(produce_download, client=get_client_ip(request.scope))):
+                yield chunk
+            error = None
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            await JobStore.finish(job_id, error=error)
+    
+    return StreamingResponse(
+        stream_and_record(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="bundle.zip"', "X-Job-Id": job_id}
+    )
+
+@app.post("/api/transcode", response_model=TranscodeResponse)
+async def transcode(request: Request, body: TranscodeRequest, response: Response, background_tasks: BackgroundTasks):
+    """
+    Download an audio format once and produce several outputs from it
+    
+    All outputs (e.g. 320/192/128 kbps MP3 plus a 30 s preview) come from a
+    single FFmpeg decode and are published together as artifacts.
+    """
+    staging_dir = None
+    scratch_dir = None
+    reservation = None
+    stats = {'bytes': 0, 'cpu_seconds': 0.0}
+    job_id = await JobStore.start('transcode', url=body.url, format_id=body.format_id, outputs=len(body.outputs))
+    response.headers["X-Job-Id"] = job_id
+    try:
+        logger.info(f"Transcode request: {body.url} format={body.format_id} outputs={len(body.outputs)}")
+        
+        success, data = await YtDlpService.fetch_formats(body.url)
         if not success:
             raise HTTPException(
                 status_code=400,
-                detail={"error": f"Download failed: {msg}", "error_code": "DOWNLOAD_ERROR"}
+                detail={"error": "Could not fetch video information", "error_code": "FETCH_ERROR"}
             )
         
-        if not os.path.exists(temp_path):
+        video_title = data.get('title', 'download')
+        sanitized_title = sanitize_filename(video_title)
+        
+        # Every output is an encode of the full source (previews are cheaper, but rare)
+        estimated = estimate_job_cost(data, body.format_id, transcode=False)
+        estimated += len(body.outputs) * (estimate_job_cost(data, body.format_id, transcode=True) - estimated)
+        reservation = await reserve_job_cost(get_client_ip(request.scope), estimated)
+        
+        # The source is an intermediate, so it goes to scratch; outputs are staged next to the artifacts
+        staging_dir = ArtifactStore.staging_dir()
+        scratch_dir = storage.scratch_dir(estimated_size_mb(data, body.format_id))
+        source_path = os.path.join(scratch_dir, "source.m4a")
+        
+        success, msg = await YtDlpService.download_format(body.url, body.format_id, source_path, stats=stats)
+        if not success or not os.path.exists(source_path):
             raise HTTPException(
                 status_code=400,
-                detail={"error": "Download file was not created", "error_code": "FILE_NOT_CREATED"}
+                detail={"error": f"Download failed: {msg}", "error_code": "DOWNLOAD_ERROR"}
             )
+        stats['bytes'] = os.path.getsize(source_path)
         
-        # Convert to MP3 if needed
-        if body.output_format == "mp3":
-            logger.info(f"Converting to MP3: {output_path}")
-            success, msg = await ConverterService.convert_to_mp3(temp_path, output_path)
-            
-            if not success:
-                # Cleanup temp file
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
-                raise HTTPException(
-                    status_code=500,
-                    detail={"error": f"Conversion failed: {msg}", "error_code": "CONVERSION_ERROR"}
-                )
-            
-            # Cleanup temp M4A file
-            try:
-                os.remove(temp_path)
-            except:
-                pass
+        outputs = []
+        for index, output in enumerate(body.outputs):
+            suffix = f"_{output.bitrate}"
+            if output.duration:
+                suffix += f"_preview{int(output.duration)}s"
+            outputs.append({
+                'path': os.path.join(staging_dir, f"output_{index}.{output.format}"),
+                'filename': f"{sanitized_title}{suffix}.{output.format}",
+                'format': output.format,
+                'bitrate': output.bitrate,
+                'start': output.start,
+                'duration': output.duration,
+            })
         
-        # Check final file exists
-        if not os.path.exists(output_path):
+        success, result = await ConverterService.transcode_multi(source_path, outputs, stats=stats)
+        if not success:
             raise HTTPException(
                 status_code=500,
-                detail={"error": "Output file was not created", "error_code": "OUTPUT_NOT_CREATED"}
+                detail={"error": result.get("error", "Conversion failed"), "error_code": result.get("error_code", "CONVERSION_ERROR")}
             )
         
-        file_size = os.path.getsize(output_path)
-        logger.info(f"File ready for download: {output_path} ({file_size} bytes)")
-        
-        # Schedule cleanup after download
-        background_tasks.add_task(cleanup_file_delayed, output_path, delay_seconds=300)
+        content_types = {'mp3': 'audio/mpeg', 'm4a': 'audio/mp4'}
+        success, records = await ArtifactStore.publish([
+            (o['path'], o['filename'], content_types[o['format']]) for o in outputs
+        ])
+        if not success:
+            raise HTTPException(
+                status_code=500,
+                detail={"error": "Could not publish outputs", "error_code": "PUBLISH_ERROR"}
+            )
         
-        # Prepare filename with proper encoding (RFC 5987)
-        base_filename = os.path.basename(output_path)
-        # Use UTF-8 encoded filename parameter
-        from urllib.parse import quote
-        filename_param = quote(base_filename.encode('utf-8'), safe='')
-        content_disposition = f'attachment; filename*=UTF-8\'\'{filename_param}'
+        for record in records:
+            janitor.track(record['path'], settings.DOWNLOAD_FILE_TTL)
+        await JobStore.finish(job_id, artifacts=[r['artifact_id'] for r in records])
         
-        # Return file
-        return FileResponse(
-            output_path,
-            media_type=content_type,
-            filename=base_filename,
-            headers={"Content-Disposition": content_disposition}
+        return TranscodeResponse(
+            success=True,
+            title=video_title,
+            artifacts=[
+                ArtifactInfo(
+                    artifact_id=r['artifact_id'],
+                    filename=r['filename'],
+                    content_type=r['content_type'],
+                    size_bytes=r['size_bytes'],
+                    download_url=f"/api/artifacts/{r['artifact_id']}",
+                )
+                for r in records
+            ]
         )
     
-    except HTTPException:
+    except HTTPException as e:
+        await JobStore.finish(job_id, error=job_error(e))
         raise
     except Exception as e:
-        logger.error(f"Error in download: {str(e)}")
+        logger.error(f"Error in transcode: {str(e)}")
+        await JobStore.finish(job_id, error=str(e))
         raise HTTPException(
             status_code=500,
             detail={"error": f"Server error: {str(e)}", "error_code": "SERVER_ERROR"}
         )
+    finally:
+        await cost_limiter.reconcile(reservation, cost_limiter.actual(stats['bytes'], stats['cpu_seconds']))
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+@app.get("/api/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str, background_tasks: BackgroundTasks):
+    """Download a published artifact"""
+    try:
+        record = await ArtifactStore.get(artifact_id)
+    except StateBackendError:
+        raise HTTPException(
+            status_code=503,
+            detail={"error": "Artifact index temporarily unavailable", "error_code": "STATE_UNAVAILABLE"}
+        )
+    if not record:
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "Artifact not found or expired", "error_code": "ARTIFACT_NOT_FOUND"}
+        )
+    
+    janitor.acquire(record['path'])
+    background_tasks.add_task(janitor.release, record['path'])
+    from urllib.parse import quote
+    filename_param = quote(record['filename'].encode('utf-8'), safe='')
+    return SendfileResponse(
+        record['path'],
+        media_type=record['content_type'],
+        headers={"Content-Disposition": f'attachment; filename*=UTF-8\'\'{filename_param}'}
+    )
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    State of a download, bundle or transcode job (ID from the X-Job-Id header)
+    
+    Answered from the shared state backend, so any worker can report on
+    jobs run by another.
+    """
+    record = await JobStore.get(job_id)
+    if not record:
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "Job not found or expired", "error_code": "JOB_NOT_FOUND"}
+        )
+    return {"success": True, **record}
+
+@app.get("/api/cluster")
+async def cluster_status():
+    """Ring membership, per-node load and routing counters for this node"""
+    return {"success": True, "routing": settings.CLUSTER_ROUTING, **cluster_router.snapshot()}
 
 # YouTube Search APIs
 @app.post("/api/search", response_model=SearchResponse)
@@ -309,29 +775,94 @@ async def search_youtube(request: Request, body: SearchRequest):
         success, data = await YouTubeSearchService.search_videos(
             query=body.query,
             max_results=body.max_results,
-            page_token=body.page_token
+            page_token=body.page_token,
+            hydrate=body.hydrate
         )
         
         if not success:
             error_code = data.get("error_code", "SEARCH_ERROR")
             error_msg = data.get("error", "Search failed")
+            if error_code == "QUOTA_EXHAUSTED":
+                raise HTTPException(
+                    status_code=429,
+                    detail={"error": error_msg, "error_code": error_code},
+                    headers={"Retry-After": str(data.get("retry_after_seconds", 3600))}
+                )
             raise HTTPException(
                 status_code=400,
                 detail={"error": error_msg, "error_code": error_code}
             )
         
-        return SearchResponse(
+        suggestion_index.record_query(body.query)
+        suggestion_index.record_results(data.get('videos', []))
+        # Only warm videos this node owns; their download requests will be routed here
+        prefetcher.schedule([v['video_id'] for v in data.get('videos', []) if cluster_router.owns(v['video_id'])])
+        
+        # Result dicts already have VideoSearchResult's fields; encode them without re-validating
+        return FastJSONResponse({
+            "success": True,
+            "videos": data.get('videos', []),
+            "next_page_token": data.get('next_page_token'),
+            "prev_page_token": data.get('prev_page_token'),
+            "total_results": data.get('total_results', 0),
+            "error": None,
+            "error_code": None,
+        })
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in search_youtube: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail={"error": f"Server error: {str(e)}", "error_code": "SERVER_ERROR"}
+        )
+
+@app.get("/api/videos", response_model=VideoDetailsBatchResponse)
+async def get_videos_details(ids: str):
+    """
+    Get details for up to 50 videos at once
+    
+    `ids` is a comma-separated list of video IDs. All IDs are looked up with
+    a single Data API call.
+    """
+    try:
+        if not YouTubeSearchService.is_initialized():
+            raise HTTPException(
+                status_code=503,
+                detail={"error": "YouTube API not available", "error_code": "API_NOT_AVAILABLE"}
+            )
+        
+        video_ids = [v for v in ids.split(",") if v.strip()]
+        if not video_ids:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "No video IDs given", "error_code": "EMPTY_VIDEO_ID"}
+            )
+        if len(video_ids) > 50:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": "At most 50 video IDs per request", "error_code": "TOO_MANY_IDS"}
+            )
+        
+        success, data = await YouTubeSearchService.get_videos_details(video_ids)
+        
+        if not success:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": data.get("error", "Failed to fetch video details"), "error_code": data.get("error_code", "DETAILS_ERROR")}
+            )
+        
+        return VideoDetailsBatchResponse(
             success=True,
             videos=data.get('videos', []),
-            next_page_token=data.get('next_page_token'),
-            prev_page_token=data.get('prev_page_token'),
-            total_results=data.get('total_results', 0)
+            missing=data.get('missing', [])
         )
     
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in search_youtube: {str(e)}")
+        logger.error(f"Error in get_videos_details: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail={"error": f"Server error: {str(e)}", "error_code": "SERVER_ERROR"}
@@ -358,6 +889,12 @@ async def get_video_details(video_id: str):
         if not success:
             error_code = data.get("error_code", "DETAILS_ERROR")
             error_msg = data.get("error", "Failed to fetch video details")
+            if error_code == "QUOTA_EXHAUSTED":
+                raise HTTPException(
+                    status_code=429,
+                    detail={"error": error_msg, "error_code": error_code},
+                    headers={"Retry-After": str(data.get("retry_after_seconds", 3600))}
+                )
             raise HTTPException(
                 status_code=400,
                 detail={"error": error_msg, "error_code": error_code}
@@ -386,15 +923,160 @@ async def get_video_details(video_id: str):
             detail={"error": f"Server error: {str(e)}", "error_code": "SERVER_ERROR"}
         )
 
-async def cleanup_file_delayed(filepath: str, delay_seconds: int = 300):
-    """Clean up a file after delay"""
+@app.get("/api/suggest")
+async def suggest(q: str, limit: int = 10):
+    """
+    Autocomplete suggestions for a partial query
+    
+    Served from a local index of past queries and result titles/channels,
+    so it costs no YouTube API quota.
+    """
+    limit = max(1, min(limit, 25))
+    return {"success": True, "query": q, "suggestions": suggestion_index.suggest(q, limit)}
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Hit ratios for the format metadata cache and search prefetching"""
+    return {
+        "success": True,
+        "formats": YtDlpService._formats_cache.stats(),
+        "prefetch": prefetcher.snapshot(),
+        "downloads": download_flights.snapshot(),
+        "download_dir": janitor.snapshot(),
+        "storage": storage.snapshot(),
+        "search": YouTubeSearchService.cache_stats(),
+    }
+
+@app.get("/api/quota")
+async def get_quota():
+    """
+    YouTube Data API quota status
+    
+    Returns units used and remaining today, the burn rate over the last hour,
+    projected exhaustion, and the current degradation level.
+    """
+    return {"success": True, **quota_ledger.snapshot(), "search_cache": YouTubeSearchService.cache_stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (text exposition format)"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+def require_admin(request: Request):
+    """404 when profiling is disabled (no PROFILER_TOKEN), 403 on a wrong X-Admin-Token"""
+    if not settings.PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail={"error": "Not found", "error_code": "NOT_FOUND"})
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), settings.PROFILER_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail={"error": "Invalid admin token", "error_code": "FORBIDDEN"})
+
+def profile_response(profile) -> PlainTextResponse:
+    return PlainTextResponse(
+        profile.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="profile-{os.getpid()}-{profile.id}.folded"',
+            "X-Profile-Id": profile.id,
+            "X-Profile-Samples": str(profile.samples),
+        }
+    )
+
+@app.get("/api/admin/profile")
+async def profile_worker(request: Request, seconds: float = 10, idle: bool = False):
+    """
+    Sample every thread of this worker for `seconds` (admin only)
+    
+    Returns collapsed stacks (`thread;frame;frame count` per line), ready for
+    flamegraph.pl or speedscope. With several workers, each request profiles
+    whichever worker accepted it. Set idle=true to keep threads that were
+    only waiting for work.
+    """
+    require_admin(request)
+    if not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": f"seconds must be between 0 and {settings.PROFILER_MAX_SECONDS}", "error_code": "INVALID_DURATION"}
+        )
+    sampler = profilers.start(settings.PROFILER_INTERVAL_MS / 1000, include_idle=idle)
+    if sampler is None:
+        raise HTTPException(status_code=409, detail={"error": "A profile is already running on this worker", "error_code": "PROFILER_BUSY"})
     try:
-        await asyncio.sleep(delay_seconds)
-        if os.path.exists(filepath):
-            os.remove(filepath)
-            logger.info(f"Cleaned up file: {filepath}")
-    except Exception as e:
-        logger.error(f"Error cleaning up file: {str(e)}")
+        await asyncio.sleep(seconds)
+    finally:
+        profile = await asyncio.get_running_loop().run_in_executor(None, profilers.stop, sampler)
+    return profile_response(profile)
+
+@app.get("/api/admin/profiles")
+async def list_profiles(request: Request):
+    """Per-request profiles (from ?profile=1) kept on this worker, newest first"""
+    require_admin(request)
+    return {"success": True, "profiles": profilers.list()}
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str):
+    """Collapsed stacks of a per-request profile"""
+    require_admin(request)
+    profile = profilers.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail={"error": "Profile not found or expired", "error_code": "PROFILE_NOT_FOUND"})
+    return profile_response(profile)
+
+def executor_queue_depths() -> Dict[Tuple[str], int]:
+    """Work items waiting for a thread in each executor"""
+    executors = {
+        "default": default_executor,
+        "prefetch": prefetcher._executor,
+    }
+    return {(name,): executor.queue_depth for name, executor in executors.items() if executor is not None}
+
+def cache_lookups() -> Dict[str, Dict]:
+    return {
+        "formats": YtDlpService._formats_cache.stats(),
+        "search": YouTubeSearchService._search_cache.stats(),
+        "details": YouTubeSearchService._details_cache.stats(),
+    }
+
+registry.callback(
+    "ytdl_jobs_in_flight", "Jobs currently running, by kind",
+    lambda: {("ytdlp",): YtDlpService.active_jobs, ("shared_downloads",): download_flights.snapshot()["in_flight"]},
+    ["kind"],
+)
+registry.callback("ytdl_executor_queue_depth", "Work items waiting for a thread, by executor", executor_queue_depths, ["executor"])
+registry.callback(
+    "ytdl_cache_hit_ratio", "Fresh plus stale hits over lookups, by cache",
+    lambda: {(name,): stats["hit_ratio"] for name, stats in cache_lookups().items()},
+    ["cache"],
+)
+registry.callback(
+    "ytdl_cache_lookups_total", "Cache lookups by cache and result",
+    lambda: {
+        (name, result): stats[key]
+        for name, stats in cache_lookups().items()
+        for result, key in (("hit", "hits"), ("stale_hit", "stale_hits"), ("miss", "misses"))
+    },
+    ["cache", "result"],
+    type="counter",
+)
+registry.callback("ytdl_youtube_quota_used_units", "YouTube Data API units used today", lambda: quota_ledger.used)
+registry.callback("ytdl_youtube_quota_remaining_units", "YouTube Data API units left today", quota_ledger.remaining)
+registry.callback(
+    "ytdl_youtube_quota_degradation", "Current quota degradation level (1 for the active level)",
+    lambda: {(quota_ledger.degradation_level(),): 1},
+    ["level"],
+)
+registry.callback("ytdl_memory_tier_bytes", "Bytes of finished outputs held in memory", lambda: storage.memory_used)
+registry.callback("ytdl_download_dir_tracked_bytes", "Bytes of finished files awaiting expiry", lambda: janitor.snapshot()["tracked_bytes"])
+registry.callback("ytdl_download_dir_usage_bytes", "Measured size of the download and scratch directories", lambda: janitor.snapshot()["usage_bytes"])
+
+async def snapshot_suggestions_periodically():
+    """Snapshot the suggestion index to disk so restarts stay warm"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(settings.SUGGEST_SNAPSHOT_INTERVAL)
+        try:
+            # Copy on the loop, write in a thread
+            entries = suggestion_index.export()
+            await loop.run_in_executor(None, suggestion_index.save, entries)
+        except Exception as e:
+            logger.error(f"Error saving suggestion index: {str(e)}")
 
 # Root endpoint
 @app.get("/")
@@ -407,8 +1089,14 @@ async def root():
         "disclaimer": "For personal/educational use only. Downloading copyrighted content violates YouTube ToS.",
         "endpoints": {
             "health": "/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
             "fetch_formats": "POST /api/fetch-formats",
             "download": "POST /api/download",
+            "download_bundle": "POST /api/download-bundle",
+            "transcode": "POST /api/transcode",
+            "job_status": "GET /api/jobs/{job_id}",
+            "metrics": "/metrics",
             "docs": "/docs"
         }
     }
@@ -417,12 +1105,15 @@ async def root():
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions"""
+    error_code = exc.detail.get("error_code") if isinstance(exc.detail, dict) else "HTTP_ERROR"
+    errors_total.labels(error_code or "HTTP_ERROR").inc()
     return JSONResponse(
         status_code=exc.status_code,
+        headers=getattr(exc, "headers", None),
         content={
             "success": False,
             "error": exc.detail.get("error") if isinstance(exc.detail, dict) else str(exc.detail),
-            "error_code": exc.detail.get("error_code") if isinstance(exc.detail, dict) else "HTTP_ERROR"
+            "error_code": error_code
         }
     )
 
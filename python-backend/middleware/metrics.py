@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+from typing import Iterable
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from services.metrics import bytes_served_total, http_request_seconds, http_requests_total, stage_seconds
+
+UNMATCHED = "unmatched"  # Requests no route handled (404s, CORS preflights)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request duration, status and bytes sent per endpoint
+
+    The endpoint label is the handler's function name, so label values are
+    bounded by the routes the app defines. For `serve_endpoints`, the time
+    from the response start to its last body message is also recorded as
+    the "serve" stage. Bodies sent with pathsend/zerocopysend are counted
+    from their length.
+    """
+
+    def __init__(self, app, serve_endpoints: Iterable[str] = ()):
+        self.app = app
+        self.serve_endpoints = frozenset(serve_endpoints)
+        self._serve = stage_seconds.labels("serve")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {"status": 500, "length": 0, "sent": 0, "started_at": 0.0, "done": False}
+
+        async def send_wrapper(message):
+            kind = message["type"]
+            if kind == "http.response.start":
+                state["status"] = message["status"]
+                state["started_at"] = time.perf_counter()
+                for name, value in message.get("headers") or ():
+                    if name.lower() == b"content-length":
+                        state["length"] = int(value)
+            elif kind == "http.response.body":
+                state["sent"] += len(message.get("body", b""))
+                state["done"] = not message.get("more_body", False)
+            elif kind == "http.response.pathsend":
+                state["sent"] += state["length"]
+                state["done"] = True
+            elif kind == "http.response.zerocopysend":
+                state["sent"] += message.get("count") or 0
+                state["done"] = not message.get("more_body", False)
+            await send(message)
+            if state["done"] and kind != "http.response.start":
+                state["done"] = False
+                self._record_serving(scope, state)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            endpoint = self._endpoint(scope)
+            http_request_seconds.labels(endpoint).observe(time.perf_counter() - start)
+            http_requests_total.labels(endpoint, str(state["status"])).inc()
+            if state["sent"]:
+                bytes_served_total.labels(endpoint).inc(state["sent"])
+
+    def _record_serving(self, scope, state):
+        if self._endpoint(scope) in self.serve_endpoints and state["started_at"]:
+            self._serve.observe(time.perf_counter() - state["started_at"])
+
+    @staticmethod
+    def _endpoint(scope) -> str:
+        endpoint = scope.get("endpoint")
+        return getattr(endpoint, "__name__", None) or UNMATCHED
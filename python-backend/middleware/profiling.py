@@ -0,0 +1,58 @@
+import asyncio
+import hmac
+import os
+import sys
+from functools import partial
+from typing import Iterable
+from urllib.parse import parse_qs
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from services.profiler import profilers
+
+TOKEN_HEADER = b"x-admin-token"
+
+
+class RequestProfilingMiddleware:
+    """
+    ASGI middleware profiling single requests that ask for it
+
+    A request to one of `paths` with `?profile=1` and the admin token in
+    X-Admin-Token runs under the sampling profiler until its response is
+    sent. The response carries X-Profile-Id; the collapsed stacks are
+    fetched from /api/admin/profiles/{id}. Requests without a valid token
+    are served normally. Only installed when PROFILER_TOKEN is set.
+    """
+
+    def __init__(self, app, token: str, interval: float, paths: Iterable[str] = ()):
+        self.app = app
+        self.token = token.encode("latin-1")
+        self.interval = interval
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or b"profile=" not in scope.get("query_string", b""):
+            await self.app(scope, receive, send)
+            return
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        token = dict(scope.get("headers") or ()).get(TOKEN_HEADER, b"")
+        if query.get("profile") != ["1"] or not hmac.compare_digest(token, self.token):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = profilers.start(self.interval)
+        if sampler is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": list(message.get("headers") or []) + [(b"x-profile-id", sampler.profile.id.encode("latin-1"))],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Joining the sampler thread would stall the loop
+            await asyncio.get_running_loop().run_in_executor(None, partial(profilers.stop, sampler, keep=True))
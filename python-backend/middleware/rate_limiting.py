@@ -1,73 +1,358 @@
+import ipaddress
+import json
 import logging
-from typing import Dict, Tuple
+import math
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from services.state_backend import StateBackend, StateBackendError, state_backend
+from services.metrics import errors_total
 
 logger = logging.getLogger(__name__)
 
+_RATE_PATTERN = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$')
+_UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(spec: str) -> Tuple[int, float]:
+    """Parse a rate like "30/10m" into (30 requests, 600.0 seconds)"""
+    match = _RATE_PATTERN.match(spec)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {spec!r}")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * _UNIT_SECONDS[unit]
+
+
 class RateLimiter:
-    """Simple in-memory rate limiter"""
-    
-    def __init__(self):
-        # Dictionary to store request counts: {ip: [(timestamp, endpoint), ...]}
-        self.request_log: Dict[str, list] = defaultdict(list)
-    
-    def _get_client_ip(self, request) -> str:
-        """Extract client IP from request"""
-        # Check for forwarded header first (for proxies)
-        forwarded = request.headers.get("x-forwarded-for")
-        if forwarded:
-            return forwarded.split(",")[0].strip()
-        return request.client.host if request.client else "unknown"
-    
-    def _cleanup_old_requests(self, ip: str, window_minutes: int):
-        """Remove requests older than the window"""
-        cutoff_time = datetime.now() - timedelta(minutes=window_minutes)
-        self.request_log[ip] = [
-            (ts, ep) for ts, ep in self.request_log[ip]
-            if ts > cutoff_time
-        ]
-    
+    """
+    Token-bucket rate limiter with O(1) checks and bounded memory
+
+    Each key holds (tokens, last_update, seconds_to_full). Buckets are kept
+    in LRU order; a few of the oldest are examined on every check and
+    dropped once they have been idle long enough to be full again (dropping
+    a full bucket changes nothing, while a bucket in debt is kept until the
+    debt has refilled). A hard cap on the number of keys evicts the least recently
+    seen client beyond that.
+    """
+
+    EVICT_PER_CHECK = 2
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # {key: [tokens, last_update, seconds_to_full]}
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
     def is_allowed(
         self,
-        request,
-        endpoint: str,
-        max_requests: int,
-        window_minutes: int = 10
+        key: str,
+        capacity: int,
+        period_seconds: float,
+        cost: float = 1.0
     ) -> Tuple[bool, Dict]:
         """
-        Check if request is allowed under rate limit
-        Returns: (is_allowed: bool, info: dict with remaining_requests, retry_after)
+        Take `cost` tokens from the key's bucket if available
+        Returns: (is_allowed: bool, info: dict with limit, remaining, reset_seconds, retry_after_seconds)
         """
-        ip = self._get_client_ip(request)
-        
-        # Cleanup old requests
-        self._cleanup_old_requests(ip, window_minutes)
-        
-        # Count requests for this endpoint in the current window
-        endpoint_requests = [
-            1 for ts, ep in self.request_log[ip]
-            if ep == endpoint
-        ]
-        request_count = len(endpoint_requests)
-        
-        if request_count >= max_requests:
-            retry_after = window_minutes * 60
-            logger.warning(f"Rate limit exceeded for IP {ip} on endpoint {endpoint}")
-            return False, {
-                "remaining_requests": 0,
-                "retry_after_seconds": retry_after,
-                "reset_time": (datetime.now() + timedelta(minutes=window_minutes)).isoformat()
-            }
-        
-        # Log this request
-        self.request_log[ip].append((datetime.now(), endpoint))
-        
-        return True, {
-            "remaining_requests": max_requests - request_count - 1,
-            "retry_after_seconds": 0,
-            "reset_time": (datetime.now() + timedelta(minutes=window_minutes)).isoformat()
+        now = time.monotonic()
+        rate = capacity / period_seconds  # Tokens per second
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = float(capacity)
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            self._buckets.move_to_end(key)
+
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+
+        if bucket is None:
+            self._buckets[key] = [tokens, now, (capacity - tokens) / rate]
+        else:
+            bucket[0] = tokens
+            bucket[1] = now
+            bucket[2] = (capacity - tokens) / rate
+        self._evict(now)
+
+        retry_after = 0 if allowed else math.ceil((cost - tokens) / rate)
+        return allowed, {
+            "limit": capacity,
+            "remaining": max(int(tokens), 0),
+            "reset_seconds": math.ceil((capacity - tokens) / rate),
+            "retry_after_seconds": retry_after,
+        }
+
+    def adjust(self, key: str, capacity: int, period_seconds: float, delta: float) -> float:
+        """
+        Charge (delta > 0) or refund (delta < 0) tokens after the fact
+
+        The balance may go negative (down to -capacity): a client whose jobs
+        cost more than estimated waits for the debt to refill.
+        Returns the new token balance.
+        """
+        now = time.monotonic()
+        rate = capacity / period_seconds
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(capacity), now, 0.0]
+            self._buckets[key] = bucket
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        bucket[0] = max(min(capacity, bucket[0] - delta), -float(capacity))
+        bucket[2] = (capacity - bucket[0]) / rate
+        return bucket[0]
+
+    async def check(self, key: str, capacity: int, period_seconds: float, cost: float = 1.0) -> Tuple[bool, Dict]:
+        """Async form of is_allowed, matching SharedRateLimiter"""
+        return self.is_allowed(key, capacity, period_seconds, cost)
+
+    async def settle(self, key: str, capacity: int, period_seconds: float, delta: float) -> float:
+        """Async form of adjust, matching SharedRateLimiter"""
+        return self.adjust(key, capacity, period_seconds, delta)
+
+    def _evict(self, now: float):
+        """Drop idle (refilled) buckets from the LRU end and enforce the key cap"""
+        for _ in range(self.EVICT_PER_CHECK):
+            if not self._buckets:
+                break
+            key, (tokens, last_update, seconds_to_full) = next(iter(self._buckets.items()))
+            if now - last_update < seconds_to_full:
+                break
+            del self._buckets[key]
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SharedRateLimiter:
+    """
+    Sliding-window rate limiter kept in the shared state backend
+
+    Every worker and instance counts against the same per-window counters
+    (INCR with a TTL), so limits are not multiplied by the number of
+    processes. Usage is the current window's count plus the previous
+    window's count weighted by how much of it still overlaps the sliding
+    period. If the backend is unreachable, requests are allowed rather than
+    failing the whole API.
+    """
+
+    def __init__(self, backend: StateBackend):
+        self.backend = backend
+
+    async def check(self, key: str, capacity: int, period_seconds: float, cost: float = 1.0) -> Tuple[bool, Dict]:
+        now = time.time()
+        window = int(now // period_seconds)
+        elapsed = (now % period_seconds) / period_seconds
+        current_key = f"rl:{key}:{window}"
+        try:
+            previous = await self.backend.get(f"rl:{key}:{window - 1}") or 0.0
+            # Count first, then refund if over: concurrent workers cannot both slip under the limit
+            current = await self.backend.incr(current_key, cost, ttl=2 * period_seconds)
+            used = previous * (1 - elapsed) + current
+            allowed = used <= capacity
+            if not allowed:
+                await self.backend.incr(current_key, -cost, ttl=2 * period_seconds)
+                used -= cost
+        except StateBackendError as e:
+            logger.warning(f"Rate limit check skipped, state backend unavailable: {str(e)}")
+            return True, {"limit": capacity, "remaining": capacity, "reset_seconds": 0, "retry_after_seconds": 0}
+
+        window_left = period_seconds - now % period_seconds
+        retry_after = 0
+        if not allowed:
+            # Wait for the previous window's weight to decay enough, at most until the next window
+            excess = used + cost - capacity
+            wait = excess / previous * period_seconds if previous else window_left
+            retry_after = max(math.ceil(min(wait, window_left)), 1)
+        return allowed, {
+            "limit": capacity,
+            "remaining": max(int(capacity - used), 0),
+            "reset_seconds": math.ceil(window_left + (period_seconds if current else 0)),
+            "retry_after_seconds": retry_after,
         }
 
-# Global rate limiter instance
-rate_limiter = RateLimiter()
+    async def settle(self, key: str, capacity: int, period_seconds: float, delta: float) -> float:
+        """Add (or refund) usage in the current window after the fact"""
+        window = int(time.time() // period_seconds)
+        try:
+            return await self.backend.incr(f"rl:{key}:{window}", delta, ttl=2 * period_seconds)
+        except StateBackendError as e:
+            logger.warning(f"Rate limit settlement dropped, state backend unavailable: {str(e)}")
+            return 0.0
+
+
+class CostLimiter:
+    """
+    Charges each client by the work its jobs cause rather than per request
+
+    Cost units are roughly "megabytes moved": estimated output size, plus
+    a CPU term for transcoding. A job reserves its estimate up front (at
+    most a full bucket, so very large jobs need an idle client rather than
+    being refused forever) and is reconciled against the actual bytes and
+    CPU-seconds once it finishes.
+    """
+
+    def __init__(self, limiter, capacity: int, period_seconds: float):
+        self.limiter = limiter
+        self.capacity = capacity
+        self.period_seconds = period_seconds
+
+    @staticmethod
+    def estimate(size_mb: Optional[float], duration_seconds: Optional[float], transcode: bool) -> float:
+        """Estimated cost units for a job"""
+        settings = get_settings()
+        if not size_mb:
+            # Unknown size: assume an average bitrate over the duration
+            size_mb = (duration_seconds or 0) * settings.COST_DEFAULT_MB_PER_SECOND or settings.COST_DEFAULT_MB
+        cost = 1.0 + size_mb
+        if transcode:
+            cost += (duration_seconds or 0) * settings.COST_TRANSCODE_CPU_PER_MEDIA_SECOND * settings.COST_UNITS_PER_CPU_SECOND
+        return cost
+
+    @staticmethod
+    def actual(bytes_processed: int, cpu_seconds: float) -> float:
+        """Measured cost units for a finished job"""
+        return 1.0 + bytes_processed / (1024 * 1024) + cpu_seconds * get_settings().COST_UNITS_PER_CPU_SECOND
+
+    async def reserve(self, client: str, estimated: float) -> Tuple[bool, Dict, Optional[Dict]]:
+        """
+        Reserve the estimated cost for a job
+        Returns: (is_allowed, rate limit info, reservation to pass to reconcile)
+        """
+        key = f"{client}|cost"
+        charge = min(estimated, self.capacity)
+        allowed, info = await self.limiter.check(key, self.capacity, self.period_seconds, cost=charge)
+        if not allowed:
+            return False, info, None
+        return True, info, {'key': key, 'charged': charge}
+
+    async def reconcile(self, reservation: Optional[Dict], actual: float):
+        """Settle a reservation against the job's measured cost"""
+        if not reservation:
+            return
+        delta = actual - reservation['charged']
+        await self.limiter.settle(reservation['key'], self.capacity, self.period_seconds, delta)
+        logger.debug(f"Cost reconciled for {reservation['key']}: charged {reservation['charged']:.1f}, actual {actual:.1f}")
+
+
+@lru_cache(maxsize=1)
+def _trusted_networks() -> Tuple:
+    networks = []
+    for spec in get_settings().TRUSTED_PROXIES:
+        try:
+            networks.append(ipaddress.ip_network(spec, strict=False))
+        except ValueError:
+            logger.warning(f"Ignoring invalid TRUSTED_PROXIES entry {spec!r}")
+    return tuple(networks)
+
+
+def is_trusted_proxy(address: str) -> bool:
+    """Whether address is in TRUSTED_PROXIES"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_networks())
+
+
+def get_client_ip(scope) -> str:
+    """
+    Extract client IP from an ASGI scope
+
+    X-Forwarded-For is only believed when the connecting peer is a trusted
+    proxy (TRUSTED_PROXIES). The header is then read right to left, skipping
+    further trusted hops, so a client cannot pick its own address by
+    prepending values.
+    """
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not is_trusted_proxy(address):
+        return address
+    forwarded = [
+        value.decode("latin-1")
+        for name, value in scope.get("headers", [])
+        if name == b"x-forwarded-for"
+    ]
+    hops = [hop.strip() for hop in ",".join(forwarded).split(",") if hop.strip()]
+    for hop in reversed(hops):
+        address = hop
+        if not is_trusted_proxy(hop):
+            break
+    return address
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying per-client token buckets to selected paths
+
+    `rules` maps a path to (group, capacity, period_seconds); paths in the
+    same group share a bucket. Responses carry RateLimit-Limit,
+    RateLimit-Remaining and RateLimit-Reset headers, and 429 responses add
+    Retry-After.
+    """
+
+    def __init__(self, app, rules: Dict[str, Tuple[str, int, float]], limiter=None):
+        self.app = app
+        self.rules = rules
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        rule = self.rules.get(scope.get("path")) if scope["type"] == "http" else None
+        if rule is None or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        group, capacity, period_seconds = rule
+        ip = get_client_ip(scope)
+        allowed, info = await self.limiter.check(f"{ip}|{group}", capacity, period_seconds)
+        headers = [
+            (b"ratelimit-limit", str(info["limit"]).encode()),
+            (b"ratelimit-remaining", str(info["remaining"]).encode()),
+            (b"ratelimit-reset", str(info["reset_seconds"]).encode()),
+        ]
+
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for IP {ip} on {group}")
+            errors_total.labels("RATE_LIMITED").inc()
+            body = json.dumps({
+                "success": False,
+                "error": "Rate limit exceeded",
+                "error_code": "RATE_LIMITED",
+                "retry_after_seconds": info["retry_after_seconds"],
+                "reset_time": (datetime.now() + timedelta(seconds=info["retry_after_seconds"])).isoformat(),
+            }).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": headers + [
+                    (b"retry-after", str(info["retry_after_seconds"]).encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+# Global rate limiter instances (shared between workers when the state backend is)
+rate_limiter = SharedRateLimiter(state_backend) if state_backend.shared else RateLimiter(get_settings().RATE_LIMIT_MAX_KEYS)
+cost_limiter = CostLimiter(rate_limiter, *parse_rate(get_settings().RATE_LIMIT_COST))
@@ -0,0 +1,395 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import math
+import os
+import socket
+import sys
+from collections import defaultdict
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from utils import extract_video_id
+from middleware.rate_limiting import get_client_ip, is_trusted_proxy
+
+if TYPE_CHECKING:
+    import aiohttp  # Imported once routing is enabled; see services.prewarm
+
+logger = logging.getLogger(__name__)
+
+# Set on forwarded requests so the owner never forwards them again
+HOP_HEADER = b"x-cluster-hop"
+SERVED_BY_HEADER = b"x-served-by"
+MAX_ROUTED_BODY = 64 * 1024  # Larger bodies are handled locally rather than buffered
+
+# Not forwarded in either direction (RFC 7230 hop-by-hop, plus headers the proxy recomputes)
+_HOP_BY_HOP = {
+    b"connection", b"keep-alive", b"proxy-authenticate", b"proxy-authorization",
+    b"te", b"trailer", b"transfer-encoding", b"upgrade", b"host", b"content-length",
+}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes"""
+
+    def __init__(self, nodes: Set[str], vnodes: int = 128):
+        self.nodes = sorted(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def walk(self, key: str) -> Iterator[str]:
+        """Distinct nodes in ring order, starting at the key's position"""
+        if not self._hashes:
+            return
+        start = bisect.bisect(self._hashes, _hash(key))
+        seen = set()
+        for i in range(len(self._owners)):
+            node = self._owners[(start + i) % len(self._owners)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+
+class ClusterRouter:
+    """
+    Assigns each video to one node with consistent hashing and bounded load
+
+    The owner is the first node clockwise from the video ID whose in-flight
+    request count is below ceil(load_factor * average load), so a hot video
+    spills over to the next node instead of overloading its owner. Load is
+    as seen by this node (requests it is handling or forwarding). Peers
+    that fail consecutive health checks leave the ring until they recover.
+    """
+
+    def __init__(
+        self,
+        self_url: str,
+        peers: List[str],
+        vnodes: int = 128,
+        load_factor: float = 1.25,
+        health_interval: float = 5.0,
+        health_failures: int = 2
+    ):
+        self.self_url = self_url.rstrip("/")
+        self.peers = {p.rstrip("/") for p in peers} | {self.self_url}
+        self.vnodes = vnodes
+        self.load_factor = load_factor
+        self.health_interval = health_interval
+        self.health_failures = health_failures
+        self.enabled = bool(self.self_url) and len(self.peers) > 1
+        self.healthy: Set[str] = set(self.peers)
+        self.ring = HashRing(self.healthy, vnodes)
+        self.load: Dict[str, int] = defaultdict(int)
+        self.stats = {"local": 0, "proxied": 0, "redirected": 0, "proxy_failures": 0}
+        self._failures: Dict[str, int] = defaultdict(int)
+        # Addresses the peers resolve to, refreshed with every health check round
+        self.peer_addresses: Set[str] = {urlparse(peer).hostname for peer in self.peers} - {None}
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    def owns(self, video_id: str) -> bool:
+        """Whether this node is the video's preferred owner (ignoring load)"""
+        return not self.enabled or next(self.ring.walk(video_id), self.self_url) == self.self_url
+
+    def owner(self, video_id: str) -> str:
+        """Owner of a video, skipping nodes over their load bound"""
+        node_count = len(self.ring.nodes)
+        total = sum(self.load[node] for node in self.ring.nodes)
+        bound = math.ceil(self.load_factor * (total + 1) / node_count)
+        first = None
+        for node in self.ring.walk(video_id):
+            first = first or node
+            if self.load[node] < bound:
+                return node
+        return first or self.self_url
+
+    def _set_health(self, peer: str, ok: bool):
+        if ok:
+            self._failures[peer] = 0
+            if peer not in self.healthy:
+                logger.info(f"Cluster peer {peer} is back in the ring")
+                self.healthy.add(peer)
+                self.ring = HashRing(self.healthy, self.vnodes)
+            return
+        self._failures[peer] += 1
+        if peer in self.healthy and self._failures[peer] >= self.health_failures:
+            logger.warning(f"Cluster peer {peer} removed from the ring after {self._failures[peer]} failures")
+            self.healthy.discard(peer)
+            self.ring = HashRing(self.healthy, self.vnodes)
+
+    def report_failure(self, peer: str):
+        """A forwarded request could not reach the peer"""
+        self.stats["proxy_failures"] += 1
+        self._set_health(peer, False)
+
+    async def session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=60),
+                # Bodies are relayed as-is, including any content-encoding
+                auto_decompress=False,
+            )
+        return self._session
+
+    async def _check_peer(self, peer: str):
+        import aiohttp
+        session = await self.session()
+        try:
+            async with session.get(f"{peer}/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                self._set_health(peer, response.status == 200)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self._set_health(peer, False)
+
+    async def _resolve_peers(self):
+        loop = asyncio.get_running_loop()
+        addresses = set()
+        for peer in self.peers:
+            parsed = urlparse(peer)
+            try:
+                infos = await loop.getaddrinfo(parsed.hostname, parsed.port, type=socket.SOCK_STREAM)
+            except (OSError, UnicodeError) as e:
+                logger.warning(f"Could not resolve cluster peer {peer}: {str(e)}")
+                continue
+            addresses.update(info[4][0] for info in infos)
+        self.peer_addresses = addresses
+
+    def trusts(self, address: str) -> bool:
+        """Whether a request from address may claim to be forwarded by a peer"""
+        return address in self.peer_addresses or is_trusted_proxy(address)
+
+    async def _check_health_forever(self):
+        peers = sorted(self.peers - {self.self_url})
+        while True:
+            await self._resolve_peers()
+            await asyncio.gather(*[self._check_peer(peer) for peer in peers])
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        """Begin health-checking peers (call from the running event loop)"""
+        if self.enabled and self._health_task is None:
+            self._health_task = asyncio.create_task(self._check_health_forever())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._session is not None:
+            await self._session.close()
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "self": self.self_url,
+            "peers": sorted(self.peers),
+            "healthy": sorted(self.healthy),
+            "load": {node: self.load[node] for node in sorted(self.peers)},
+            **self.stats,
+        }
+
+
+class ConsistentHashRoutingMiddleware:
+    """
+    ASGI middleware sending per-video requests to the video's owner node
+
+    Applies to POST requests on `paths` whose JSON body has a YouTube
+    `url`. Requests owned elsewhere are proxied (mode "proxy") or answered
+    with a 307 to the owner (mode "redirect"). If the owner cannot be
+    reached the request is served locally. Responses carry X-Served-By.
+    """
+
+    def __init__(self, app, router: ClusterRouter, paths: Set[str], mode: str = "proxy"):
+        self.app = app
+        self.router = router
+        self.paths = paths
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope.get("method") != "POST"
+            or scope.get("path") not in self.paths
+            or not self.router.enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+        if any(name == HOP_HEADER for name, _ in scope.get("headers", [])):
+            client = scope.get("client")
+            if client and self.router.trusts(client[0]):
+                # Already forwarded once: this node is the owner
+                await self.app(scope, receive, self._tag_served_by(send))
+                return
+            # Claimed by a client to skip routing: ignore it
+            scope = {**scope, "headers": [(name, value) for name, value in scope["headers"] if name != HOP_HEADER]}
+
+        body, complete, replay = await self._buffer_body(receive)
+        video_id = self._video_id(body) if complete else ""
+        if not video_id:
+            await self.app(scope, replay, send)
+            return
+
+        owner = self.router.owner(video_id)
+        self.router.load[owner] += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.router.load[owner] -= 1
+
+        async def send_and_release(message):
+            await send(message)
+            # Background tasks may run long after the response; they do not count as load
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            if owner != self.router.self_url:
+                if self.mode == "redirect":
+                    self.router.stats["redirected"] += 1
+                    await self._redirect(owner, scope, send)
+                    return
+                if await self._proxy(owner, scope, body, send):
+                    self.router.stats["proxied"] += 1
+                    return
+                self.router.report_failure(owner)
+                logger.warning(f"Owner {owner} unreachable for {video_id}, serving locally")
+            self.router.stats["local"] += 1
+            await self.app(scope, replay, self._tag_served_by(send_and_release))
+        finally:
+            release()
+
+    @staticmethod
+    async def _buffer_body(receive) -> Tuple[bytes, bool, Callable[[], Awaitable[Dict]]]:
+        """
+        Read the request body (up to MAX_ROUTED_BODY)
+        Returns: (body, complete, receive function that replays what was read)
+        """
+        messages = []
+        size = 0
+        complete = False
+        while size <= MAX_ROUTED_BODY:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            size += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                complete = True
+                break
+
+        body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.request")
+        pending = list(messages)
+
+        async def replay():
+            if pending:
+                return pending.pop(0)
+            return await receive()
+
+        return body, complete, replay
+
+    @staticmethod
+    def _video_id(body: bytes) -> str:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return ""
+        url = payload.get("url") if isinstance(payload, dict) else None
+        return extract_video_id(url) if isinstance(url, str) else ""
+
+    def _tag_served_by(self, send):
+        served_by = self.router.self_url.encode()
+
+        async def send_tagged(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(SERVED_BY_HEADER, served_by)]}
+            await send(message)
+
+        return send_tagged
+
+    @staticmethod
+    def _target(owner: str, scope) -> str:
+        query = scope.get("query_string", b"").decode("latin-1")
+        return f"{owner}{scope['path']}" + (f"?{query}" if query else "")
+
+    async def _redirect(self, owner: str, scope, send):
+        await send({
+            "type": "http.response.start",
+            "status": 307,  # Keeps the method and body
+            "headers": [
+                (b"location", self._target(owner, scope).encode()),
+                (b"content-length", b"0"),
+                (SERVED_BY_HEADER, self.router.self_url.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _proxy(self, owner: str, scope, body: bytes, send) -> bool:
+        """
+        Relay the request to the owner and stream its response back
+        Returns False if the owner could not be reached (nothing was sent).
+        """
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope.get("headers", [])
+            if name not in _HOP_BY_HOP and name != b"x-forwarded-for"
+        ]
+        headers.append(("X-Forwarded-For", get_client_ip(scope)))
+        headers.append((HOP_HEADER.decode(), self.router.self_url))
+
+        import aiohttp
+        session = await self.router.session()
+        settings = get_settings()
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=5, sock_read=settings.DOWNLOAD_TIMEOUT)
+        try:
+            response = await session.request(
+                scope["method"], self._target(owner, scope), headers=headers, data=body, timeout=timeout
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Proxy to {owner} failed: {str(e) or type(e).__name__}")
+            return False
+
+        try:
+            # Bodies are relayed undecoded, so Content-Length stays valid. CORS is
+            # applied by this node's own middleware; drop the owner's copy.
+            response_headers = [
+                (name.lower(), value)
+                for name, value in response.raw_headers
+                if (name.lower() == b"content-length" or name.lower() not in _HOP_BY_HOP)
+                and not name.lower().startswith(b"access-control-")
+            ]
+            await send({"type": "http.response.start", "status": response.status, "headers": response_headers})
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            response.release()
+        return True
+
+
+def create_cluster_router() -> ClusterRouter:
+    settings = get_settings()
+    routing_on = settings.CLUSTER_ROUTING in ("proxy", "redirect")
+    return ClusterRouter(
+        settings.CLUSTER_SELF_URL if routing_on else "",
+        settings.CLUSTER_PEERS if routing_on else [],
+        vnodes=settings.CLUSTER_VNODES,
+        load_factor=settings.CLUSTER_LOAD_FACTOR,
+        health_interval=settings.CLUSTER_HEALTH_INTERVAL,
+        health_failures=settings.CLUSTER_HEALTH_FAILURES,
+    )
+
+
+# Global cluster router instance (disabled unless CLUSTER_ROUTING, CLUSTER_SELF_URL and CLUSTER_PEERS are set)
+cluster_router = create_cluster_router()
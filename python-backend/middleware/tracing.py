@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from services.tracing import exporter, log_trace, server_timing, start_trace
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing sampled requests
+
+    A sampled request gets a root span. Spans recorded while handling it
+    (yt-dlp, FFmpeg, Data API calls) are summed per name into a
+    Server-Timing header on the response, next to X-Trace-Id. Spans that
+    end after the response has started (e.g. in streamed bundles) only
+    appear in the JSON log line and the OTLP export written once the
+    response is complete.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope.get("headers") or ():
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        root = start_trace(f"{scope.get('method', 'GET')} {scope.get('path', '')}", traceparent)
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - root.start) * 1000
+                timing = server_timing(root.trace)
+                timing = f"{timing}, app;dur={elapsed:.1f}" if timing else f"app;dur={elapsed:.1f}"
+                message = {
+                    **message,
+                    "headers": list(message.get("headers") or []) + [
+                        (b"server-timing", timing.encode("latin-1")),
+                        (b"x-trace-id", root.trace.trace_id.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        with root:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                endpoint = getattr(scope.get("endpoint"), "__name__", None)
+                root.attributes["status"] = status
+                if endpoint:
+                    root.attributes["endpoint"] = endpoint
+        log_trace(root)
+        if exporter is not None:
+            exporter.submit(root.trace)
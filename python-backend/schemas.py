@@ -34,6 +34,50 @@ class FormatInfo(BaseModel):
     estimated_size_mb: Optional[float] = None
     is_dash: bool = False
 
+class FormatRecord:
+    """
+    One processed format, in the shape of FormatInfo
+
+    YtDlpService builds these once per format and the fetch-formats
+    endpoint encodes them straight to JSON; FormatInfo only documents the
+    shape in the API schema. Numbers are stored as floats, as FormatInfo
+    would coerce them, so the JSON is the same either way.
+    """
+    __slots__ = ('format_id', 'format_name', 'ext', 'height', 'width', 'fps', 'vcodec', 'acodec',
+                 'audio_bitrate', 'video_bitrate', 'estimated_size_mb', 'is_dash')
+
+    def __init__(self, format_id: str, format_name: str, ext: str, height=None, width=None, fps=None,
+                 vcodec: Optional[str] = None, acodec: Optional[str] = None, audio_bitrate=None,
+                 video_bitrate=None, estimated_size_mb=None, is_dash: bool = False):
+        self.format_id = format_id
+        self.format_name = format_name
+        self.ext = ext
+        self.height = None if height is None else float(height)
+        self.width = None if width is None else float(width)
+        self.fps = None if fps is None else float(fps)
+        self.vcodec = vcodec
+        self.acodec = acodec
+        self.audio_bitrate = None if audio_bitrate is None else float(audio_bitrate)
+        self.video_bitrate = None if video_bitrate is None else float(video_bitrate)
+        self.estimated_size_mb = None if estimated_size_mb is None else float(estimated_size_mb)
+        self.is_dash = is_dash
+
+    def to_dict(self) -> dict:
+        return {
+            'format_id': self.format_id,
+            'format_name': self.format_name,
+            'ext': self.ext,
+            'height': self.height,
+            'width': self.width,
+            'fps': self.fps,
+            'vcodec': self.vcodec,
+            'acodec': self.acodec,
+            'audio_bitrate': self.audio_bitrate,
+            'video_bitrate': self.video_bitrate,
+            'estimated_size_mb': self.estimated_size_mb,
+            'is_dash': self.is_dash,
+        }
+
 class FetchFormatsResponse(BaseModel):
     """Response model for fetching formats"""
     success: bool
@@ -97,6 +141,9 @@ class VideoSearchResult(BaseModel):
     channel: str
     published_at: str
     url: str
+    duration: Optional[int] = None
+    views: Optional[str] = None
+    likes: Optional[str] = None
 
 
 class SearchRequest(BaseModel):
@@ -104,6 +151,7 @@ class SearchRequest(BaseModel):
     query: str = Field(..., description="Search query")
     max_results: int = Field(default=20, ge=1, le=50, description="Maximum results to return")
     page_token: Optional[str] = Field(default=None, description="Token for pagination")
+    hydrate: bool = Field(default=False, description="Include duration, views and likes")
 
 
 class SearchResponse(BaseModel):
@@ -132,3 +180,96 @@ class VideoDetailsResponse(BaseModel):
     url: Optional[str] = None
     error: Optional[str] = None
     error_code: Optional[str] = None
+
+
+class VideoDetails(BaseModel):
+    """Details of a single video"""
+    video_id: str
+    title: str
+    description: str
+    thumbnail: str
+    channel: str
+    published_at: str
+    duration: int
+    views: str
+    likes: str
+    url: str
+
+
+class VideoDetailsBatchResponse(BaseModel):
+    """Response model for batched video details"""
+    success: bool
+    videos: List[VideoDetails] = []
+    missing: List[str] = []
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+class TranscodeOutput(BaseModel):
+    """A single output of a multi-output transcode"""
+    format: str = Field(default="mp3", description="Output format: mp3 or m4a")
+    bitrate: str = Field(default="192k", description="Audio bitrate, e.g. 320k")
+    start: Optional[float] = Field(default=None, ge=0, description="Clip start in seconds")
+    duration: Optional[float] = Field(default=None, gt=0, description="Clip length in seconds (for previews)")
+    
+    @validator('format')
+    def validate_format(cls, v):
+        """Validate output format"""
+        if v.lower() not in ['mp3', 'm4a']:
+            raise ValueError("Output format must be mp3 or m4a")
+        return v.lower()
+    
+    @validator('bitrate')
+    def validate_bitrate(cls, v):
+        """Validate bitrate looks like 128k"""
+        if not re.fullmatch(r'\d{2,3}k', v):
+            raise ValueError("Bitrate must look like 192k")
+        return v
+
+
+class TranscodeRequest(BaseModel):
+    """Request model for producing several outputs from one download"""
+    url: str = Field(..., description="YouTube video URL")
+    format_id: str = Field(..., description="Source audio format ID to download")
+    outputs: List[TranscodeOutput] = Field(..., min_length=1, max_length=8, description="Outputs to produce")
+    
+    @validator('url')
+    def validate_url(cls, v):
+        """Validate URL"""
+        youtube_patterns = [
+            r'(?:https?:\/\/)?(?:www\.)?youtube\.com\/watch\?v=[\w-]+',
+            r'(?:https?:\/\/)?(?:www\.)?youtu\.be\/[\w-]+',
+            r'(?:https?:\/\/)?(?:m\.)?youtube\.com\/watch\?v=[\w-]+',
+        ]
+        if not any(re.match(pattern, v) for pattern in youtube_patterns):
+            raise ValueError("Invalid YouTube URL format")
+        return v
+    
+    @validator('format_id')
+    def validate_format_id(cls, v):
+        """Validate format ID is alphanumeric"""
+        if not v.replace('+', '').isalnum():
+            raise ValueError("Invalid format ID")
+        return v
+
+
+class ArtifactInfo(BaseModel):
+    """A published, downloadable artifact"""
+    artifact_id: str
+    filename: str
+    content_type: str
+    size_bytes: int
+    download_url: str
+
+
+class TranscodeResponse(BaseModel):
+    """Response model for multi-output transcoding"""
+    success: bool
+    title: Optional[str] = None
+    artifacts: List[ArtifactInfo] = []
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class BundleRequest(BaseModel):
+    """Request model for downloading several videos as one ZIP"""
+    items: List[DownloadRequest] = Field(..., min_length=1, max_length=50, description="Downloads to bundle")
@@ -1,5 +1,16 @@
-from .yt_dlp_service import YtDlpService
-from .converter_service import ConverterService
-from .youtube_search_service import YouTubeSearchService
+# Services load on first access, so importing one submodule (services.metrics,
+# say) does not import all of them
+_EXPORTS = {
+    'YtDlpService': '.yt_dlp_service',
+    'ConverterService': '.converter_service',
+    'YouTubeSearchService': '.youtube_search_service',
+}
 
 __all__ = ['YtDlpService', 'ConverterService', 'YouTubeSearchService']
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
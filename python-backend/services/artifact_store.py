@@ -0,0 +1,132 @@
+"""Artifact storage for finished downloads"""
+
+import logging
+import os
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from services.state_backend import StateBackendError, state_backend
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class ArtifactStore:
+    """
+    Directory-backed store for finished, servable files
+
+    The index ({path, filename, content_type, ...} per artifact ID) lives in
+    the state backend, so any worker sharing the download directory can
+    serve an artifact published by another.
+    """
+
+    INDEX_TTL = 3600  # Records outlive the files, which the cleanup removes sooner
+
+    @staticmethod
+    def artifact_dir() -> str:
+        """Get (and create) the directory holding published artifacts"""
+        path = os.path.join(settings.TEMP_DOWNLOAD_DIR, "artifacts")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def staging_dir() -> str:
+        """Get a fresh staging directory for outputs that are not published yet"""
+        path = os.path.join(settings.TEMP_DOWNLOAD_DIR, "staging", uuid.uuid4().hex)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @classmethod
+    async def publish(cls, files: List[Tuple[str, str, str]]) -> Tuple[bool, List[Dict]]:
+        """
+        Publish staged files together
+
+        Args:
+            files: List of (staged_path, filename, content_type)
+
+        Returns:
+            Tuple of (success, artifact records). Either every file is
+            published or none is.
+        """
+        artifact_dir = cls.artifact_dir()
+        published = []
+        try:
+            for staged_path, filename, content_type in files:
+                artifact_id = uuid.uuid4().hex
+                ext = os.path.splitext(filename)[1]
+                final_path = os.path.join(artifact_dir, f"{artifact_id}{ext}")
+                # Same filesystem as staging, so this is an atomic rename
+                os.replace(staged_path, final_path)
+                published.append({
+                    'artifact_id': artifact_id,
+                    'path': final_path,
+                    'filename': filename,
+                    'content_type': content_type,
+                    'size_bytes': os.path.getsize(final_path),
+                    'created_at': time.time(),
+                })
+        except OSError as e:
+            logger.error(f"Failed to publish artifacts: {str(e)}")
+            cls._discard(published)
+            return False, []
+
+        try:
+            for record in published:
+                await state_backend.set(f"artifact:{record['artifact_id']}", record, ttl=cls.INDEX_TTL)
+        except StateBackendError as e:
+            # Unindexed files could never be served, so take them back out
+            logger.error(f"Could not index published artifacts: {str(e)}")
+            cls._discard(published)
+            for record in published:
+                await cls._forget(record['artifact_id'])
+            return False, []
+        logger.info(f"Published {len(published)} artifact(s)")
+        return True, published
+
+    @classmethod
+    async def get(cls, artifact_id: str) -> Optional[Dict]:
+        """
+        Look up a published artifact, dropping it if the file is gone
+
+        Raises:
+            StateBackendError: The index could not be read
+        """
+        try:
+            record = await state_backend.get(f"artifact:{artifact_id}")
+        except StateBackendError as e:
+            logger.warning(f"Could not read artifact {artifact_id}: {str(e)}")
+            raise
+        if record and not os.path.exists(record['path']):
+            await cls._forget(artifact_id)
+            return None
+        return record
+
+    @classmethod
+    async def remove(cls, artifact_id: str) -> None:
+        """Remove an artifact and its file"""
+        try:
+            record = await state_backend.get(f"artifact:{artifact_id}")
+        except StateBackendError as e:
+            logger.warning(f"Could not read artifact {artifact_id}: {str(e)}")
+            return
+        await cls._forget(artifact_id)
+        if record:
+            cls._discard([record])
+
+    @staticmethod
+    def _discard(records: List[Dict]) -> None:
+        for record in records:
+            try:
+                os.remove(record['path'])
+            except OSError:
+                pass
+
+    @staticmethod
+    async def _forget(artifact_id: str) -> None:
+        try:
+            await state_backend.delete(f"artifact:{artifact_id}")
+        except StateBackendError as e:
+            logger.warning(f"Could not drop artifact {artifact_id}: {str(e)}")
@@ -0,0 +1,131 @@
+"""Streamed ZIP bundles of several downloads"""
+
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import time
+import zipfile
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+import aiofiles
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# (url, format_id, output_format, temp_dir) -> (output_path, content_type, video_title)
+ProduceFn = Callable[[str, str, str, str], Awaitable[Tuple[str, str, str]]]
+
+
+class _ZipSink:
+    """Write-only, non-seekable buffer that zipfile writes into and we drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class BundleService:
+    """Produce several downloads through a bounded pipeline and stream them as one ZIP"""
+
+    CHUNK_SIZE = 1024 * 1024  # 1MB read size when copying members into the ZIP
+
+    @staticmethod
+    def _unique_name(name: str, used: set) -> str:
+        """Avoid duplicate member names inside the archive"""
+        if name not in used:
+            used.add(name)
+            return name
+        base, ext = os.path.splitext(name)
+        counter = 2
+        while f"{base} ({counter}){ext}" in used:
+            counter += 1
+        unique = f"{base} ({counter}){ext}"
+        used.add(unique)
+        return unique
+
+    @staticmethod
+    async def stream_zip(items: List[Dict], produce: ProduceFn) -> AsyncIterator[bytes]:
+        """
+        Yield a store-mode ZIP of all items, one member as soon as each finishes
+
+        At most BUNDLE_CONCURRENCY items are being produced or waiting to be
+        streamed at any time, so disk and memory use do not grow with bundle
+        size. Failed items are listed in an errors.txt member at the end.
+        """
+        staging_dir = os.path.join(settings.TEMP_DOWNLOAD_DIR, "bundles", f"{time.time_ns()}")
+        os.makedirs(staging_dir, exist_ok=True)
+
+        # A slot is taken before producing an item and only released after its
+        # member has been streamed, bounding finished-but-unsent files on disk
+        slots = asyncio.Semaphore(settings.BUNDLE_CONCURRENCY)
+
+        async def run_item(index: int, item: Dict) -> Tuple[int, str, str]:
+            await slots.acquire()
+            item_dir = os.path.join(staging_dir, str(index))
+            os.makedirs(item_dir, exist_ok=True)
+            output_path, _, _ = await produce(item['url'], item['format_id'], item['output_format'], item_dir)
+            return index, output_path, item_dir
+
+        tasks = [asyncio.ensure_future(run_item(i, item)) for i, item in enumerate(items)]
+        sink = _ZipSink()
+        archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        used_names: set = set()
+        errors: List[str] = []
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    index, output_path, item_dir = await next_done
+                except Exception as e:
+                    slots.release()
+                    detail = getattr(e, "detail", None)
+                    message = detail.get("error") if isinstance(detail, dict) else str(e)
+                    errors.append(message)
+                    logger.warning(f"Bundle item failed: {message}")
+                    continue
+
+                try:
+                    name = BundleService._unique_name(os.path.basename(output_path), used_names)
+                    member = zipfile.ZipInfo.from_file(output_path, arcname=name)
+                    member.compress_type = zipfile.ZIP_STORED
+                    async with aiofiles.open(output_path, "rb") as source:
+                        with archive.open(member, mode="w", force_zip64=member.file_size > zipfile.ZIP64_LIMIT) as dest:
+                            while True:
+                                chunk = await source.read(BundleService.CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                dest.write(chunk)
+                                yield sink.drain()
+                    yield sink.drain()
+                finally:
+                    shutil.rmtree(item_dir, ignore_errors=True)
+                    slots.release()
+
+            if errors:
+                report = "\n".join(f"{i + 1}. {message}" for i, message in enumerate(errors))
+                archive.writestr(BundleService._unique_name("errors.txt", used_names), report)
+            archive.close()
+            yield sink.drain()
+        finally:
+            for task in tasks:
+                task.cancel()
+            shutil.rmtree(staging_dir, ignore_errors=True)
@@ -0,0 +1,168 @@
+"""In-memory LRU cache with fresh and stale lifetimes"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from .state_backend import StateBackend, StateBackendError
+
+logger = logging.getLogger(__name__)
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+class TTLCache:
+    """
+    LRU cache whose entries are fresh for `ttl` seconds and may then be
+    served stale (while being revalidated) for another `stale_ttl` seconds
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # {key: (value, fresh_until, stale_until)}
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, float]]" = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[Optional[Any], str]:
+        """Returns (value, state) where state is 'fresh', 'stale' or 'miss'"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, MISS
+
+        value, fresh_until, stale_until = entry
+        now = time.monotonic()
+        if now >= stale_until:
+            del self._entries[key]
+            self.misses += 1
+            return None, MISS
+
+        self._entries.move_to_end(key)
+        if now < fresh_until:
+            self.hits += 1
+            return value, FRESH
+        self.stale_hits += 1
+        return value, STALE
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Return a live value without touching LRU order or counters"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry[2]:
+            return None
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0.0) -> None:
+        """Store a value, evicting the least recently used entries beyond max_entries"""
+        now = time.monotonic()
+        self._entries[key] = (value, now + ttl, now + ttl + stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+
+class SharedTTLCache(TTLCache):
+    """
+    TTLCache with the shared state backend as a second level
+
+    Lookups that miss locally fall through to the backend, so a result
+    fetched by one worker is a hit for every other worker; writes go to
+    both. With a per-process backend this behaves exactly like TTLCache.
+    `encode`/`decode` convert values to and from JSON-friendly form.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        backend: StateBackend,
+        namespace: str,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ):
+        super().__init__(max_entries)
+        self.backend = backend
+        self.namespace = namespace
+        self.encode = encode
+        self.decode = decode
+        self.shared_hits = 0
+
+    def _backend_key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key if isinstance(key, str) else json.dumps(key, ensure_ascii=False)}"
+
+    async def aget(self, key: Hashable) -> Tuple[Optional[Any], str]:
+        """Like get(), falling back to the shared backend on a local miss"""
+        value, state = self.get(key)
+        if state != MISS or not self.backend.shared:
+            return value, state
+        try:
+            stored = await self.backend.get(self._backend_key(key))
+        except StateBackendError as e:
+            logger.warning(f"Shared cache lookup failed: {str(e)}")
+            return None, MISS
+        if stored is None:
+            return None, MISS
+
+        now = time.time()
+        fresh_left = stored['fresh_until'] - now
+        stale_left = stored['stale_until'] - now
+        if stale_left <= 0:
+            return None, MISS
+        value = self.decode(stored['value'])
+        self.set(key, value, max(fresh_left, 0.0), stale_left - max(fresh_left, 0.0))
+
+        # Recount the local miss as a hit
+        self.misses -= 1
+        self.shared_hits += 1
+        if fresh_left > 0:
+            self.hits += 1
+            return value, FRESH
+        self.stale_hits += 1
+        return value, STALE
+
+    async def aset(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0.0) -> None:
+        """Store locally and in the shared backend"""
+        self.set(key, value, ttl, stale_ttl)
+        if not self.backend.shared:
+            return
+        now = time.time()
+        try:
+            await self.backend.set(
+                self._backend_key(key),
+                {'value': self.encode(value), 'fresh_until': now + ttl, 'stale_until': now + ttl + stale_ttl},
+                ttl=ttl + stale_ttl,
+            )
+        except StateBackendError as e:
+            logger.warning(f"Shared cache write failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["shared_hits"] = self.shared_hits
+        return stats
@@ -1,19 +1,46 @@
 import asyncio
 import logging
 import os
+import re
 import subprocess
 import shutil
 import sys
+import threading
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
 from config import get_settings
+from services.metrics import timed
+from services.tracing import traced
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Printed by `ffmpeg -benchmark` when it exits
+_BENCH_PATTERN = re.compile(r'utime=([\d.]+)s\s+stime=([\d.]+)s')
+
 class ConverterService:
     """Service for audio/video conversion using FFmpeg"""
+
+    active_processes = 0  # FFmpeg processes running now, across executor threads
+    _active_lock = threading.Lock()
+
+    @staticmethod
+    def _run_ffmpeg(cmd: List[str]) -> Tuple[int, str]:
+        """Run FFmpeg to completion (in an executor thread); returns (returncode, stderr)"""
+        with ConverterService._active_lock:
+            ConverterService.active_processes += 1
+        try:
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=settings.DOWNLOAD_TIMEOUT
+            )
+            return result.returncode, result.stderr
+        finally:
+            with ConverterService._active_lock:
+                ConverterService.active_processes -= 1
     
     @staticmethod
     def _check_ffmpeg_installed() -> bool:
@@ -54,6 +81,15 @@ class ConverterService:
             return settings.FFMPEG_PATH
         return 'ffmpeg'
     
+    @staticmethod
+    def _record_cpu(stderr: str, stats: Optional[Dict]):
+        """Add the CPU-seconds reported by `-benchmark` to a caller's stats dict"""
+        if stats is None:
+            return
+        match = _BENCH_PATTERN.search(stderr or "")
+        if match:
+            stats['cpu_seconds'] = stats.get('cpu_seconds', 0.0) + float(match.group(1)) + float(match.group(2))
+
     @staticmethod
     def _get_ffprobe_cmd() -> str:
         """Get FFprobe command path"""
@@ -62,13 +98,18 @@ class ConverterService:
         return 'ffprobe'
 
     @staticmethod
+    @timed("convert_to_mp3")
+    @traced("ffmpeg.mp3")
     async def convert_to_mp3(
         input_path: str,
         output_path: str,
-        bitrate: str = "192k"
+        bitrate: str = "192k",
+        stats: Optional[Dict] = None
     ) -> Tuple[bool, str]:
         """
         Convert audio file to MP3 using FFmpeg
+
+        If `stats` is given, the FFmpeg CPU time is added to stats['cpu_seconds'].
         Returns: (success: bool, message: str)
         """
         try:
@@ -84,6 +125,7 @@ class ConverterService:
             # FFmpeg command to convert to MP3
             cmd = [
                 ConverterService._get_ffmpeg_cmd(),
+                '-benchmark',  # Report CPU time for cost accounting
                 '-i', input_path,
                 '-q:a', '0',  # Highest quality
                 '-map', 'a',  # Map audio stream
@@ -94,16 +136,8 @@ class ConverterService:
             
             loop = asyncio.get_event_loop()
             
-            def run_ffmpeg():
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=settings.DOWNLOAD_TIMEOUT
-                )
-                return result.returncode, result.stderr
-            
-            returncode, stderr = await loop.run_in_executor(None, run_ffmpeg)
+            returncode, stderr = await loop.run_in_executor(None, ConverterService._run_ffmpeg, cmd)
+            ConverterService._record_cpu(stderr, stats)
             
             if returncode != 0:
                 logger.error(f"FFmpeg conversion failed: {stderr}")
@@ -121,6 +155,88 @@ class ConverterService:
             logger.error(f"Error converting to MP3: {str(e)}")
             return False, f"Conversion error: {str(e)}"
 
+    # Encoder settings for each supported multi-output container
+    _AUDIO_CODECS = {
+        'mp3': ['-c:a', 'libmp3lame'],
+        'm4a': ['-c:a', 'aac'],
+    }
+
+    @staticmethod
+    def _build_multi_output_cmd(input_path: str, outputs: List[Dict]) -> List[str]:
+        """
+        Build one FFmpeg command that decodes the input once and encodes every output
+
+        Each output dict has: path, format (mp3/m4a), bitrate and optional
+        start/duration (in seconds) for preview clips.
+        """
+        cmd = [ConverterService._get_ffmpeg_cmd(), '-y', '-benchmark', '-i', input_path]
+        for output in outputs:
+            # Mapping the same input stream into several outputs shares a single decoder
+            cmd += ['-map', '0:a:0']
+            cmd += ConverterService._AUDIO_CODECS[output['format']]
+            cmd += ['-b:a', output['bitrate']]
+            if output.get('start'):
+                cmd += ['-ss', str(output['start'])]
+            if output.get('duration'):
+                cmd += ['-t', str(output['duration'])]
+            cmd.append(output['path'])
+        return cmd
+
+    @staticmethod
+    @timed("transcode_multi")
+    @traced("ffmpeg.transcode")
+    async def transcode_multi(
+        input_path: str,
+        outputs: List[Dict],
+        stats: Optional[Dict] = None
+    ) -> Tuple[bool, Dict]:
+        """
+        Produce several audio outputs from one input in a single FFmpeg run
+
+        Example outputs: 320k/192k/128k MP3 plus a 30 second preview clip.
+        If `stats` is given, the FFmpeg CPU time is added to stats['cpu_seconds'].
+        Returns: (success: bool, data: dict with output paths or error info)
+        """
+        try:
+            if not os.path.exists(input_path):
+                return False, {"error": f"Input file not found: {input_path}", "error_code": "INPUT_NOT_FOUND"}
+
+            if not outputs:
+                return False, {"error": "No outputs requested", "error_code": "NO_OUTPUTS"}
+
+            for output in outputs:
+                if output.get('format') not in ConverterService._AUDIO_CODECS:
+                    return False, {"error": f"Unsupported output format: {output.get('format')}", "error_code": "INVALID_OUTPUT_FORMAT"}
+
+            is_valid, msg = await ConverterService.validate_ffmpeg()
+            if not is_valid:
+                return False, {"error": msg, "error_code": "FFMPEG_NOT_AVAILABLE"}
+
+            cmd = ConverterService._build_multi_output_cmd(input_path, outputs)
+            logger.info(f"Transcoding {input_path} into {len(outputs)} outputs in one pass")
+
+            loop = asyncio.get_event_loop()
+
+            returncode, stderr = await loop.run_in_executor(None, ConverterService._run_ffmpeg, cmd)
+            ConverterService._record_cpu(stderr, stats)
+
+            if returncode != 0:
+                logger.error(f"FFmpeg multi-output transcode failed: {stderr}")
+                return False, {"error": f"Conversion failed: {stderr}", "error_code": "CONVERSION_ERROR"}
+
+            missing = [o['path'] for o in outputs if not os.path.exists(o['path'])]
+            if missing:
+                return False, {"error": f"Output files were not created: {missing}", "error_code": "OUTPUT_NOT_CREATED"}
+
+            logger.info(f"Successfully transcoded {len(outputs)} outputs")
+            return True, {"outputs": [o['path'] for o in outputs]}
+
+        except subprocess.TimeoutExpired:
+            return False, {"error": "Conversion timeout", "error_code": "CONVERSION_TIMEOUT"}
+        except Exception as e:
+            logger.error(f"Error in multi-output transcode: {str(e)}")
+            return False, {"error": f"Conversion error: {str(e)}", "error_code": "CONVERSION_ERROR"}
+
     @staticmethod
     async def get_audio_duration(file_path: str) -> int:
         """
@@ -158,6 +274,8 @@ class ConverterService:
             return 0
 
     @staticmethod
+    @timed("merge_video_audio")
+    @traced("ffmpeg.merge")
     async def merge_video_audio(
         video_path: str,
         audio_path: str,
@@ -193,16 +311,7 @@ class ConverterService:
             
             loop = asyncio.get_event_loop()
             
-            def run_ffmpeg():
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=settings.DOWNLOAD_TIMEOUT
-                )
-                return result.returncode, result.stderr
-            
-            returncode, stderr = await loop.run_in_executor(None, run_ffmpeg)
+            returncode, stderr = await loop.run_in_executor(None, ConverterService._run_ffmpeg, cmd)
             
             if returncode != 0:
                 logger.error(f"FFmpeg merge failed: {stderr}")
@@ -0,0 +1,131 @@
+"""Cached load snapshot behind the readiness probe"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from services.loop_monitor import loop_monitor
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that counts work items submitted and not yet finished"""
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._count_lock:
+            self.in_flight += 1
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future: Optional[Future]):
+        with self._count_lock:
+            self.in_flight -= 1
+
+    @property
+    def queue_depth(self) -> int:
+        """Work items waiting for a thread"""
+        return max(0, self.in_flight - self.max_workers)
+
+    @property
+    def free_slots(self) -> int:
+        """Threads that could start a work item now"""
+        return max(0, self.max_workers - self.in_flight)
+
+
+class ReadinessMonitor:
+    """
+    Refreshes a load snapshot every `interval` seconds and judges readiness from it
+
+    Probes only read the last snapshot, so they cost a dict copy however
+    often the load balancer polls. Event-loop lag is the loop monitor's
+    worst over its last few seconds, so one stall keeps the node out of
+    rotation briefly rather than for a single probe. A snapshot older than
+    three intervals means the refresh task itself is starved, which is
+    reported as not ready too.
+    """
+
+    def __init__(self, collect: Callable[[], Awaitable[Dict]], interval: float):
+        self.collect = collect
+        self.interval = interval
+        self.snapshot: Dict = {}
+        self.reasons: List[str] = ["starting"]
+        self.updated_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Readiness snapshot failed: {str(e)}")
+
+    async def refresh(self):
+        snapshot = await self.collect()
+        snapshot["loop_lag_ms"] = round(loop_monitor.recent_max_lag_ms(), 1)
+        snapshot["loop_blocks"] = loop_monitor.blocks
+        reasons = self.evaluate(snapshot)
+        if reasons != self.reasons:
+            if reasons:
+                logger.warning(f"Not ready: {', '.join(reasons)}")
+            else:
+                logger.info("Ready")
+        self.snapshot, self.reasons, self.updated_at = snapshot, reasons, time.monotonic()
+
+    @staticmethod
+    def evaluate(snapshot: Dict) -> List[str]:
+        """Why the node should not take new work; empty when it is ready"""
+        reasons = []
+        if not snapshot.get("ffmpeg_available", True):
+            reasons.append("ffmpeg unavailable")
+        if snapshot.get("executor_queue_depth", 0) > settings.READY_MAX_QUEUE_DEPTH:
+            reasons.append(f"executor queue depth {snapshot['executor_queue_depth']} > {settings.READY_MAX_QUEUE_DEPTH}")
+        if snapshot.get("ffmpeg_processes", 0) > settings.READY_MAX_FFMPEG_PROCESSES:
+            reasons.append(f"{snapshot['ffmpeg_processes']} FFmpeg processes > {settings.READY_MAX_FFMPEG_PROCESSES}")
+        free_disk = snapshot.get("temp_disk_free_mb")
+        if free_disk is not None and free_disk < settings.READY_MIN_FREE_DISK_MB:
+            reasons.append(f"temp disk free {free_disk:.0f} MB < {settings.READY_MIN_FREE_DISK_MB} MB")
+        if snapshot.get("loop_lag_ms", 0) > settings.READY_MAX_LOOP_LAG_MS:
+            reasons.append(f"event loop lag {snapshot['loop_lag_ms']:.0f} ms > {settings.READY_MAX_LOOP_LAG_MS} ms")
+        return reasons
+
+    def status(self) -> Dict:
+        """The readiness verdict and the snapshot it was based on"""
+        age = time.monotonic() - self.updated_at
+        reasons = list(self.reasons)
+        if self.updated_at and age > self.interval * 3:
+            reasons.append(f"snapshot {age:.1f}s old")
+        return {
+            "ready": not reasons,
+            "reasons": reasons,
+            "snapshot_age_seconds": round(age, 2) if self.updated_at else None,
+            **self.snapshot,
+        }
@@ -0,0 +1,277 @@
+"""Expiry and disk-usage control for files in the download directory"""
+
+import asyncio
+import heapq
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from services.storage import storage
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class Janitor:
+    """
+    One background task that removes finished files when they expire
+
+    Files are tracked with an expiry time in a min-heap, so the task sleeps
+    until the next expiry instead of holding a sleeping coroutine per file.
+    A file is held (reference-counted) while it is being served and is only
+    removed once released. Usage of the download and scratch directories
+    is measured periodically (in-progress jobs, .part files and staging
+    included); when it exceeds the high-water mark, the oldest unreferenced
+    finished files are evicted early, down to the low-water mark. At startup and shutdown, files left behind by crashed jobs
+    (.part files, intermediate audio, staging directories) are reclaimed
+    from the download and scratch directories.
+    """
+
+    RETRY_SECONDS = 30  # Re-check for an expired file that is still being served
+    USAGE_INTERVAL = 10.0  # Seconds between measurements of the directories' real size
+
+    def __init__(self, roots: List[str], high_water_bytes: int, low_water_bytes: int, orphan_age: float):
+        self.roots = roots
+        self.high_water_bytes = high_water_bytes
+        self.low_water_bytes = low_water_bytes
+        self.orphan_age = orphan_age
+        # {path: {size, created_at, expires_at, refs, held_until}}
+        self._entries: Dict[str, Dict] = {}
+        # (expires_at, path); entries whose expiry has since changed are skipped when popped
+        self._heap: List[Tuple[float, str]] = []
+        self._tracked_bytes = 0
+        self._usage_bytes = 0  # Last measured size of every root, adjusted for files removed since
+        self._measured_at = float("-inf")
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'expired': 0, 'evicted': 0, 'orphans': 0, 'reclaimed_bytes': 0}
+
+    def _entry(self, path: str) -> Dict:
+        entry = self._entries.get(path)
+        if entry is None:
+            entry = {'size': 0, 'created_at': time.monotonic(), 'expires_at': None, 'refs': 0, 'held_until': 0.0}
+            self._entries[path] = entry
+        return entry
+
+    def track(self, path: str, ttl: float) -> None:
+        """Remove path ttl seconds from now (or later, if it is already tracked for longer)"""
+        entry = self._entry(path)
+        expires_at = time.monotonic() + ttl
+        if entry['expires_at'] is not None and entry['expires_at'] >= expires_at:
+            return
+        if entry['expires_at'] is None:
+            try:
+                entry['size'] = os.path.getsize(path)
+            except OSError:
+                entry['size'] = 0
+            self._tracked_bytes += entry['size']
+        entry['expires_at'] = expires_at
+        heapq.heappush(self._heap, (expires_at, path))
+        self._notify()
+
+    def acquire(self, path: str) -> None:
+        """Hold path while it is being served; holds lapse after DOWNLOAD_TIMEOUT in case a release is lost"""
+        entry = self._entry(path)
+        entry['refs'] += 1
+        entry['held_until'] = time.monotonic() + settings.DOWNLOAD_TIMEOUT
+
+    def release(self, path: str) -> None:
+        entry = self._entries.get(path)
+        if entry is None:
+            return
+        entry['refs'] = max(0, entry['refs'] - 1)
+        if entry['refs'] == 0 and entry['expires_at'] is None:
+            # Held but never tracked (e.g. a job that failed while being tailed)
+            del self._entries[path]
+
+    def _is_held(self, entry: Dict, now: float) -> bool:
+        return entry['refs'] > 0 and now < entry['held_until']
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _remove(self, path: str) -> int:
+        """Remove a tracked file and its now-empty job directory; returns the bytes reclaimed"""
+        entry = self._entries.pop(path)
+        self._tracked_bytes -= entry['size']
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {str(e)}")
+            return 0
+        self._prune_dir(os.path.dirname(path))
+        self._usage_bytes = max(0, self._usage_bytes - size)
+        self.stats['reclaimed_bytes'] += size
+        return size
+
+    def _prune_dir(self, directory: str):
+        # Only per-job directories (two levels down, e.g. jobs/<id>), never the root or its top-level dirs
+        relatives = [os.path.relpath(directory, root) for root in self.roots]
+        if not any(os.sep in r and not r.startswith(os.pardir) for r in relatives):
+            return
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass  # Not empty, or already gone
+
+    def measure_usage(self) -> int:
+        """Total size of every file under the roots (blocking; run in a thread)"""
+        total = 0
+
+        def walk(directory: str):
+            nonlocal total
+            try:
+                with os.scandir(directory) as entries:
+                    for item in entries:
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                walk(item.path)
+                            else:
+                                total += item.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue  # Removed meanwhile
+            except OSError:
+                pass
+
+        for root in self.roots:
+            walk(root)
+        return total
+
+    def collect(self) -> None:
+        """Remove expired files, then evict the oldest unheld files while usage is over the high-water mark"""
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, path = heapq.heappop(self._heap)
+            entry = self._entries.get(path)
+            if entry is None or entry['expires_at'] != expires_at:
+                continue
+            if self._is_held(entry, now):
+                entry['expires_at'] = now + self.RETRY_SECONDS
+                heapq.heappush(self._heap, (entry['expires_at'], path))
+                continue
+            if self._remove(path):
+                self.stats['expired'] += 1
+
+        if self._usage_bytes > self.high_water_bytes:
+            before = self._usage_bytes
+            candidates = sorted(
+                (entry['created_at'], path)
+                for path, entry in self._entries.items()
+                if entry['expires_at'] is not None and not self._is_held(entry, now)
+            )
+            evicted = 0
+            for _, path in candidates:
+                if self._usage_bytes <= self.low_water_bytes:
+                    break
+                self._remove(path)
+                evicted += 1
+            self.stats['evicted'] += evicted
+            logger.warning(
+                f"Download dir over high-water mark: evicted {evicted} file(s), "
+                f"{(before - self._usage_bytes) / 1e6:.1f} MB; {self._usage_bytes / 1e6:.1f} MB still in use"
+            )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wake.clear()
+            wake_at = self._measured_at + self.USAGE_INTERVAL
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, wake_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            try:
+                if time.monotonic() - self._measured_at >= self.USAGE_INTERVAL:
+                    self._usage_bytes = await loop.run_in_executor(None, self.measure_usage)
+                    self._measured_at = time.monotonic()
+                self.collect()
+            except Exception as e:
+                logger.error(f"Janitor pass failed: {str(e)}")
+
+    def reclaim_orphans(self) -> Tuple[int, int]:
+        """
+        Remove untracked files older than orphan_age and empty job directories
+
+        Age-gated so in-progress files of other workers sharing the directory
+        (whose mtime keeps moving while they are written) are left alone.
+        Returns: (files, bytes) reclaimed.
+        """
+        tracked = set(self._entries)
+        cutoff = time.time() - self.orphan_age
+        files = reclaimed = 0
+
+        def sweep(directory: str) -> bool:
+            """Returns whether anything was removed from directory"""
+            nonlocal files, reclaimed
+            removed = False
+            with os.scandir(directory) as entries:
+                for item in entries:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            # A fresh empty directory may belong to a job that is just starting
+                            if sweep(item.path) or item.stat(follow_symlinks=False).st_mtime <= cutoff:
+                                self._prune_dir(item.path)
+                            continue
+                        stat = item.stat(follow_symlinks=False)
+                        if item.path in tracked or stat.st_mtime > cutoff:
+                            continue
+                        os.remove(item.path)
+                        removed = True
+                        files += 1
+                        reclaimed += stat.st_size
+                    except FileNotFoundError:
+                        continue  # Removed by someone else meanwhile
+                    except OSError as e:
+                        logger.warning(f"Could not reclaim {item.path}: {str(e)}")
+            return removed
+
+        for root in self.roots:
+            if os.path.isdir(root):
+                sweep(root)
+        self.stats['orphans'] += files
+        self.stats['reclaimed_bytes'] += reclaimed
+        return files, reclaimed
+
+    async def start(self):
+        """Reclaim orphans from earlier runs, then start the expiry task"""
+        files, reclaimed = await asyncio.get_running_loop().run_in_executor(None, self.reclaim_orphans)
+        if files:
+            logger.info(f"Reclaimed {files} orphaned file(s), {reclaimed / 1e6:.1f} MB")
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(None, self.reclaim_orphans)
+        logger.info(
+            f"Janitor reclaimed {self.stats['reclaimed_bytes'] / 1e6:.1f} MB this run "
+            f"({self.stats['expired']} expired, {self.stats['evicted']} evicted, {self.stats['orphans']} orphaned)"
+        )
+
+    def snapshot(self) -> Dict:
+        return {
+            'tracked_files': sum(1 for e in self._entries.values() if e['expires_at'] is not None),
+            'tracked_bytes': self._tracked_bytes,
+            'usage_bytes': self._usage_bytes,
+            'high_water_bytes': self.high_water_bytes,
+            **self.stats,
+        }
+
+
+janitor = Janitor(
+    sorted({settings.TEMP_DOWNLOAD_DIR, storage.scratch_root}),
+    high_water_bytes=int(settings.DOWNLOAD_DIR_HIGH_WATER_MB * 1024 * 1024),
+    low_water_bytes=int(settings.DOWNLOAD_DIR_LOW_WATER_MB * 1024 * 1024),
+    orphan_age=settings.ORPHAN_FILE_AGE,
+)
@@ -0,0 +1,71 @@
+"""Download/transcode job state visible to every worker"""
+
+import logging
+import os
+import socket
+import sys
+import time
+import uuid
+from typing import Dict, Optional
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from services.state_backend import StateBackendError, state_backend
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobStore:
+    """
+    Job records ({kind, status, worker, timings, ...}) in the state backend
+
+    Records expire JOB_STATE_TTL seconds after their last update. Failing
+    to record state never fails the job itself.
+    """
+
+    @staticmethod
+    async def start(kind: str, **details) -> str:
+        """Record a new running job; returns its ID"""
+        job_id = uuid.uuid4().hex
+        await JobStore._save({
+            'job_id': job_id,
+            'kind': kind,
+            'status': RUNNING,
+            'worker': WORKER_ID,
+            'started_at': time.time(),
+            'finished_at': None,
+            'error': None,
+            **details,
+        })
+        return job_id
+
+    @staticmethod
+    async def finish(job_id: str, error: Optional[str] = None, **details) -> None:
+        """Mark a job done (or failed, when error is given)"""
+        record = await JobStore.get(job_id) or {'job_id': job_id, 'worker': WORKER_ID}
+        record.update(details)
+        record['status'] = FAILED if error else DONE
+        record['error'] = error
+        record['finished_at'] = time.time()
+        await JobStore._save(record)
+
+    @staticmethod
+    async def get(job_id: str) -> Optional[Dict]:
+        try:
+            return await state_backend.get(f"job:{job_id}")
+        except StateBackendError as e:
+            logger.warning(f"Could not read job {job_id}: {str(e)}")
+            return None
+
+    @staticmethod
+    async def _save(record: Dict) -> None:
+        try:
+            await state_backend.set(f"job:{record['job_id']}", record, ttl=settings.JOB_STATE_TTL)
+        except StateBackendError as e:
+            logger.warning(f"Could not record job {record['job_id']}: {str(e)}")
@@ -0,0 +1,136 @@
+"""Event-loop lag measurement and a watchdog that reports blocking callbacks"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, Optional, Tuple
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from services.metrics import loop_blocks_total, loop_lag_seconds
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag continuously and catches callbacks that block the loop
+
+    A heartbeat task sleeps for `interval` and records how late it woke
+    up; that lag goes to ytdl_event_loop_lag_seconds, and a lag above
+    `block_threshold` counts as a block. A watchdog thread checks the
+    heartbeat: when it has not run for longer than the threshold, the
+    loop is stuck in one callback right now, so the watchdog logs that
+    thread's stack (once per stall, and at most once per `log_interval`
+    for the same code location, with a count of the repeats it skipped).
+    """
+
+    MAX_TRACKED_STACKS = 256
+
+    def __init__(self, interval: float, block_threshold: float, log_interval: float, window: float = 5.0):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.log_interval = log_interval
+        self.window = window
+        self.blocks = 0
+        self.max_lag = 0.0
+        self._recent: deque = deque()  # (monotonic time, lag) within the window
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._logged: Dict[Tuple, list] = {}  # Stack key -> [last logged at, repeats skipped since]
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def close(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - scheduled)
+            now = time.monotonic()
+            self._last_beat = now
+            self.record(lag, now)
+
+    def record(self, lag: float, now: float):
+        loop_lag_seconds.observe(lag)
+        self.max_lag = max(self.max_lag, lag)
+        self._recent.append((now, lag))
+        while self._recent and self._recent[0][0] < now - self.window:
+            self._recent.popleft()
+        if lag >= self.block_threshold:
+            self.blocks += 1
+            loop_blocks_total.inc()
+
+    def recent_max_lag_ms(self) -> float:
+        """Worst lag over the last `window` seconds, including a stall in progress"""
+        stalled = time.monotonic() - self._last_beat - self.interval
+        worst = max((lag for _, lag in self._recent), default=0.0)
+        return max(worst, stalled, 0.0) * 1000
+
+    def _watch(self):
+        reported = False
+        while not self._stop.wait(self.block_threshold / 4):
+            stalled = time.monotonic() - self._last_beat - self.interval
+            if stalled < self.block_threshold:
+                reported = False
+            elif not reported:
+                reported = True
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._report(traceback.extract_stack(frame), stalled)
+
+    def _report(self, stack: traceback.StackSummary, stalled: float):
+        # The innermost frames identify the blocking call; deeper ones vary by request
+        key = tuple((f.filename, f.lineno) for f in stack[-3:])
+        now = time.monotonic()
+        entry = self._logged.get(key)
+        if entry is not None and now - entry[0] < self.log_interval:
+            entry[1] += 1
+            return
+        skipped = entry[1] if entry is not None else 0
+        if entry is None and len(self._logged) >= self.MAX_TRACKED_STACKS:
+            self._logged.pop(next(iter(self._logged)))
+        self._logged[key] = [now, 0]
+        repeats = f" ({skipped} more stalls here since the last report)" if skipped else ""
+        logger.warning(
+            f"Event loop blocked for over {stalled * 1000:.0f} ms{repeats}; blocking call:\n"
+            + "".join(traceback.format_list(stack[-12:]))
+        )
+
+    def snapshot(self) -> Dict:
+        return {
+            "recent_max_lag_ms": round(self.recent_max_lag_ms(), 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "blocks": self.blocks,
+            "block_threshold_ms": self.block_threshold * 1000,
+        }
+
+
+loop_monitor = LoopMonitor(
+    settings.LOOP_MONITOR_INTERVAL,
+    settings.LOOP_BLOCK_THRESHOLD_MS / 1000,
+    settings.LOOP_BLOCK_LOG_INTERVAL,
+)
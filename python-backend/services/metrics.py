@@ -0,0 +1,283 @@
+"""Prometheus metrics (text exposition format), without a client library"""
+
+import bisect
+import functools
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW = "other"  # Label value used once a metric has reached its series limit
+
+# Seconds; stages range from cache-warm extractions to hour-long downloads
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """
+    A named metric with a bounded set of label combinations (series)
+
+    Label values beyond max_series are folded into a single "other" series,
+    so a bug that labels by URL or video ID cannot grow memory or scrape
+    size without bound.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), max_series: int = 64):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh value holder for one series"""
+
+    def labels(self, *values: str):
+        """The series for these label values; keep the result to skip the lookup on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            if len(self._children) >= self.max_series:
+                values = (OVERFLOW,) * len(values)
+                child = self._children.get(values)
+                if child is not None:
+                    return child
+                logger.warning(f"Metric {self.name} reached {self.max_series} series; folding new labels into '{OVERFLOW}'")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled.value += amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._unlabelled.value = value
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS, max_series: int = 64):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, max_series)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabelled.observe(value)
+
+    def _render_child(self, values: Tuple[str, ...], child: _HistogramValue) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    A gauge or counter read from existing state at scrape time
+
+    fn returns a single value, or {label values tuple: value}. Errors in fn
+    drop the metric from that scrape instead of failing it.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Union[float, Dict[Tuple[str, ...], float]]], labelnames: Sequence[str] = (), type: str = "gauge"):
+        self.fn = fn
+        self.type = type
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _new_child(self):
+        raise TypeError(f"Metric {self.name} is read from its callback and has no series to set")
+
+    def render(self) -> List[str]:
+        try:
+            result = self.fn()
+        except Exception as e:
+            logger.warning(f"Metric {self.name} failed: {str(e)}")
+            return []
+        if result is None:
+            return []
+        series = result if isinstance(result, dict) else {(): result}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, value in series.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = STAGE_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, fn: Callable, labelnames: Sequence[str] = (), type: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, fn, labelnames, type))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "ytdl_stage_duration_seconds",
+    "Time spent in each processing stage",
+    ["stage"],
+)
+http_request_seconds = registry.histogram(
+    "ytdl_http_request_duration_seconds",
+    "HTTP request duration by endpoint, until the last body byte is sent",
+    ["endpoint"],
+    buckets=REQUEST_BUCKETS,
+)
+http_requests_total = registry.counter(
+    "ytdl_http_requests_total",
+    "HTTP requests by endpoint and status code",
+    ["endpoint", "status"],
+)
+errors_total = registry.counter(
+    "ytdl_errors_total",
+    "Error responses by error_code",
+    ["error_code"],
+)
+bytes_downloaded_total = registry.counter(
+    "ytdl_bytes_downloaded_total",
+    "Bytes downloaded from YouTube by yt-dlp",
+)
+bytes_served_total = registry.counter(
+    "ytdl_bytes_served_total",
+    "Response body bytes sent, by endpoint",
+    ["endpoint"],
+)
+
+loop_lag_seconds = registry.histogram(
+    "ytdl_event_loop_lag_seconds",
+    "How late the event loop ran a timer due now (sampled by the loop monitor)",
+    buckets=LOOP_LAG_BUCKETS,
+)
+loop_blocks_total = registry.counter(
+    "ytdl_event_loop_blocks_total",
+    "Times a callback held the event loop longer than LOOP_BLOCK_THRESHOLD_MS",
+)
+
+
+def timed(stage: str):
+    """Decorator recording an async function's duration under ytdl_stage_duration_seconds{stage}"""
+    child = stage_seconds.labels(stage)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
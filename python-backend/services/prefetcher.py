@@ -0,0 +1,101 @@
+"""Background prefetch of format metadata for top search results"""
+
+import asyncio
+import logging
+import os
+import sys
+from typing import Dict, List, Optional
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from .health import CountingExecutor
+from .yt_dlp_service import YtDlpService
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class Prefetcher:
+    """
+    Warms YtDlpService's format cache for the first results of each search
+
+    Prefetches run on their own small thread pool, are skipped while the
+    node is busy with user jobs, and never duplicate a cached or in-flight
+    extraction.
+    """
+
+    def __init__(self, concurrency: int, top_n: int, busy_threshold: int):
+        self.concurrency = concurrency
+        self.top_n = top_n
+        self.busy_threshold = busy_threshold
+        self._executor: Optional[CountingExecutor] = None
+        self._pending: set = set()  # Video IDs queued or running
+        self._tasks: set = set()
+        self.stats = {'scheduled': 0, 'skipped_cached': 0, 'skipped_busy': 0, 'failed': 0}
+
+    def _get_executor(self) -> CountingExecutor:
+        if self._executor is None:
+            self._executor = CountingExecutor(self.concurrency, thread_name_prefix="prefetch")
+        return self._executor
+
+    def is_busy(self) -> bool:
+        """Too many user jobs running, or the prefetch pool already saturated"""
+        return YtDlpService.active_jobs >= self.busy_threshold or len(self._pending) >= self.concurrency * 2
+
+    def schedule(self, video_ids: List[str]):
+        """Prefetch format metadata for the top N video IDs"""
+        if not settings.PREFETCH_ENABLED:
+            return
+        for video_id in video_ids[:self.top_n]:
+            url = f"https://www.youtube.com/watch?v={video_id}"
+            if video_id in self._pending or YtDlpService.is_cached(url):
+                self.stats['skipped_cached'] += 1
+                continue
+            if self.is_busy():
+                self.stats['skipped_busy'] += 1
+                continue
+            self._pending.add(video_id)
+            self.stats['scheduled'] += 1
+            task = asyncio.create_task(self._prefetch(video_id, url))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _prefetch(self, video_id: str, url: str):
+        try:
+            # Re-check: the node may have become busy since scheduling
+            if YtDlpService.active_jobs >= self.busy_threshold:
+                self.stats['skipped_busy'] += 1
+                return
+            success, _ = await YtDlpService.fetch_formats(url, executor=self._get_executor(), prefetch=True)
+            if not success:
+                self.stats['failed'] += 1
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.warning(f"Prefetch failed for {video_id}: {str(e)}")
+        finally:
+            self._pending.discard(video_id)
+
+    def snapshot(self) -> Dict:
+        prefetched = YtDlpService.prefetch_stats['prefetched']
+        hits = YtDlpService.prefetch_stats['hits']
+        return {
+            **self.stats,
+            'enabled': settings.PREFETCH_ENABLED,
+            'pending': len(self._pending),
+            'prefetched': prefetched,
+            'prefetch_hits': hits,
+            'prefetch_hit_ratio': round(hits / prefetched, 4) if prefetched else 0.0,
+        }
+
+    def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global prefetcher instance
+prefetcher = Prefetcher(
+    settings.PREFETCH_CONCURRENCY,
+    settings.PREFETCH_TOP_N,
+    settings.PREFETCH_BUSY_THRESHOLD,
+)
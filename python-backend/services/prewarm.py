@@ -0,0 +1,65 @@
+"""Background loading of the dependencies that are imported on first use"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, Optional
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from services.yt_dlp_service import YtDlpService
+
+logger = logging.getLogger(__name__)
+
+
+def _import_aiohttp():
+    import aiohttp  # noqa: F401  (Data API client, OTLP export, cluster routing)
+
+
+class Prewarmer:
+    """
+    Runs slow one-time setup steps in an executor thread right after startup
+
+    yt-dlp and aiohttp are imported where they are first used, which keeps
+    them off the startup path: the worker binds its socket and answers
+    health probes without waiting for them. Started at the end of the
+    lifespan startup, this loads them while uvicorn starts listening, so
+    the first fetch-formats or search request does not pay for them
+    either. A request that needs one of them before the step finishes
+    just waits on Python's import lock in its own executor thread. Readiness
+    does not wait for pre-warming: that would delay the first routed request
+    by longer than the import it saves. `pending` shows in the snapshot.
+    """
+
+    def __init__(self, steps: Dict[str, Callable[[], None]]):
+        self.steps = steps
+        self.pending = False
+        self.timings: Dict[str, float] = {}  # Step name -> seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.pending = True
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        for name, step in self.steps.items():
+            start = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, step)
+            except Exception as e:
+                logger.warning(f"Pre-warming {name} failed: {str(e)}")
+            self.timings[name] = time.perf_counter() - start
+        self.pending = False
+        logger.info("Pre-warmed " + ", ".join(f"{name} in {seconds * 1000:.0f} ms" for name, seconds in self.timings.items()))
+
+
+prewarmer = Prewarmer({
+    "yt_dlp": YtDlpService.warm_up,
+    "aiohttp": _import_aiohttp,
+})
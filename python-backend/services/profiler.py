@@ -0,0 +1,165 @@
+"""Wall-clock stack sampling of every thread in this worker, as collapsed stacks"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames of threads that are waiting for work rather than doing it
+_IDLE_FRAMES = {
+    ("selectors.py", "select"),      # Event loop waiting for I/O or timers
+    ("thread.py", "_worker"),        # Executor thread blocked on its work queue
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+_THREAD_SUFFIX = re.compile(r"_\d+$")
+
+
+def _thread_label(name: str) -> str:
+    """Thread name without the per-thread index, so all threads of one executor merge"""
+    return _THREAD_SUFFIX.sub("", name)
+
+
+class Profile:
+    """Sample counts per collapsed stack, from one profiling run"""
+
+    def __init__(self, interval: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = 0  # Sampler ticks
+        self.stacks: Counter = Counter()
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format (`frame;frame;frame count`), for flamegraph.pl or speedscope"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+        }
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads from a background thread
+
+    Every `interval` seconds, sys._current_frames() gives the current
+    frame of each thread: the event loop, executor threads running yt-dlp
+    and FFmpeg, and any others. Each stack is folded into one line rooted
+    at the thread's name. Sampling is wall-clock, so time spent waiting
+    (on a lock, a subprocess, the GIL) shows up as well; threads that are
+    idle waiting for work are left out unless include_idle is set.
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.profile = Profile(interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.profile.duration = time.perf_counter() - self._start
+        return self.profile
+
+    def _run(self):
+        own_id = threading.get_ident()
+        stacks = self.profile.stacks
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                frames.append(_thread_label(names.get(thread_id, f"thread-{thread_id}")))
+                stacks[";".join(reversed(frames))] += 1
+            self.profile.samples += 1
+
+
+class ProfilerRegistry:
+    """
+    Allows one profiling run per worker at a time and keeps recent results
+
+    Two samplers at once would double the overhead and see each other's
+    stacks, so a second run is refused while one is active. Finished
+    per-request profiles are kept (the newest max_profiles) until fetched.
+    """
+
+    def __init__(self, max_profiles: int = 16):
+        self.max_profiles = max_profiles
+        self._active: Optional[SamplingProfiler] = None
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._lock = threading.Lock()  # stop() runs on executor threads
+
+    @property
+    def busy(self) -> bool:
+        return self._active is not None
+
+    def start(self, interval: float, include_idle: bool = False) -> Optional[SamplingProfiler]:
+        """A started profiler, or None if one is already running"""
+        if self._active is not None:
+            return None
+        self._active = SamplingProfiler(interval, include_idle).start()
+        return self._active
+
+    def stop(self, sampler: SamplingProfiler, keep: bool = False) -> Profile:
+        """
+        Stop a run and record its profile
+
+        Blocks while the sampler thread finishes its last stack walk, so
+        call it from an executor thread rather than the event loop. The
+        worker stays busy until the run is fully stopped.
+        """
+        profile = sampler.stop()
+        with self._lock:
+            if self._active is sampler:
+                self._active = None
+            if keep:
+                self._profiles[profile.id] = profile
+                while len(self._profiles) > self.max_profiles:
+                    self._profiles.popitem(last=False)
+        logger.info(f"Profile {profile.id}: {profile.samples} samples over {profile.duration:.2f}s")
+        return profile
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            profiles = list(reversed(self._profiles.values()))
+        return [profile.summary() for profile in profiles]
+
+
+profilers = ProfilerRegistry()
@@ -0,0 +1,265 @@
+"""YouTube Data API quota accounting"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:
+    _QUOTA_TZ = timezone(timedelta(hours=-8))
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Documented Data API quota cost per call type
+QUOTA_COSTS = {
+    'search.list': 100,
+    'videos.list': 1,
+}
+
+# Degradation levels, in order of severity
+NORMAL = "normal"            # Everything allowed
+CONSERVE = "conserve"        # No background revalidation, hydration from cache only
+CACHE_ONLY = "cache_only"    # Searches answered from cache only
+EXHAUSTED = "exhausted"      # No API calls until the daily reset
+
+
+class QuotaLedger:
+    """
+    Charges every Data API call its unit cost and tracks the daily budget
+
+    The quota day follows Google's reset at midnight Pacific time. Totals
+    are persisted to a JSON file (merged with other workers' deltas under a
+    file lock) so restarts and multiple workers share one count.
+    """
+
+    PERSIST_INTERVAL = 5.0  # Seconds between writes of pending charges
+
+    def __init__(self, daily_budget: int, path: Optional[str] = None):
+        self.daily_budget = daily_budget
+        self.path = path
+        self.day = self._quota_day()
+        self.used = 0
+        self.by_call_type: Dict[str, int] = {}
+        self.exhausted_day: Optional[str] = None
+        # Charges not yet written to the ledger file
+        self._pending = 0
+        self._pending_by_call_type: Dict[str, int] = {}
+        self._last_persist = 0.0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        # Per-minute spend for the last hour: [(minute, units)] indexed by minute % 60
+        self._minute_buckets = [(0, 0)] * 60
+        self._load()
+
+    @staticmethod
+    def _quota_day() -> str:
+        return datetime.now(_QUOTA_TZ).strftime("%Y-%m-%d")
+
+    def _roll_day(self):
+        """Reset counters when the quota day changes"""
+        today = self._quota_day()
+        if today != self.day:
+            logger.info(f"Quota day rolled over: {self.day} used {self.used}/{self.daily_budget} units")
+            self.day = today
+            self.used = 0
+            self.by_call_type = {}
+            self._pending = 0
+            self._pending_by_call_type = {}
+
+    def charge(self, call_type: str, calls: int = 1) -> int:
+        """Record `calls` API calls of a type; returns units charged"""
+        self._roll_day()
+        units = QUOTA_COSTS.get(call_type, 1) * calls
+        self.used += units
+        self.by_call_type[call_type] = self.by_call_type.get(call_type, 0) + units
+        self._pending += units
+        self._pending_by_call_type[call_type] = self._pending_by_call_type.get(call_type, 0) + units
+
+        minute = int(time.time() // 60)
+        slot = minute % 60
+        bucket_minute, bucket_units = self._minute_buckets[slot]
+        self._minute_buckets[slot] = (minute, bucket_units + units if bucket_minute == minute else units)
+
+        if time.monotonic() - self._last_persist >= self.PERSIST_INTERVAL and not self._flushing():
+            self._last_persist = time.monotonic()
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+        return units
+
+    def mark_exhausted(self):
+        """The API reported quotaExceeded; stop calling it until the reset"""
+        self._roll_day()
+        if self.exhausted_day != self.day:
+            logger.error("YouTube Data API daily quota exceeded")
+        self.exhausted_day = self.day
+
+    def remaining(self) -> int:
+        self._roll_day()
+        if self.exhausted_day == self.day:
+            return 0
+        return max(self.daily_budget - self.used, 0)
+
+    def remaining_fraction(self) -> float:
+        return self.remaining() / self.daily_budget if self.daily_budget else 0.0
+
+    def burn_rate_per_hour(self) -> int:
+        """Units spent over the last 60 minutes"""
+        current = int(time.time() // 60)
+        return sum(units for minute, units in self._minute_buckets if current - minute < 60)
+
+    @staticmethod
+    def seconds_until_reset() -> float:
+        now = datetime.now(_QUOTA_TZ)
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (tomorrow - now).total_seconds()
+
+    def degradation_level(self) -> str:
+        """
+        How far to cut back API use
+
+        Steps down as the remaining fraction crosses the configured
+        thresholds, or one step early when the current burn rate would
+        exhaust the budget before the daily reset.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            return EXHAUSTED
+        fraction = remaining / self.daily_budget
+        if fraction <= settings.QUOTA_CACHE_ONLY_FRACTION:
+            return CACHE_ONLY
+        burn_rate = self.burn_rate_per_hour()
+        on_track_to_exhaust = burn_rate > 0 and remaining / burn_rate * 3600 < self.seconds_until_reset()
+        if fraction <= settings.QUOTA_CONSERVE_FRACTION:
+            return CACHE_ONLY if on_track_to_exhaust else CONSERVE
+        return CONSERVE if on_track_to_exhaust else NORMAL
+
+    def allows(self, call_type: str) -> bool:
+        """Whether a call of this type may be made at the current level"""
+        level = self.degradation_level()
+        if level == EXHAUSTED:
+            return False
+        if level == CACHE_ONLY:
+            return QUOTA_COSTS.get(call_type, 1) < QUOTA_COSTS['search.list']
+        return True
+
+    def snapshot(self) -> Dict:
+        """Current budget state for the quota endpoint and metrics"""
+        remaining = self.remaining()
+        burn_rate = self.burn_rate_per_hour()
+        return {
+            'day': self.day,
+            'daily_budget': self.daily_budget,
+            'used': self.used,
+            'remaining': remaining,
+            'remaining_fraction': round(remaining / self.daily_budget, 4) if self.daily_budget else 0.0,
+            'burn_rate_per_hour': burn_rate,
+            'projected_exhaustion_seconds': round(remaining / burn_rate * 3600) if burn_rate else None,
+            'seconds_until_reset': round(self.seconds_until_reset()),
+            'degradation_level': self.degradation_level(),
+            'by_call_type': dict(self.by_call_type),
+        }
+
+    def _load(self):
+        """Pick up today's totals from the ledger file"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get('day') == self.day:
+                self.used = int(data.get('used', 0))
+                self.by_call_type = dict(data.get('by_call_type', {}))
+                self.exhausted_day = data.get('exhausted_day')
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read quota ledger {self.path}: {str(e)}")
+
+    def _flushing(self) -> bool:
+        return self._flush_lock is not None and self._flush_lock.locked()
+
+    async def flush(self):
+        """
+        Merge pending charges into the ledger file
+
+        The file lock and I/O run in a thread so a contended lock never
+        blocks the event loop. Charges made meanwhile stay pending.
+        """
+        self._last_persist = time.monotonic()
+        if not self.path:
+            return
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            day, pending, by_call_type = self.day, self._pending, self._pending_by_call_type
+            exhausted = self.exhausted_day == self.day
+            self._pending, self._pending_by_call_type = 0, {}
+            stored = None
+            try:
+                stored = await asyncio.get_running_loop().run_in_executor(
+                    None, self._merge, day, pending, by_call_type, exhausted
+                )
+            finally:
+                if stored is None and day == self.day:
+                    # Not written: keep the charges for the next flush
+                    self._pending += pending
+                    for call_type, units in by_call_type.items():
+                        self._pending_by_call_type[call_type] = self._pending_by_call_type.get(call_type, 0) + units
+            if stored is None or stored['day'] != self.day:
+                return
+
+            # Adopt the merged totals, which include other workers' spend, plus what is still pending
+            self.used = stored['used'] + self._pending
+            self.by_call_type = dict(stored['by_call_type'])
+            for call_type, units in self._pending_by_call_type.items():
+                self.by_call_type[call_type] = self.by_call_type.get(call_type, 0) + units
+            self.exhausted_day = stored.get('exhausted_day', self.exhausted_day)
+
+    def _merge(self, day: str, pending: int, by_call_type: Dict[str, int], exhausted: bool) -> Optional[Dict]:
+        """Add charges to the ledger file under its lock (blocking); returns the merged totals, or None on failure"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".lock", "w") as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                stored = {}
+                if os.path.exists(self.path):
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        stored = json.load(f)
+                if stored.get('day') != day:
+                    stored = {'day': day, 'used': 0, 'by_call_type': {}}
+
+                stored['used'] = int(stored.get('used', 0)) + pending
+                by_type = stored.setdefault('by_call_type', {})
+                for call_type, units in by_call_type.items():
+                    by_type[call_type] = by_type.get(call_type, 0) + units
+                if exhausted:
+                    stored['exhausted_day'] = day
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(stored, f)
+                os.replace(tmp_path, self.path)
+            return stored
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not write quota ledger {self.path}: {str(e)}")
+            return None
+
+
+# Global quota ledger instance
+quota_ledger = QuotaLedger(
+    settings.YOUTUBE_DAILY_QUOTA,
+    os.path.join(settings.STATE_DIR, "youtube_quota.json"),
+)
@@ -0,0 +1,121 @@
+"""Coalescing of identical in-flight jobs"""
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """One running job, shared by every requester of the same key"""
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 1
+        self.started_at = time.monotonic()
+        # Path of the file being produced, once known, for requesters that tail it
+        self.tail_path: Optional[str] = None
+        self.tail_ready = asyncio.Event()
+        # What the job measured (e.g. bytes and CPU time), for requesters that settle costs
+        self.stats: Dict = {}
+
+    def set_tail_path(self, path: str):
+        self.tail_path = path
+        self.tail_ready.set()
+
+
+class SingleFlight:
+    """
+    Runs at most one job per key at a time
+
+    The first requester starts the job; later requesters join it while it
+    is running and receive the same result. The job runs in its own task,
+    so a requester that disconnects does not cancel it for the others, and
+    a failure is raised once by the job and delivered to every waiter.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+        self.stats = {"started": 0, "coalesced": 0, "failed": 0}
+
+    def join(self, key: Hashable, start: Callable[[Flight], Awaitable]) -> Tuple[Flight, bool]:
+        """
+        Join the running job for key, or start it with start(flight)
+        Returns: (flight, is_leader)
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.waiters += 1
+            self.stats["coalesced"] += 1
+            return flight, False
+
+        flight = Flight(key)
+        flight.task = asyncio.create_task(self._run(flight, start))
+        # Retrieve the exception even if every waiter has gone away
+        flight.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        self._flights[key] = flight
+        self.stats["started"] += 1
+        return flight, True
+
+    async def _run(self, flight: Flight, start: Callable[[Flight], Awaitable]):
+        try:
+            return await start(flight)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"Job {flight.key} failed for {flight.waiters} requester(s): {getattr(e, 'detail', None) or str(e)}")
+            raise
+        finally:
+            self._flights.pop(flight.key, None)
+            flight.tail_ready.set()
+
+    @staticmethod
+    async def wait(flight: Flight):
+        """Wait for the job's result; cancelling the waiter does not cancel the job"""
+        return await asyncio.shield(flight.task)
+
+    def snapshot(self) -> Dict:
+        return {"in_flight": len(self._flights), **self.stats}
+
+
+async def tail_file(path: str, job: asyncio.Task, chunk_size: int = 1024 * 1024, poll_seconds: float = 0.2) -> AsyncIterator[bytes]:
+    """
+    Stream a file while another task is still writing it
+
+    Follows `path + ".part"` (where yt-dlp writes until it renames the
+    finished file) or `path` itself, yielding bytes as they appear until
+    the job finishes. An open file keeps its contents across the rename.
+    If the job fails, the exception is raised into the stream.
+    """
+    source = None
+    while source is None:
+        finished = job.done()
+        for candidate in (path + ".part", path):
+            try:
+                source = await aiofiles.open(candidate, "rb")
+                break
+            except FileNotFoundError:
+                continue
+        if source is None:
+            if finished:
+                job.result()  # Raises the job's error
+                raise FileNotFoundError(path)
+            await asyncio.sleep(poll_seconds)
+
+    try:
+        while True:
+            # Checked before reading, so everything written before completion is read
+            finished = job.done()
+            chunk = await source.read(chunk_size)
+            if chunk:
+                yield chunk
+            elif finished:
+                job.result()
+                return
+            else:
+                await asyncio.sleep(poll_seconds)
+    finally:
+        await source.close()
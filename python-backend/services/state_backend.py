@@ -0,0 +1,339 @@
+"""Pluggable key/value state shared between workers"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class StateBackendError(Exception):
+    """The state backend could not be reached or rejected a command"""
+
+
+class StateBackend(ABC):
+    """
+    Async key/value store with per-key expiry
+
+    Values are JSON-serializable. `incr` keeps a numeric counter whose TTL
+    is set when the key is created, which is enough for windowed rate
+    limits. `shared` is True when other processes see the same data.
+    """
+
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: float = 1.0, ttl: Optional[float] = None) -> float:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(StateBackend):
+    """Per-process dictionary (the default; nothing is shared)"""
+
+    SWEEP_EVERY = 1000  # Writes between sweeps of expired keys
+
+    def __init__(self):
+        # {key: (value, expires_at or None)}
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._writes = 0
+
+    def _live(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _sweep(self):
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY:
+            return
+        now = time.monotonic()
+        for key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]:
+            del self._data[key]
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._sweep()
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: float = 1.0, ttl: Optional[float] = None) -> float:
+        entry = self._live(key)
+        if entry is None:
+            value, expires_at = amount, (time.monotonic() + ttl if ttl else None)
+            self._sweep()
+        else:
+            value, expires_at = entry[0] + amount, entry[1]
+        self._data[key] = (value, expires_at)
+        return value
+
+
+class SQLiteBackend(StateBackend):
+    """
+    SQLite file shared by the workers of one host
+
+    Queries run on a dedicated thread so the event loop never blocks on the
+    file lock; WAL mode lets readers proceed while another worker writes.
+    """
+
+    shared = True
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except sqlite3.Error as e:
+            raise StateBackendError(f"SQLite state backend error: {str(e)}") from e
+
+    def _sweep(self, conn: sqlite3.Connection, now: float):
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    async def get(self, key: str) -> Optional[Any]:
+        def query():
+            row = self._connect().execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+            return row[0] if row else None
+
+        value = await self._run(query)
+        return json.loads(value) if isinstance(value, str) else value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        def query():
+            conn = self._connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None)
+            )
+            self._sweep(conn, now)
+
+        await self._run(query)
+
+    async def delete(self, key: str) -> None:
+        await self._run(lambda: self._connect().execute("DELETE FROM kv WHERE key = ?", (key,)))
+
+    async def incr(self, key: str, amount: float = 1.0, ttl: Optional[float] = None) -> float:
+        def query():
+            conn = self._connect()
+            now = time.time()
+            # An expired row counts as absent: restart the counter and its TTL
+            row = conn.execute(
+                """
+                INSERT INTO kv (key, value, expires_at) VALUES (?1, ?2, ?3)
+                ON CONFLICT(key) DO UPDATE SET
+                    value = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ?4
+                                 THEN excluded.value ELSE CAST(kv.value AS REAL) + excluded.value END,
+                    expires_at = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ?4
+                                      THEN excluded.expires_at ELSE kv.expires_at END
+                RETURNING value
+                """,
+                (key, float(amount), now + ttl if ttl else None, now)
+            ).fetchone()
+            self._sweep(conn, now)
+            return float(row[0])
+
+        return await self._run(query)
+
+    async def close(self) -> None:
+        def shutdown():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        await self._run(shutdown)
+        self._executor.shutdown(wait=False)
+
+
+class RedisBackend(StateBackend):
+    """
+    Redis (or any RESP2-speaking server) shared by every instance
+
+    A minimal RESP client over a small pool of asyncio connections; only
+    the handful of commands used here are implemented.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, pool_size: int = 10, timeout_seconds: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.timeout_seconds = timeout_seconds
+        self._pool: "asyncio.LifoQueue[Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]]" = asyncio.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put_nowait(None)  # Connections are opened on first use
+
+    @staticmethod
+    def _encode(args: Tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    @classmethod
+    async def _read_reply(cls, reader: asyncio.StreamReader) -> Any:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            # Returned rather than raised so the rest of a pipeline is still read
+            return StateBackendError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [await cls._read_reply(reader) for _ in range(count)]
+        raise StateBackendError(f"Unexpected RESP reply: {line!r}")
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for command in setup:
+            writer.write(self._encode(command))
+            await writer.drain()
+            await self._read_reply(reader)
+        return reader, writer
+
+    async def execute(self, *commands: Tuple) -> List[Any]:
+        """Send one or more commands in a single pipeline and return their replies"""
+        conn = await self._pool.get()
+        try:
+            if conn is None:
+                conn = await asyncio.wait_for(self._open(), self.timeout_seconds)
+            reader, writer = conn
+            writer.write(b"".join(self._encode(command) for command in commands))
+            await writer.drain()
+            replies = []
+            for _ in commands:
+                replies.append(await asyncio.wait_for(self._read_reply(reader), self.timeout_seconds))
+        except BaseException as e:
+            # Cancelled, timed out or out of sync with the server: replies may
+            # still be pending, so the connection can never be handed on
+            if conn is not None:
+                conn[1].close()
+            self._pool.put_nowait(None)
+            if isinstance(e, (OSError, ConnectionError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError)):
+                raise StateBackendError(f"Redis state backend unavailable: {str(e) or type(e).__name__}") from e
+            raise
+        # Every reply has been read, so the next caller starts on a clean stream
+        self._pool.put_nowait(conn)
+
+        for reply in replies:
+            if isinstance(reply, StateBackendError):
+                raise reply
+        return replies
+
+    async def get(self, key: str) -> Optional[Any]:
+        (value,) = await self.execute(("GET", key))
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        command = ("SET", key, json.dumps(value))
+        if ttl:
+            command += ("PX", max(int(ttl * 1000), 1))
+        await self.execute(command)
+
+    async def delete(self, key: str) -> None:
+        await self.execute(("DEL", key))
+
+    async def incr(self, key: str, amount: float = 1.0, ttl: Optional[float] = None) -> float:
+        if not ttl:
+            (value,) = await self.execute(("INCRBYFLOAT", key, amount))
+            return float(value)
+        value, pttl = await self.execute(("INCRBYFLOAT", key, amount), ("PTTL", key))
+        if pttl == -1:
+            # Key was just created (or lost its TTL): start its expiry now
+            await self.execute(("PEXPIRE", key, max(int(ttl * 1000), 1)))
+        return float(value)
+
+    async def close(self) -> None:
+        while not self._pool.empty():
+            conn = self._pool.get_nowait()
+            if conn is not None:
+                conn[1].close()
+
+
+def create_state_backend(kind: str) -> StateBackend:
+    """Build the backend named by STATE_BACKEND (memory, sqlite or redis)"""
+    kind = kind.lower()
+    if kind == "sqlite":
+        return SQLiteBackend(settings.STATE_SQLITE_PATH)
+    if kind == "redis":
+        return RedisBackend(settings.STATE_REDIS_URL, pool_size=settings.STATE_REDIS_POOL_SIZE)
+    if kind != "memory":
+        logger.warning(f"Unknown STATE_BACKEND {kind!r}, using memory")
+    return MemoryBackend()
+
+
+# Global state backend instance
+state_backend = create_state_backend(settings.STATE_BACKEND)
@@ -0,0 +1,155 @@
+"""Storage tiers for job files: memory, fast scratch and persistent disk"""
+
+import logging
+import os
+import sys
+import threading
+import uuid
+import weakref
+from typing import Dict, Optional, Tuple
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MEMORY = "memory"
+SCRATCH = "scratch"
+DISK = "disk"
+
+
+class MemoryFile:
+    """A finished output held in memory; its size counts against the memory cap until it is dropped"""
+
+    __slots__ = ('data', '__weakref__')
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+class StorageTiers:
+    """
+    Picks where a job's files live from its estimated output size
+
+    - memory: small outputs are produced in the scratch directory, then
+      read into memory (within a global cap) and served from there.
+    - scratch: intermediates (downloaded audio before conversion) go to
+      the scratch directory, the final output to disk.
+    - disk: everything on disk, so large jobs cannot fill a RAM-backed
+      scratch directory. Also used when the size is unknown.
+
+    The scratch directory defaults to /dev/shm when it is writable, so
+    scratch files never touch the disk; otherwise it is the download
+    directory itself.
+    """
+
+    def __init__(self, disk_root: str, scratch_root: str, memory_max_bytes: int, memory_cap_bytes: int, scratch_max_bytes: int):
+        self.disk_root = disk_root
+        self.scratch_root = scratch_root
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_cap_bytes = memory_cap_bytes
+        self.scratch_max_bytes = scratch_max_bytes
+        self.memory_used = 0
+        # load() runs on executor threads and _free on whichever thread drops a buffer
+        self._memory_lock = threading.Lock()
+        self.stats = {MEMORY: 0, SCRATCH: 0, DISK: 0, 'memory_full': 0, 'memory_bytes_served': 0}
+
+    def choose(self, estimated_mb: Optional[float]) -> str:
+        if not estimated_mb:
+            return DISK
+        size = estimated_mb * 1024 * 1024
+        if size <= self.memory_max_bytes:
+            return MEMORY
+        if size <= self.scratch_max_bytes:
+            return SCRATCH
+        return DISK
+
+    def scratch_dir(self, estimated_mb: Optional[float]) -> str:
+        """A fresh directory for a job's intermediates, on scratch unless the job is large"""
+        root = self.disk_root if self.choose(estimated_mb) == DISK else self.scratch_root
+        return self._make_job_dir(root)
+
+    def job_dirs(self, tier: str) -> Tuple[str, str]:
+        """
+        Fresh (work_dir, output_dir) for a job in the given tier
+
+        Both are the same directory unless intermediates and the output live
+        on different tiers; the caller removes work_dir when the job is done.
+        """
+        self.stats[tier] += 1
+        if tier == DISK:
+            job_dir = self._make_job_dir(self.disk_root)
+            return job_dir, job_dir
+        work_dir = self._make_job_dir(self.scratch_root)
+        if tier == MEMORY:
+            return work_dir, work_dir
+        return work_dir, self._make_job_dir(self.disk_root)
+
+    @staticmethod
+    def _make_job_dir(root: str) -> str:
+        path = os.path.join(root, "jobs", uuid.uuid4().hex)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def load(self, path: str) -> Optional[MemoryFile]:
+        """
+        Move a finished file into memory, removing it from the filesystem
+
+        Returns None (leaving the file in place) when the file is larger than
+        the memory tier allows or the global memory cap would be exceeded.
+        """
+        size = os.path.getsize(path)
+        if size > self.memory_max_bytes:
+            return None
+        # Reserve before reading, so concurrent loads cannot overshoot the cap together
+        with self._memory_lock:
+            if self.memory_used + size > self.memory_cap_bytes:
+                self.stats['memory_full'] += 1
+                logger.info(f"Memory tier full ({self.memory_used} bytes used); serving {path} from file")
+                return None
+            self.memory_used += size
+        try:
+            with open(path, 'rb') as f:
+                memory_file = MemoryFile(f.read())
+        except BaseException:
+            self._free(size)
+            raise
+        weakref.finalize(memory_file, self._free, size)
+        os.remove(path)
+        return memory_file
+
+    def served(self, memory_file: MemoryFile):
+        """Called once a response has sent memory_file"""
+        self.stats['memory_bytes_served'] += len(memory_file.data)
+
+    def _free(self, size: int):
+        with self._memory_lock:
+            self.memory_used -= size
+
+    def snapshot(self) -> Dict:
+        return {
+            'scratch_root': self.scratch_root,
+            'memory_used_bytes': self.memory_used,
+            'memory_cap_bytes': self.memory_cap_bytes,
+            'jobs_by_tier': {tier: self.stats[tier] for tier in (MEMORY, SCRATCH, DISK)},
+            'memory_full': self.stats['memory_full'],
+            'memory_bytes_served': self.stats['memory_bytes_served'],
+        }
+
+
+def resolve_scratch_root() -> str:
+    """SCRATCH_DIR if set, else /dev/shm when writable, else the download directory"""
+    if settings.SCRATCH_DIR:
+        return settings.SCRATCH_DIR
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return os.path.join("/dev/shm", "youtube_downloads")
+    return settings.TEMP_DOWNLOAD_DIR
+
+
+storage = StorageTiers(
+    settings.TEMP_DOWNLOAD_DIR,
+    resolve_scratch_root(),
+    memory_max_bytes=int(settings.MEMORY_TIER_MAX_MB * 1024 * 1024),
+    memory_cap_bytes=int(settings.MEMORY_TIER_CAP_MB * 1024 * 1024),
+    scratch_max_bytes=int(settings.SCRATCH_TIER_MAX_MB * 1024 * 1024),
+)
@@ -0,0 +1,246 @@
+"""Local search suggestions built from past queries and results"""
+
+import bisect
+import glob
+import heapq
+import json
+import logging
+import os
+import re
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+QUERY_WEIGHT = 3.0   # A searched query counts more than a title we happened to return
+RESULT_WEIGHT = 1.0
+MAX_TERM_LENGTH = 100
+SHORT_PREFIX = 3     # Prefixes up to this length are answered from a precomputed top list
+TOP_K = 25           # Terms kept per short prefix (the most /api/suggest returns)
+MAX_SLOTS = 256      # Worker slots probed for a free snapshot file
+
+
+class SuggestionIndex:
+    """
+    Frequency-weighted prefix index over a sorted array of normalized terms
+
+    Short prefixes, whose matching runs are long, are answered from a
+    per-prefix top-TOP_K list kept up to date on every insert; longer ones
+    bisect to the first term with the prefix and rank the matching run by
+    weight. When the index grows past max_terms the lowest-weighted tenth is
+    evicted and the remaining weights are halved, so old terms age out and
+    memory stays bounded.
+
+    Each worker claims the lowest free slot (held by a lock file for the
+    life of the process) and snapshots to that slot's file, so a restart
+    overwrites the same files; loading merges every snapshot, keeping a
+    term's highest weight, then deletes the ones no running worker owns.
+    """
+
+    def __init__(self, max_terms: int, snapshot_path: Optional[str] = None):
+        self.max_terms = max_terms
+        self.snapshot_path = snapshot_path
+        self._terms: List[str] = []            # Sorted normalized terms
+        self._weights: Dict[str, float] = {}   # normalized -> weight
+        self._display: Dict[str, str] = {}     # normalized -> text shown to users
+        self._top: Dict[str, List[str]] = {}   # short prefix -> terms, highest weight first
+        self._slot: Optional[int] = None
+        self._slot_lock = None                 # Open lock file held while we own the slot
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split()).casefold()[:MAX_TERM_LENGTH]
+
+    def add(self, text: str, weight: float = 1.0):
+        """Add a term or bump its weight"""
+        if not text:
+            return
+        key = self.normalize(text)
+        if not key:
+            return
+        if key in self._weights:
+            self._weights[key] += weight
+        else:
+            bisect.insort(self._terms, key)
+            self._weights[key] = weight
+            self._display[key] = " ".join(text.split())[:MAX_TERM_LENGTH]
+            if len(self._terms) > self.max_terms:
+                self._evict()
+                if key not in self._weights:
+                    return
+        self._promote(key)
+
+    def record_query(self, query: str):
+        self.add(query, QUERY_WEIGHT)
+
+    def record_results(self, videos: List[Dict]):
+        """Index the titles and channels returned by a search"""
+        for video in videos:
+            self.add(video.get('title', ''), RESULT_WEIGHT)
+            self.add(video.get('channel', ''), RESULT_WEIGHT)
+
+    def _rank(self, term: str):
+        return (-self._weights[term], term)
+
+    def _promote(self, key: str):
+        """Place key in the top lists of its short prefixes (weights only grow between rebuilds)"""
+        for length in range(1, min(len(key), SHORT_PREFIX) + 1):
+            top = self._top.setdefault(key[:length], [])
+            if key in top:
+                top.remove(key)
+            elif len(top) >= TOP_K and self._rank(key) >= self._rank(top[-1]):
+                continue
+            bisect.insort(top, key, key=self._rank)
+            del top[TOP_K:]
+
+    def _rebuild_top(self):
+        groups = defaultdict(list)
+        for term in self._terms:
+            for length in range(1, min(len(term), SHORT_PREFIX) + 1):
+                groups[term[:length]].append(term)
+        self._top = {prefix: sorted(terms, key=self._rank)[:TOP_K] for prefix, terms in groups.items()}
+
+    def _evict(self):
+        """Drop the lowest-weighted tenth of terms and age the rest"""
+        drop_count = max(len(self._terms) - int(self.max_terms * 0.9), 1)
+        dropped = set(heapq.nsmallest(drop_count, self._weights, key=self._weights.get))
+        self._terms = [t for t in self._terms if t not in dropped]
+        for key in dropped:
+            del self._weights[key]
+            del self._display[key]
+        for key in self._weights:
+            self._weights[key] /= 2
+        self._rebuild_top()
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Top terms starting with prefix, highest weight first"""
+        key = self.normalize(prefix)
+        if not key:
+            return []
+        if len(key) <= SHORT_PREFIX and limit <= TOP_K:
+            best = self._top.get(key, [])[:limit]
+        else:
+            start = bisect.bisect_left(self._terms, key)
+            stop = bisect.bisect_left(self._terms, key + "\U0010ffff", start)
+            best = heapq.nsmallest(limit, self._terms[start:stop], key=self._rank)
+        return [self._display[term] for term in best]
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def export(self) -> List[List]:
+        """Copy of the index contents, cheap enough to take on the event loop"""
+        return [[key, self._display[key], round(self._weights[key], 3)] for key in self._terms]
+
+    def _slot_path(self, slot: int, suffix: str) -> str:
+        root, _ = os.path.splitext(self.snapshot_path)
+        return f"{root}.worker{slot}{suffix}"
+
+    def _lock_slot(self, slot: int):
+        """Open and lock a slot's lock file without waiting; None if it is taken"""
+        lock = open(self._slot_path(slot, ".lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        return lock
+
+    def _claim_slot(self) -> int:
+        """Lowest slot no other running worker holds (always 0 without fcntl)"""
+        if self._slot is not None:
+            return self._slot
+        self._slot = 0
+        if fcntl:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            for slot in range(MAX_SLOTS):
+                lock = self._lock_slot(slot)
+                if lock:
+                    self._slot, self._slot_lock = slot, lock
+                    break
+        return self._slot
+
+    def save(self, entries: Optional[List[List]] = None):
+        """Write this worker's snapshot (atomically) so a restart keeps the index warm"""
+        if not self.snapshot_path:
+            return
+        entries = self.export() if entries is None else entries
+        try:
+            path = self._slot_path(self._claim_slot(), ".json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({'version': 1, 'terms': entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            logger.info(f"Saved suggestion index snapshot ({len(entries)} terms)")
+        except OSError as e:
+            logger.warning(f"Could not save suggestion index: {str(e)}")
+
+    def _remove_superseded(self, paths: List[str]):
+        """Delete merged snapshots that no running worker will overwrite"""
+        root, ext = os.path.splitext(self.snapshot_path)
+        slot_pattern = re.compile(re.escape(f"{root}.worker") + r"(\d+)" + re.escape(ext) + "$")
+        for path in paths:
+            match = slot_pattern.match(path)
+            try:
+                if not match:
+                    os.remove(path)  # Single-file or per-pid snapshot from an older release
+                    continue
+                slot = int(match.group(1))
+                if slot == self._slot or not fcntl:
+                    continue
+                lock = self._lock_slot(slot)
+                if lock:  # No worker owns this slot now; its terms live on in ours
+                    with lock:
+                        os.remove(path)
+            except OSError:
+                continue
+
+    def load(self):
+        """Merge the snapshots of every worker (and older snapshot layouts), if any"""
+        if not self.snapshot_path:
+            return
+        try:
+            self._claim_slot()
+        except OSError as e:
+            logger.warning(f"Could not claim a suggestion snapshot slot: {str(e)}")
+        root, ext = os.path.splitext(self.snapshot_path)
+        paths = glob.glob(f"{glob.escape(root)}.*{ext}") + [self.snapshot_path]
+        merged = []
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for key, display, weight in data.get('terms', []):
+                    if float(weight) > self._weights.get(key, 0.0):
+                        self._weights[key] = float(weight)
+                        self._display[key] = display
+                merged.append(path)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Could not load suggestion snapshot {path}: {str(e)}")
+        if not merged:
+            return
+        self._terms = sorted(self._weights)
+        if len(self._terms) > self.max_terms:
+            self._evict()
+        else:
+            self._rebuild_top()
+        self._remove_superseded(merged)
+        logger.info(f"Loaded suggestion index from {len(merged)} snapshot(s) ({len(self._terms)} terms)")
+
+
+# Global suggestion index instance
+suggestion_index = SuggestionIndex(
+    settings.SUGGEST_MAX_TERMS,
+    os.path.join(settings.STATE_DIR, "suggestions.json"),
+)
@@ -0,0 +1,284 @@
+"""Lightweight request tracing: spans in a contextvar, JSON logs, optional OTLP export"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Dict, List, Optional
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+
+if TYPE_CHECKING:
+    import aiohttp  # Imported on first export; see services.prewarm
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MAX_SPANS_PER_TRACE = 256
+
+
+class Trace:
+    """The spans recorded for one sampled request"""
+
+    __slots__ = ('trace_id', 'parent_span_id', 'spans', 'dropped')
+
+    def __init__(self, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.parent_span_id = parent_span_id  # From an incoming traceparent header
+        self.spans: List["Span"] = []
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attributes', 'start_unix_ns', 'start', 'duration', 'error', '_token')
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def __enter__(self) -> "Span":
+        self.start_unix_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {getattr(exc, 'detail', None) or exc}"
+        _current_span.reset(self._token)
+        if len(self.trace.spans) < MAX_SPANS_PER_TRACE:
+            self.trace.spans.append(self)
+        else:
+            self.trace.dropped += 1
+        return False
+
+    def to_dict(self) -> Dict:
+        record = {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+        }
+        if self.attributes:
+            record['attributes'] = self.attributes
+        if self.error:
+            record['error'] = self.error
+        return record
+
+
+class _NoopSpan:
+    """Returned when the current request is not sampled; entering and leaving it does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def span(name: str, **attributes):
+    """
+    Context manager recording a child span of the current span
+
+    Costs one contextvar lookup when the request is not being traced.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def traced(name: str):
+    """Decorator recording an async function as a span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace.trace_id if current is not None else None
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+    """
+    Root span for a request, or None when it is not sampled
+
+    A sampled request continues the caller's trace from a W3C traceparent
+    header. TRACE_SAMPLE_RATE decides which requests are sampled; the
+    header's sampled flag only decides when TRACE_TRUST_PARENT is set, so
+    untrusted clients cannot force traces (and their logging and export).
+    """
+    parent = parse_traceparent(traceparent) if traceparent else None
+    if parent is not None and settings.TRACE_TRUST_PARENT:
+        sampled = parent[2]
+    else:
+        sampled = random.random() < settings.TRACE_SAMPLE_RATE
+    if not sampled:
+        return None
+    trace = Trace(parent[0], parent[1]) if parent is not None else Trace()
+    return Span(trace, name, trace.parent_span_id, attributes)
+
+
+def parse_traceparent(header: str):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None if malformed"""
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def server_timing(trace: Trace) -> str:
+    """Server-Timing header value: total milliseconds per span name, in first-seen order"""
+    totals: Dict[str, float] = {}
+    for recorded in trace.spans:  # Finished spans only; the request's own span is still open
+        totals[recorded.name] = totals.get(recorded.name, 0.0) + recorded.duration
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+def log_trace(root: Span, **fields) -> None:
+    """Emit a finished trace as one JSON log line"""
+    logger.info(json.dumps({
+        'trace_id': root.trace.trace_id,
+        'name': root.name,
+        'duration_ms': round(root.duration * 1000, 3),
+        **root.attributes,
+        **fields,
+        'spans': [s.to_dict() for s in root.trace.spans if s is not root],
+        'dropped_spans': root.trace.dropped,
+    }))
+
+
+class OtlpExporter:
+    """
+    Batches finished traces and posts them as OTLP/HTTP JSON
+
+    Posts to TRACE_OTLP_ENDPOINT (e.g. http://localhost:4318/v1/traces)
+    every TRACE_EXPORT_INTERVAL seconds or once a batch is full. When the
+    collector is slow or down, traces beyond the queue limit are dropped
+    rather than held.
+    """
+
+    MAX_QUEUED_SPANS = 10_000
+
+    def __init__(self, endpoint: str, service_name: str, interval: float, batch_spans: int):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.interval = interval
+        self.batch_spans = batch_spans
+        self._queue: List[Span] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self.stats = {'exported': 0, 'dropped': 0, 'failed_posts': 0}
+
+    def submit(self, trace: Trace) -> None:
+        if len(self._queue) + len(trace.spans) > self.MAX_QUEUED_SPANS:
+            self.stats['dropped'] += len(trace.spans)
+            return
+        self._queue.extend(trace.spans)
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        if len(self._queue) >= self.batch_spans:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        import aiohttp
+        while self._queue:
+            batch, self._queue = self._queue[:self.batch_spans], self._queue[self.batch_spans:]
+            if self._session is None:
+                self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+            try:
+                async with self._session.post(self.endpoint, json=self._encode(batch)) as response:
+                    if response.status >= 300:
+                        raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+                self.stats['exported'] += len(batch)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.stats['failed_posts'] += 1
+                self.stats['dropped'] += len(batch)
+                logger.warning(f"OTLP export to {self.endpoint} failed: {type(e).__name__}: {e}")
+
+    def _encode(self, spans: List[Span]) -> Dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "ytdownload"},
+                    "spans": [self._encode_span(s) for s in spans],
+                }],
+            }],
+        }
+
+    @staticmethod
+    def _encode_span(recorded: Span) -> Dict:
+        encoded = {
+            "traceId": recorded.trace.trace_id,
+            "spanId": recorded.span_id,
+            "name": recorded.name,
+            "kind": 2 if recorded.parent_id == recorded.trace.parent_span_id else 1,  # SERVER for the root, else INTERNAL
+            "startTimeUnixNano": str(recorded.start_unix_ns),
+            "endTimeUnixNano": str(recorded.start_unix_ns + int(recorded.duration * 1e9)),
+            "attributes": [
+                {"key": key, "value": {"intValue": str(value)} if isinstance(value, int) and not isinstance(value, bool) else {"stringValue": str(value)}}
+                for key, value in recorded.attributes.items()
+            ],
+            "status": {"code": 2, "message": recorded.error} if recorded.error else {"code": 1},
+        }
+        if recorded.parent_id:
+            encoded["parentSpanId"] = recorded.parent_id
+        return encoded
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+exporter = OtlpExporter(
+    settings.TRACE_OTLP_ENDPOINT,
+    settings.TRACE_SERVICE_NAME,
+    settings.TRACE_EXPORT_INTERVAL,
+    settings.TRACE_EXPORT_BATCH_SPANS,
+) if settings.TRACE_OTLP_ENDPOINT else None
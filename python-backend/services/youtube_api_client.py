@@ -0,0 +1,134 @@
+"""Asynchronous YouTube Data API v3 client"""
+
+import asyncio
+import logging
+import os
+import random
+import sys
+from typing import TYPE_CHECKING, Dict, Optional
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from services.metrics import timed
+from services.tracing import traced
+
+if TYPE_CHECKING:
+    import aiohttp  # Imported on first use; see services.prewarm
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class YouTubeApiError(Exception):
+    """Error response (or repeated transport failure) from the Data API"""
+
+    def __init__(self, status: int, message: str, reason: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.reason = reason
+
+
+class YouTubeApiClient:
+    """
+    Non-blocking Data API client on a pooled keep-alive aiohttp session
+
+    Transport errors, timeouts, 429 and 5xx responses are retried a bounded
+    number of times with full-jitter exponential backoff. Other 4xx responses
+    (bad request, quota exceeded, invalid key) fail immediately.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        timeout_seconds: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        pool_size: Optional[int] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = (base_url or settings.YOUTUBE_API_BASE_URL).rstrip("/")
+        self.timeout_seconds = timeout_seconds or settings.YOUTUBE_API_TIMEOUT
+        self.max_retries = settings.YOUTUBE_API_MAX_RETRIES if max_retries is None else max_retries
+        self.pool_size = pool_size or settings.YOUTUBE_API_POOL_SIZE
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """Create the pooled session lazily, inside the running event loop"""
+        import aiohttp
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+                raise_for_status=False,
+            )
+        return self._session
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        cap = min(settings.YOUTUBE_API_BACKOFF_MAX, settings.YOUTUBE_API_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def _parse_error(status: int, payload) -> YouTubeApiError:
+        """Build an error from a Data API error body"""
+        message = f"HTTP {status}"
+        reason = None
+        if isinstance(payload, dict) and isinstance(payload.get("error"), dict):
+            error = payload["error"]
+            message = error.get("message", message)
+            errors = error.get("errors") or []
+            if errors:
+                reason = errors[0].get("reason")
+        return YouTubeApiError(status, message, reason)
+
+    @timed("search_api")
+    @traced("youtube_api")
+    async def get(self, resource: str, params: Dict) -> Dict:
+        """
+        Call a Data API list endpoint, e.g. resource='search' or 'videos'
+
+        Returns the decoded JSON body. Raises YouTubeApiError on failure.
+        """
+        import aiohttp
+        query = {k: v for k, v in params.items() if v is not None}
+        query["key"] = self.api_key
+        url = f"{self.base_url}/{resource}"
+
+        attempt = 0
+        while True:
+            try:
+                async with self._get_session().get(url, params=query) as response:
+                    try:
+                        payload = await response.json(content_type=None)
+                    except ValueError:
+                        payload = None
+
+                    if response.status == 200 and isinstance(payload, dict):
+                        return payload
+
+                    error = self._parse_error(response.status, payload)
+                    if response.status not in self.RETRY_STATUSES:
+                        raise error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = YouTubeApiError(0, f"Transport error: {type(e).__name__}: {e}")
+
+            if attempt >= self.max_retries:
+                raise error
+
+            delay = self._backoff_delay(attempt)
+            attempt += 1
+            logger.warning(f"YouTube API {resource} failed ({error.message}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        """Close the pooled session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -1,12 +1,22 @@
 """YouTube Search Service using Google API"""
 
+import asyncio
 import logging
 import os
+import sys
 from typing import Optional, List, Dict, Tuple
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+from config import get_settings
+from .cache import SharedTTLCache, FRESH, STALE
+from .quota_ledger import quota_ledger, NORMAL
+from .state_backend import state_backend
+from .youtube_api_client import YouTubeApiClient, YouTubeApiError
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Maximum IDs per videos.list call
+VIDEOS_LIST_BATCH = 50
 
 
 class YouTubeSearchService:
@@ -14,16 +24,29 @@ class YouTubeSearchService:
     
     _youtube_client = None
     
+    # Search results keyed by normalized (query, page_token, max_results)
+    _search_cache = SharedTTLCache(settings.SEARCH_CACHE_MAX_ENTRIES, state_backend, "search")
+    _search_inflight: Dict[Tuple, asyncio.Task] = {}
+    
+    # Video details keyed by video ID
+    _details_cache = SharedTTLCache(settings.DETAILS_CACHE_MAX_ENTRIES, state_backend, "details")
+    
     @classmethod
-    def initialize(cls, api_key: str):
+    def initialize(cls, api_key: str, base_url: Optional[str] = None):
         """Initialize YouTube API client"""
         try:
-            cls._youtube_client = build('youtube', 'v3', developerKey=api_key)
+            cls._youtube_client = YouTubeApiClient(api_key, base_url=base_url)
             logger.info("YouTube API client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize YouTube API: {str(e)}")
             cls._youtube_client = None
     
+    @classmethod
+    async def close(cls):
+        """Close the YouTube API client's connection pool"""
+        if cls._youtube_client is not None:
+            await cls._youtube_client.close()
+    
     @classmethod
     def is_initialized(cls) -> bool:
         """Check if YouTube API client is initialized"""
@@ -34,7 +57,8 @@ class YouTubeSearchService:
         cls, 
         query: str, 
         max_results: int = 20,
-        page_token: Optional[str] = None
+        page_token: Optional[str] = None,
+        hydrate: bool = False
     ) -> Tuple[bool, Dict]:
         """
         Search for YouTube videos
@@ -43,34 +67,137 @@ class YouTubeSearchService:
             query: Search query string
             max_results: Maximum results to return (default 20, max 50)
             page_token: Token for pagination
+            hydrate: Also fill in duration, views and likes (one extra videos.list call)
         
         Returns:
             Tuple of (success, data/error)
         """
+        if not cls.is_initialized():
+            return False, {"error": "YouTube API not initialized", "error_code": "API_NOT_INITIALIZED"}
+        
+        if not query or not query.strip():
+            return False, {"error": "Search query cannot be empty", "error_code": "EMPTY_QUERY"}
+        
+        if max_results > 50:
+            max_results = 50
+        if max_results < 1:
+            max_results = 1
+        
+        key = cls._cache_key(query, page_token, max_results)
+        cached, state = await cls._search_cache.aget(key)
+        level = quota_ledger.degradation_level()
+        if state == FRESH:
+            success, data = True, cached
+        elif state == STALE:
+            # Serve stale immediately and revalidate in the background,
+            # unless quota is short enough that stale results must do
+            if level == NORMAL:
+                cls._schedule_refresh(key, query, max_results, page_token)
+            success, data = True, cached
+        elif not quota_ledger.allows('search.list'):
+            return False, {
+                "error": "Search is limited to cached results until the daily API quota resets",
+                "error_code": "QUOTA_EXHAUSTED",
+                "retry_after_seconds": round(quota_ledger.seconds_until_reset()),
+            }
+        else:
+            success, data = await cls._search_and_cache(key, query, max_results, page_token)
+        
+        if success and hydrate:
+            data = await cls.hydrate_results(data)
+        return success, data
+    
+    @staticmethod
+    def _cache_key(query: str, page_token: Optional[str], max_results: int) -> Tuple:
+        """Normalize case and whitespace so equivalent searches share an entry"""
+        return (" ".join(query.split()).casefold(), page_token or "", max_results)
+    
+    @classmethod
+    def _cache_ttls(cls) -> Tuple[float, float]:
+        """
+        Fresh and stale TTLs for search results
+        
+        TTLs scale with 1 / (fraction of daily quota remaining), so entries
+        live longer as the budget runs low, up to SEARCH_CACHE_MAX_TTL.
+        """
+        remaining_fraction = quota_ledger.remaining_fraction()
+        base_ttl = settings.SEARCH_CACHE_TTL
+        ttl = min(base_ttl / max(remaining_fraction, base_ttl / settings.SEARCH_CACHE_MAX_TTL), settings.SEARCH_CACHE_MAX_TTL)
+        return ttl, ttl * settings.SEARCH_CACHE_STALE_FACTOR
+    
+    @classmethod
+    def _start_search(
+        cls,
+        key: Tuple,
+        query: str,
+        max_results: int,
+        page_token: Optional[str]
+    ) -> asyncio.Task:
+        """Start (or join) the API fetch for a key, so concurrent misses cost one call"""
+        task = cls._search_inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(cls._fetch_and_cache(key, query, max_results, page_token))
+            cls._search_inflight[key] = task
+            task.add_done_callback(lambda _: cls._search_inflight.pop(key, None))
+        return task
+    
+    @classmethod
+    async def _search_and_cache(
+        cls,
+        key: Tuple,
+        query: str,
+        max_results: int,
+        page_token: Optional[str]
+    ) -> Tuple[bool, Dict]:
+        """Wait for the shared fetch; a cancelled caller does not cancel it for others"""
+        return await asyncio.shield(cls._start_search(key, query, max_results, page_token))
+    
+    @classmethod
+    async def _fetch_and_cache(
+        cls,
+        key: Tuple,
+        query: str,
+        max_results: int,
+        page_token: Optional[str]
+    ) -> Tuple[bool, Dict]:
+        success, data = await cls._fetch_search(query, max_results, page_token)
+        if success:
+            ttl, stale_ttl = cls._cache_ttls()
+            await cls._search_cache.aset(key, data, ttl, stale_ttl)
+        return success, data
+    
+    @classmethod
+    def _schedule_refresh(cls, key: Tuple, query: str, max_results: int, page_token: Optional[str]):
+        """Revalidate a stale entry in the background, once per key"""
+        cls._start_search(key, query, max_results, page_token)
+    
+    @classmethod
+    def cache_stats(cls) -> Dict:
+        """Search cache statistics"""
+        stats = cls._search_cache.stats()
+        stats["fresh_ttl_seconds"], stats["stale_ttl_seconds"] = cls._cache_ttls()
+        return stats
+    
+    @classmethod
+    async def _fetch_search(
+        cls,
+        query: str,
+        max_results: int,
+        page_token: Optional[str]
+    ) -> Tuple[bool, Dict]:
+        """Call search.list and convert the response"""
         try:
-            if not cls.is_initialized():
-                return False, {"error": "YouTube API not initialized", "error_code": "API_NOT_INITIALIZED"}
-            
-            if not query or not query.strip():
-                return False, {"error": "Search query cannot be empty", "error_code": "EMPTY_QUERY"}
-            
-            if max_results > 50:
-                max_results = 50
-            if max_results < 1:
-                max_results = 1
-            
             # Search request
-            request = cls._youtube_client.search().list(
-                part='snippet',
-                q=query,
-                type='video',
-                maxResults=max_results,
-                order='relevance',
-                pageToken=page_token,
-                fields='items(id/videoId,snippet(title,description,thumbnails/default/url,channelTitle,publishedAt)),nextPageToken,prevPageToken'
-            )
-            
-            response = request.execute()
+            quota_ledger.charge('search.list')
+            response = await cls._youtube_client.get('search', {
+                'part': 'snippet',
+                'q': query,
+                'type': 'video',
+                'maxResults': max_results,
+                'order': 'relevance',
+                'pageToken': page_token,
+                'fields': 'items(id/videoId,snippet(title,description,thumbnails/default/url,channelTitle,publishedAt)),nextPageToken,prevPageToken'
+            })
             
             # Extract video data
             videos = []
@@ -85,7 +212,11 @@ class YouTubeSearchService:
                     'thumbnail': snippet['thumbnails']['default']['url'],
                     'channel': snippet['channelTitle'],
                     'published_at': snippet['publishedAt'],
-                    'url': f'https://www.youtube.com/watch?v={video_id}'
+                    'url': f'https://www.youtube.com/watch?v={video_id}',
+                    # Filled in by hydration; present anyway so results match VideoSearchResult
+                    'duration': None,
+                    'views': None,
+                    'likes': None,
                 })
             
             return True, {
@@ -95,8 +226,9 @@ class YouTubeSearchService:
                 'total_results': len(videos)
             }
         
-        except HttpError as e:
-            error_msg = f"YouTube API error: {e.resp.status} - {e.content.decode('utf-8')}"
+        except YouTubeApiError as e:
+            cls._check_quota_error(e)
+            error_msg = f"YouTube API error: {e.status} - {e.message}"
             logger.error(error_msg)
             return False, {"error": error_msg, "error_code": "YOUTUBE_API_ERROR"}
         
@@ -116,48 +248,86 @@ class YouTubeSearchService:
         Returns:
             Tuple of (success, data/error)
         """
+        if not video_id or not video_id.strip():
+            return False, {"error": "Video ID cannot be empty", "error_code": "EMPTY_VIDEO_ID"}
+        
+        success, data = await cls.get_videos_details([video_id])
+        if not success:
+            return False, data
+        
+        if not data['videos'] and data['quota_limited']:
+            # Not looked up at all, so we cannot say the video does not exist
+            return False, {
+                "error": "Video details are limited to cached results until the daily API quota resets",
+                "error_code": "QUOTA_EXHAUSTED",
+                "retry_after_seconds": round(quota_ledger.seconds_until_reset()),
+            }
+        if not data['videos']:
+            return False, {"error": "Video not found", "error_code": "VIDEO_NOT_FOUND"}
+        
+        return True, data['videos'][0]
+    
+    @classmethod
+    async def get_videos_details(cls, video_ids: List[str], cached_only: bool = False) -> Tuple[bool, Dict]:
+        """
+        Get detailed information about many videos
+        
+        Uncached IDs are fetched with one videos.list call per 50 IDs (1 quota
+        unit each, the same cost as a single-ID lookup). When the API may not
+        be called, stale cached details are served instead.
+        
+        Args:
+            video_ids: YouTube video IDs
+            cached_only: Do not call the API; uncached IDs are reported missing
+        
+        Returns:
+            Tuple of (success, {'videos': [...] in request order, 'missing': [...],
+            'quota_limited': True when uncached IDs were not looked up because of the quota})
+        """
         try:
             if not cls.is_initialized():
                 return False, {"error": "YouTube API not initialized", "error_code": "API_NOT_INITIALIZED"}
             
-            if not video_id or not video_id.strip():
-                return False, {"error": "Video ID cannot be empty", "error_code": "EMPTY_VIDEO_ID"}
+            # Preserve order and drop duplicates/blanks
+            wanted = list(dict.fromkeys(v.strip() for v in video_ids if v and v.strip()))
             
-            request = cls._youtube_client.videos().list(
-                part='snippet,contentDetails,statistics',
-                id=video_id,
-                fields='items(id,snippet(title,description,thumbnails/high/url,channelTitle,publishedAt),contentDetails(duration),statistics(viewCount,likeCount))'
-            )
+            found: Dict[str, Dict] = {}
+            stale: Dict[str, Dict] = {}
+            to_fetch = []
+            lookups = await asyncio.gather(*[cls._details_cache.aget(video_id) for video_id in wanted])
+            for video_id, (cached, state) in zip(wanted, lookups):
+                if state == FRESH:
+                    found[video_id] = cached
+                else:
+                    if state == STALE:
+                        stale[video_id] = cached
+                    to_fetch.append(video_id)
             
-            response = request.execute()
+            quota_limited = False
+            if to_fetch and (cached_only or not quota_ledger.allows('videos.list')):
+                quota_limited = not cached_only
+                found.update(stale)
+                to_fetch = []
             
-            if not response.get('items'):
-                return False, {"error": "Video not found", "error_code": "VIDEO_NOT_FOUND"}
-            
-            item = response['items'][0]
-            snippet = item['snippet']
-            details = item.get('contentDetails', {})
-            stats = item.get('statistics', {})
-            
-            # Parse ISO 8601 duration to seconds
-            duration_str = details.get('duration', 'PT0S')
-            duration_seconds = cls._parse_duration(duration_str)
+            batches = [to_fetch[i:i + VIDEOS_LIST_BATCH] for i in range(0, len(to_fetch), VIDEOS_LIST_BATCH)]
+            responses = await asyncio.gather(*[cls._fetch_details_batch(batch) for batch in batches])
+            fetched = [cls._parse_video_item(item) for items in responses for item in items]
+            await asyncio.gather(*[
+                cls._details_cache.aset(video['video_id'], video, settings.DETAILS_CACHE_TTL, settings.DETAILS_CACHE_STALE_TTL)
+                for video in fetched
+            ])
+            for video in fetched:
+                found[video['video_id']] = video
             
             return True, {
-                'video_id': video_id,
-                'title': snippet['title'],
-                'description': snippet['description'],
-                'thumbnail': snippet['thumbnails']['high']['url'],
-                'channel': snippet['channelTitle'],
-                'published_at': snippet['publishedAt'],
-                'duration': duration_seconds,
-                'views': stats.get('viewCount', '0'),
-                'likes': stats.get('likeCount', '0'),
-                'url': f'https://www.youtube.com/watch?v={video_id}'
+                'videos': [found[v] for v in wanted if v in found],
+                'missing': [v for v in wanted if v not in found],
+                'quota_limited': quota_limited,
             }
         
-        except HttpError as e:
-            error_msg = f"YouTube API error: {e.resp.status}"
+        except YouTubeApiError as e:
+            cls._check_quota_error(e)
+            error_msg = f"YouTube API error: {e.status}"
             logger.error(error_msg)
             return False, {"error": error_msg, "error_code": "YOUTUBE_API_ERROR"}
         
@@ -166,6 +336,74 @@ class YouTubeSearchService:
             logger.error(error_msg)
             return False, {"error": error_msg, "error_code": "DETAILS_ERROR"}
     
+    @classmethod
+    async def _fetch_details_batch(cls, video_ids: List[str]) -> List[Dict]:
+        """One videos.list call for up to 50 IDs"""
+        quota_ledger.charge('videos.list')
+        response = await cls._youtube_client.get('videos', {
+            'part': 'snippet,contentDetails,statistics',
+            'id': ','.join(video_ids),
+            'maxResults': len(video_ids),
+            'fields': 'items(id,snippet(title,description,thumbnails/high/url,channelTitle,publishedAt),contentDetails(duration),statistics(viewCount,likeCount))'
+        })
+        return response.get('items', [])
+    
+    @staticmethod
+    def _check_quota_error(error: YouTubeApiError):
+        """Stop calling the API for the day once Google reports the quota is gone"""
+        if error.status == 403 and error.reason in ('quotaExceeded', 'dailyLimitExceeded'):
+            quota_ledger.mark_exhausted()
+    
+    @classmethod
+    def _parse_video_item(cls, item: Dict) -> Dict:
+        """Convert a videos.list item into our details dict"""
+        video_id = item['id']
+        snippet = item['snippet']
+        details = item.get('contentDetails', {})
+        stats = item.get('statistics', {})
+        
+        # Parse ISO 8601 duration to seconds
+        duration_str = details.get('duration', 'PT0S')
+        duration_seconds = cls._parse_duration(duration_str)
+        
+        return {
+            'video_id': video_id,
+            'title': snippet['title'],
+            'description': snippet['description'],
+            'thumbnail': snippet['thumbnails']['high']['url'],
+            'channel': snippet['channelTitle'],
+            'published_at': snippet['publishedAt'],
+            'duration': duration_seconds,
+            'views': stats.get('viewCount', '0'),
+            'likes': stats.get('likeCount', '0'),
+            'url': f'https://www.youtube.com/watch?v={video_id}'
+        }
+    
+    @classmethod
+    async def hydrate_results(cls, data: Dict) -> Dict:
+        """
+        Add duration, views and likes to a page of search results
+        
+        The whole page costs a single videos.list call (or none if the
+        details are cached). Returns a new dict; cached search data is not modified.
+        """
+        videos = data.get('videos', [])
+        # When conserving quota, hydrate only from already cached details
+        cached_only = quota_ledger.degradation_level() != NORMAL
+        success, details = await cls.get_videos_details([v['video_id'] for v in videos], cached_only=cached_only)
+        if not success:
+            logger.warning(f"Search hydration failed: {details.get('error')}")
+            return data
+        
+        by_id = {d['video_id']: d for d in details['videos']}
+        hydrated = []
+        for video in videos:
+            extra = by_id.get(video['video_id'])
+            if extra:
+                video = {**video, 'duration': extra['duration'], 'views': extra['views'], 'likes': extra['likes']}
+            hydrated.append(video)
+        return {**data, 'videos': hydrated}
+    
     @staticmethod
     def _parse_duration(duration_str: str) -> int:
         """
@@ -2,19 +2,45 @@ import asyncio
 import logging
 import sys
 import os
+import time
+from concurrent.futures import Executor
 from typing import List, Dict, Optional, Tuple
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
-import yt_dlp
-from schemas import FormatInfo
+from schemas import FormatRecord
 from config import get_settings
 from utils import sanitize_filename, extract_video_id, ensure_temp_dir
+from .cache import SharedTTLCache, MISS
+from .state_backend import state_backend
+from .metrics import timed, bytes_downloaded_total
+from .tracing import traced
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+
+def _is_download_error(e: Exception) -> bool:
+    """isinstance(e, yt_dlp.utils.DownloadError), without importing yt-dlp if nothing has yet"""
+    yt_dlp = sys.modules.get("yt_dlp")
+    return yt_dlp is not None and isinstance(e, yt_dlp.utils.DownloadError)
+
+
 class YtDlpService:
     """Service for interacting with yt-dlp"""
     
+    # Format metadata keyed by video ID: {'data': ..., 'prefetched': bool}
+    _formats_cache = SharedTTLCache(
+        settings.FORMATS_CACHE_MAX_ENTRIES, state_backend, "formats",
+        encode=lambda entry: {**entry['data'], 'formats': [f.to_dict() for f in entry['data']['formats']]},
+        decode=lambda data: {'data': {**data, 'formats': [FormatRecord(**f) for f in data['formats']]}, 'prefetched': False},
+    )
+    _formats_inflight: Dict[str, asyncio.Task] = {}
+    
+    # Foreground (user-initiated) yt-dlp jobs currently running
+    active_jobs = 0
+    
+    # Prefetch effectiveness
+    prefetch_stats = {'prefetched': 0, 'hits': 0}
+    
     @staticmethod
     def _get_ydl_opts(download: bool = False, format_id: str = None, output_path: str = None) -> dict:
         """Get yt-dlp options"""
@@ -49,11 +75,77 @@ class YtDlpService:
         return opts
 
     @staticmethod
-    async def fetch_formats(url: str) -> Tuple[bool, Dict]:
+    def warm_up():
+        """
+        Import yt-dlp and set up its YouTube extractor (blocking, for an executor thread)
+
+        yt-dlp is imported where it is first used, since it is the slowest
+        import in the app. This pays that cost, and the first YoutubeDL's
+        extractor setup, before a request does.
+        """
+        import yt_dlp
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+            ydl.get_info_extractor('Youtube')
+
+    @staticmethod
+    def _cache_key(url: str) -> str:
+        return extract_video_id(url) or url
+    
+    @staticmethod
+    def is_cached(url: str) -> bool:
+        """Whether format metadata for this URL is cached or being fetched"""
+        key = YtDlpService._cache_key(url)
+        return key in YtDlpService._formats_inflight or key in YtDlpService._formats_cache
+    
+    @staticmethod
+    async def fetch_formats(url: str, executor: Optional[Executor] = None, prefetch: bool = False) -> Tuple[bool, Dict]:
         """
         Fetch all available formats for a YouTube video
+        
+        Results are cached per video ID, and concurrent requests for the same
+        video share one extraction. Prefetches pass their own executor so they
+        never occupy the threads used by user requests.
         Returns: (success: bool, data: dict with formats or error info)
         """
+        key = YtDlpService._cache_key(url)
+        entry, state = await YtDlpService._formats_cache.aget(key)
+        if state == MISS:
+            task = YtDlpService._formats_inflight.get(key)
+            if task is None:
+                task = asyncio.create_task(YtDlpService._extract_and_cache(key, url, executor, prefetch))
+                YtDlpService._formats_inflight[key] = task
+                task.add_done_callback(lambda _: YtDlpService._formats_inflight.pop(key, None))
+            success, data = await asyncio.shield(task)
+            if not success:
+                return False, data
+            entry = YtDlpService._formats_cache.peek(key) or {'data': data, 'prefetched': False}
+        
+        if entry['prefetched'] and not prefetch:
+            # First user request served by a prefetch (cached or still running)
+            entry['prefetched'] = False
+            YtDlpService.prefetch_stats['hits'] += 1
+        return True, {**entry['data'], 'download_url': url}
+    
+    @staticmethod
+    async def _extract_and_cache(key: str, url: str, executor: Optional[Executor], prefetch: bool) -> Tuple[bool, Dict]:
+        if not prefetch:
+            YtDlpService.active_jobs += 1
+        try:
+            success, data = await YtDlpService._extract_formats(url, executor)
+        finally:
+            if not prefetch:
+                YtDlpService.active_jobs -= 1
+        if success:
+            await YtDlpService._formats_cache.aset(key, {'data': data, 'prefetched': prefetch}, settings.FORMATS_CACHE_TTL)
+            if prefetch:
+                YtDlpService.prefetch_stats['prefetched'] += 1
+        return success, data
+    
+    @staticmethod
+    @timed("fetch_formats")
+    @traced("ytdlp.extract")
+    async def _extract_formats(url: str, executor: Optional[Executor] = None) -> Tuple[bool, Dict]:
+        """Run yt-dlp extraction (uncached)"""
         try:
             logger.info(f"Fetching formats for URL: {url}")
             
@@ -63,10 +155,11 @@ class YtDlpService:
             loop = asyncio.get_event_loop()
             
             def extract_info():
+                import yt_dlp
                 with yt_dlp.YoutubeDL(opts) as ydl:
                     return ydl.extract_info(url, download=False)
             
-            info = await loop.run_in_executor(None, extract_info)
+            info = await loop.run_in_executor(executor, extract_info)
             
             if not info:
                 return False, {"error": "Could not fetch video information"}
@@ -110,17 +203,16 @@ class YtDlpService:
                 'download_url': url,
             }
         
-        except yt_dlp.utils.DownloadError as e:
-            logger.error(f"yt-dlp DownloadError: {str(e)}")
-            return False, {"error": str(e), "error_code": "DOWNLOAD_ERROR"}
-        
         except Exception as e:
+            if _is_download_error(e):
+                logger.error(f"yt-dlp DownloadError: {str(e)}")
+                return False, {"error": str(e), "error_code": "DOWNLOAD_ERROR"}
             logger.error(f"Error fetching formats: {str(e)}")
             return False, {"error": f"Failed to fetch formats: {str(e)}", "error_code": "FETCH_ERROR"}
 
     @staticmethod
-    def _process_formats(formats: List[Dict]) -> List[FormatInfo]:
-        """Process raw yt-dlp formats into our FormatInfo objects"""
+    def _process_formats(formats: List[Dict]) -> List[FormatRecord]:
+        """Process raw yt-dlp formats into our FormatRecord objects"""
         processed = []
         seen_ids = set()
         
@@ -171,7 +263,7 @@ class YtDlpService:
             
             format_name = " ".join(format_parts) if format_parts else f"Format {format_id}"
             
-            format_info = FormatInfo(
+            format_info = FormatRecord(
                 format_id=format_id,
                 format_name=format_name,
                 ext=ext,
@@ -200,11 +292,23 @@ class YtDlpService:
         return processed
 
     @staticmethod
-    async def download_format(url: str, format_id: str, output_path: str) -> Tuple[bool, str]:
+    async def download_format(url: str, format_id: str, output_path: str, stats: Optional[Dict] = None) -> Tuple[bool, str]:
         """
         Download a specific format
+
+        If `stats` is given, the CPU time spent in yt-dlp is added to stats['cpu_seconds'].
         Returns: (success: bool, message: str)
         """
+        YtDlpService.active_jobs += 1
+        try:
+            return await YtDlpService._download_format(url, format_id, output_path, stats)
+        finally:
+            YtDlpService.active_jobs -= 1
+    
+    @staticmethod
+    @timed("download_format")
+    @traced("ytdlp.download")
+    async def _download_format(url: str, format_id: str, output_path: str, stats: Optional[Dict] = None) -> Tuple[bool, str]:
         try:
             logger.info(f"Starting download: URL={url}, format={format_id}, output={output_path}")
             
@@ -219,7 +323,9 @@ class YtDlpService:
             download_errors = []
             
             def download():
+                cpu_start = time.thread_time()
                 try:
+                    import yt_dlp
                     with yt_dlp.YoutubeDL(opts) as ydl:
                         logger.info(f"YoutubeDL starting download with format: {format_id}")
                         result = ydl.download([url])
@@ -229,6 +335,9 @@ class YtDlpService:
                     logger.error(f"YoutubeDL error: {str(e)}")
                     download_errors.append(str(e))
                     raise
+                finally:
+                    if stats is not None:
+                        stats['cpu_seconds'] = stats.get('cpu_seconds', 0.0) + time.thread_time() - cpu_start
             
             result = await loop.run_in_executor(None, download)
             
@@ -236,6 +345,7 @@ class YtDlpService:
                 logger.info(f"Successfully downloaded format {format_id}")
                 if os.path.exists(output_path):
                     file_size = os.path.getsize(output_path)
+                    bytes_downloaded_total.inc(file_size)
                     logger.info(f"Output file size: {file_size} bytes")
                     return True, "Download successful"
                 else:
@@ -269,7 +379,30 @@ class YtDlpService:
             return False
 
     @staticmethod
-    def get_best_audio_format(formats: List[FormatInfo]) -> Optional[FormatInfo]:
+    def response_content(data: Dict) -> Dict:
+        """
+        A successful fetch_formats result as FetchFormatsResponse content, in plain JSON types
+
+        The format records are already in FormatInfo's shape, so this is
+        the only copy made of them on the way to the response body.
+        """
+        duration = data.get('duration')
+        return {
+            'success': True,
+            'video_id': data.get('video_id'),
+            'title': data.get('title'),
+            'duration': int(duration) if duration is not None else None,
+            'thumbnail': data.get('thumbnail'),
+            'formats': [f.to_dict() for f in data.get('formats', [])],
+            'age_restricted': data.get('age_restricted', False),
+            'is_live': data.get('is_live', False),
+            'download_url': data.get('download_url'),
+            'error': None,
+            'error_code': None,
+        }
+
+    @staticmethod
+    def get_best_audio_format(formats: List[FormatRecord]) -> Optional[FormatRecord]:
         """Get best audio-only format from formats list"""
         audio_formats = [f for f in formats if f.acodec and not f.vcodec]
         if audio_formats:
@@ -277,7 +410,7 @@ class YtDlpService:
         return None
 
     @staticmethod
-    def get_best_video_format(formats: List[FormatInfo]) -> Optional[FormatInfo]:
+    def get_best_video_format(formats: List[FormatRecord]) -> Optional[FormatRecord]:
         """Get best combined video+audio format from formats list"""
         video_formats = [f for f in formats if f.vcodec and f.acodec]
         if video_formats:
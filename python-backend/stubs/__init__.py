@@ -0,0 +1 @@
+# Local stand-ins for external services (tests and benchmarks)
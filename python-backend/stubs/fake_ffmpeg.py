@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+FFmpeg stand-in for offline benchmarks
+
+Parses the subset of the FFmpeg command line the converter uses, writes
+every output as a copy of the inputs (concatenated, for merges) and
+prints the `-benchmark` summary line the converter reads CPU time from.
+FAKE_FFMPEG_CPU_MS_PER_MB spends that much CPU per input MB, to model
+encoding cost. Installed as `ffmpeg` on PATH by benchmarks.bench_load.
+"""
+
+import os
+import resource
+import shutil
+import sys
+import time
+
+# Options that take no value
+FLAGS = {"-y", "-n", "-benchmark", "-vn", "-an", "-sn", "-nostdin", "-hide_banner", "-stats", "-nostats"}
+
+
+def parse(args):
+    inputs, outputs = [], []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "-i":
+            inputs.append(args[i + 1])
+            i += 2
+        elif arg.startswith("-") and arg != "-":
+            i += 1 if arg in FLAGS else 2
+        else:
+            outputs.append(arg)
+            i += 1
+    return inputs, outputs
+
+
+def burn_cpu(seconds: float):
+    deadline = time.process_time() + seconds
+    while time.process_time() < deadline:
+        pass
+
+
+def main(args) -> int:
+    inputs, outputs = parse(args)
+    if not inputs or not outputs:
+        print("fake ffmpeg: need at least one -i input and one output", file=sys.stderr)
+        return 1
+    missing = [path for path in inputs if not os.path.exists(path)]
+    if missing:
+        print(f"{missing[0]}: No such file or directory", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    input_mb = sum(os.path.getsize(path) for path in inputs) / (1024 * 1024)
+    burn_cpu(float(os.getenv("FAKE_FFMPEG_CPU_MS_PER_MB", "0")) * input_mb / 1000)
+    for output in outputs:
+        with open(output, "wb") as out:
+            for path in inputs:
+                with open(path, "rb") as source:
+                    shutil.copyfileobj(source, out, 1024 * 1024)
+
+    if "-benchmark" in args:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        print(
+            f"bench: utime={usage.ru_utime:.3f}s stime={usage.ru_stime:.3f}s rtime={time.perf_counter() - start:.3f}s",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,172 @@
+"""
+Offline stand-in for yt-dlp's YouTube extractor
+
+install() replaces yt_dlp.YoutubeDL with FakeYoutubeDL, which answers
+extract_info with a format list shaped like a real YouTube response (the
+usual itags, codecs and sizes, scaled to the video's duration) and
+"downloads" by writing synthetic media in fragments. Latency, extractor
+CPU time and download throughput come from the environment:
+
+    FAKE_EXTRACT_MS          wall time per extract_info call (default 150)
+    FAKE_EXTRACT_CPU_MS      CPU time per extract_info call, holding the GIL (default 15)
+    FAKE_DOWNLOAD_MBPS       download throughput in MB/s, 0 for unthrottled (default 0)
+    FAKE_VIDEO_MB            size of a downloaded video format (default 4)
+    FAKE_AUDIO_MB            size of a downloaded audio-only format (default 1)
+
+Video IDs starting with "private" fail like a private video.
+"""
+
+import hashlib
+import os
+import re
+import time
+from typing import Dict, List
+import yt_dlp
+from yt_dlp.utils import DownloadError
+
+FRAGMENT_SIZE = 256 * 1024
+_FRAGMENT = os.urandom(FRAGMENT_SIZE)
+
+# (format_id, ext, vcodec, acodec, height, fps, kbps, note) as YouTube lists them for a 1080p60 upload
+RECORDED_FORMATS = [
+    ("sb2", "mhtml", "none", "none", 45, 0, 0, "storyboard"),
+    ("sb1", "mhtml", "none", "none", 90, 0, 0, "storyboard"),
+    ("sb0", "mhtml", "none", "none", 180, 0, 0, "storyboard"),
+    ("139", "m4a", "none", "mp4a.40.5", None, None, 49, "low"),
+    ("249", "webm", "none", "opus", None, None, 53, "low"),
+    ("250", "webm", "none", "opus", None, None, 70, "low"),
+    ("140", "m4a", "none", "mp4a.40.2", None, None, 130, "medium"),
+    ("251", "webm", "none", "opus", None, None, 135, "medium"),
+    ("160", "mp4", "avc1.4d400c", "none", 144, 30, 80, "DASH video"),
+    ("278", "webm", "vp9", "none", 144, 30, 90, "DASH video"),
+    ("133", "mp4", "avc1.4d4015", "none", 240, 30, 180, "DASH video"),
+    ("242", "webm", "vp9", "none", 240, 30, 200, "DASH video"),
+    ("134", "mp4", "avc1.4d401e", "none", 360, 30, 400, "DASH video"),
+    ("18", "mp4", "avc1.42001E", "mp4a.40.2", 360, 30, 520, "360p"),
+    ("243", "webm", "vp9", "none", 360, 30, 380, "DASH video"),
+    ("135", "mp4", "avc1.4d401f", "none", 480, 30, 750, "DASH video"),
+    ("244", "webm", "vp9", "none", 480, 30, 700, "DASH video"),
+    ("136", "mp4", "avc1.4d401f", "none", 720, 30, 1500, "DASH video"),
+    ("247", "webm", "vp9", "none", 720, 30, 1400, "DASH video"),
+    ("298", "mp4", "avc1.4d4020", "none", 720, 60, 2600, "DASH video"),
+    ("302", "webm", "vp9", "none", 720, 60, 2400, "DASH video"),
+    ("137", "mp4", "avc1.640028", "none", 1080, 30, 3000, "DASH video"),
+    ("248", "webm", "vp9", "none", 1080, 30, 2700, "DASH video"),
+    ("299", "mp4", "avc1.64002a", "none", 1080, 60, 5200, "DASH video"),
+    ("303", "webm", "vp9", "none", 1080, 60, 4600, "DASH video"),
+]
+
+_VIDEO_ID = re.compile(r"(?:v=|youtu\.be/|shorts/)([\w-]{11})")
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _burn_cpu(seconds: float):
+    deadline = time.thread_time() + seconds
+    while time.thread_time() < deadline:
+        pass
+
+
+def video_info(video_id: str) -> Dict:
+    """The info dict extract_info returns for a video, deterministic per ID"""
+    seed = int(hashlib.sha256(video_id.encode("utf-8")).hexdigest()[:8], 16)
+    duration = 120 + seed % 480
+    formats: List[Dict] = []
+    for format_id, ext, vcodec, acodec, height, fps, kbps, note in RECORDED_FORMATS:
+        fmt = {
+            "format_id": format_id,
+            "format_note": note,
+            "ext": ext,
+            "vcodec": vcodec,
+            "acodec": acodec,
+            "url": f"https://rr1---sn-fake.googlevideo.com/videoplayback?id={video_id}&itag={format_id}",
+            "protocol": "mhtml" if ext == "mhtml" else "https",
+            "duration": duration,
+        }
+        if height:
+            fmt.update(height=height, width=height * 16 // 9, fps=fps)
+        if kbps:
+            fmt["tbr"] = kbps
+            fmt["abr" if vcodec == "none" else "vbr"] = kbps
+            fmt["filesize"] = kbps * 1000 // 8 * duration
+        formats.append(fmt)
+    return {
+        "id": video_id,
+        "title": f"Offline video {video_id} – synthetic “{seed % 1000}”",
+        "duration": duration,
+        "thumbnail": f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg",
+        "uploader": f"Channel {video_id[:3]}",
+        "view_count": seed % 10_000_000,
+        "formats": formats,
+    }
+
+
+class FakeYoutubeDL:
+    """Implements the parts of yt_dlp.YoutubeDL the backend uses"""
+
+    def __init__(self, params: Dict = None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def get_info_extractor(self, ie_key: str):
+        return None
+
+    def _info(self, url: str) -> Dict:
+        match = _VIDEO_ID.search(url)
+        if not match:
+            raise DownloadError(f"ERROR: Unsupported URL: {url}")
+        video_id = match.group(1)
+        _burn_cpu(_env_float("FAKE_EXTRACT_CPU_MS", 15) / 1000)
+        time.sleep(_env_float("FAKE_EXTRACT_MS", 150) / 1000)
+        if video_id.startswith("private"):
+            raise DownloadError(f"ERROR: [youtube] {video_id}: Private video. Sign in if you've been granted access to this video")
+        return video_info(video_id)
+
+    def extract_info(self, url: str, download: bool = False, **kwargs) -> Dict:
+        info = self._info(url)
+        if download:
+            self.download([url])
+        return info
+
+    def download(self, urls: List[str]) -> int:
+        for url in urls:
+            info = self._info(url)
+            format_ids = str(self.params.get("format", "18")).split("+")
+            known = {f["format_id"]: f for f in info["formats"]}
+            if any(format_id not in known for format_id in format_ids):
+                raise DownloadError("ERROR: [youtube] Requested format is not available")
+            audio_only = all(known[format_id]["vcodec"] == "none" for format_id in format_ids)
+            size = int(_env_float("FAKE_AUDIO_MB" if audio_only else "FAKE_VIDEO_MB", 1 if audio_only else 4) * 1024 * 1024)
+            self._write(self.params.get("outtmpl") or f"{info['id']}.{known[format_ids[0]]['ext']}", size)
+        return 0
+
+    def _write(self, path: str, size: int):
+        mbps = _env_float("FAKE_DOWNLOAD_MBPS", 0)
+        hooks = self.params.get("progress_hooks") or []
+        start = time.perf_counter()
+        written = 0
+        with open(path, "wb") as f:
+            while written < size:
+                chunk = _FRAGMENT[:min(FRAGMENT_SIZE, size - written)]
+                f.write(chunk)
+                written += len(chunk)
+                if mbps:
+                    ahead = written / (mbps * 1024 * 1024) - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                for hook in hooks:
+                    hook({"status": "downloading", "filename": path, "downloaded_bytes": written, "total_bytes": size})
+        for hook in hooks:
+            hook({"status": "finished", "filename": path, "downloaded_bytes": written, "total_bytes": size})
+
+
+def install():
+    """Route every yt_dlp.YoutubeDL the backend creates to FakeYoutubeDL"""
+    yt_dlp.YoutubeDL = FakeYoutubeDL
@@ -0,0 +1,116 @@
+"""
+Run several backend nodes locally as one consistent-hash cluster
+
+Starts N uvicorn processes on consecutive ports, each configured with the
+others as peers, then (with --check) sends requests for a set of video IDs
+to random nodes and reports which node served each one:
+
+    python -m stubs.local_cluster --nodes 3 --check
+    python -m stubs.local_cluster --nodes 3 --mode redirect --state-backend sqlite
+
+Press Ctrl-C to stop the nodes.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+import aiohttp
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_nodes(args) -> List[subprocess.Popen]:
+    urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.nodes)]
+    processes = []
+    for i, url in enumerate(urls):
+        env = {
+            **os.environ,
+            "CLUSTER_ROUTING": args.mode,
+            "CLUSTER_SELF_URL": url,
+            "CLUSTER_PEERS": ",".join(urls),
+            "CLUSTER_HEALTH_INTERVAL": "1",
+            "STATE_BACKEND": args.state_backend,
+        }
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", args.app, "--port", str(args.base_port + i), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+        ))
+    return processes
+
+
+async def wait_healthy(urls: List[str], timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        for url in urls:
+            while True:
+                try:
+                    async with session.get(f"{url}/health") as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not become healthy")
+                await asyncio.sleep(0.2)
+
+
+async def check(urls: List[str], videos: int, rounds: int) -> Dict:
+    """Send every video to random entry nodes; each should always be served by one node"""
+    video_ids = [f"vid{i:08d}"[-11:] for i in range(videos)]
+    served: Dict[str, Counter] = defaultdict(Counter)
+    async with aiohttp.ClientSession() as session:
+        for _ in range(rounds):
+            for video_id in video_ids:
+                entry = random.choice(urls)
+                async with session.post(
+                    f"{entry}/api/fetch-formats",
+                    json={"url": f"https://www.youtube.com/watch?v={video_id}"},
+                ) as response:
+                    await response.read()
+                    served[video_id][response.headers.get("X-Served-By", "?")] += 1
+
+    consistent = sum(1 for counts in served.values() if len(counts) == 1)
+    per_node = Counter(counts.most_common(1)[0][0] for counts in served.values())
+    return {"videos": videos, "consistently_routed": consistent, "videos_per_node": dict(per_node)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local consistent-hash cluster")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=8100)
+    parser.add_argument("--mode", choices=["proxy", "redirect"], default="proxy")
+    parser.add_argument("--state-backend", default="memory")
+    parser.add_argument("--app", default="main:app", help="ASGI app to run on every node")
+    parser.add_argument("--check", action="store_true", help="Send test requests, print routing, then exit")
+    parser.add_argument("--videos", type=int, default=60)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.nodes)]
+    processes = start_nodes(args)
+    try:
+        asyncio.run(wait_healthy(urls))
+        print(f"{args.nodes} nodes up: {', '.join(urls)} (routing: {args.mode})")
+        if args.check:
+            print(asyncio.run(check(urls, args.videos, args.rounds)))
+            return
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""
+The backend app with yt-dlp replaced by stubs.fake_youtube, for offline benchmarks
+
+    uvicorn stubs.offline_app:app
+
+Put stubs/fake_ffmpeg.py on PATH as `ffmpeg` and point YOUTUBE_API_BASE_URL
+at stubs.youtube_data_api to run fully offline (benchmarks.bench_load does both).
+"""
+
+from stubs import fake_youtube
+
+fake_youtube.install()
+
+from main import app  # noqa: E402
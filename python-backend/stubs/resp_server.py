@@ -0,0 +1,162 @@
+"""
+Local in-memory stand-in for Redis (RESP2, the commands the state backend uses)
+
+Lets several workers or instances share state in tests without a Redis
+install:
+
+    python -m stubs.resp_server --port 6390
+    STATE_BACKEND=redis STATE_REDIS_URL=redis://127.0.0.1:6390/0 uvicorn main:app --workers 4
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class RespStore:
+    """Key space with millisecond expiry, shared by every connection"""
+
+    def __init__(self):
+        # {key: (value, expires_at or None)}
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+
+    def live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, args: List[bytes]):
+        command = args[0].upper().decode()
+        handler = getattr(self, f"cmd_{command.lower()}", None)
+        if handler is None:
+            return Exception(f"ERR unknown command '{command}'")
+        try:
+            return handler(*args[1:])
+        except (TypeError, ValueError):
+            return Exception(f"ERR wrong arguments for '{command}'")
+
+    def cmd_ping(self, message: bytes = None):
+        return message if message is not None else "PONG"
+
+    def cmd_select(self, db: bytes):
+        return "OK"
+
+    def cmd_auth(self, *credentials: bytes):
+        return "OK"
+
+    def cmd_get(self, key: bytes):
+        entry = self.live(key)
+        return entry[0] if entry else None
+
+    def cmd_set(self, key: bytes, value: bytes, *options: bytes):
+        expires_at = None
+        options = [o.upper() for o in options]
+        if b"PX" in options:
+            expires_at = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+        elif b"EX" in options:
+            expires_at = time.monotonic() + int(options[options.index(b"EX") + 1])
+        self.data[key] = (value, expires_at)
+        return "OK"
+
+    def cmd_del(self, *keys: bytes):
+        removed = 0
+        for key in keys:
+            if self.live(key) is not None:
+                del self.data[key]
+                removed += 1
+        return removed
+
+    def cmd_incrbyfloat(self, key: bytes, amount: bytes):
+        entry = self.live(key)
+        value = (float(entry[0]) if entry else 0.0) + float(amount)
+        encoded = repr(value).encode()
+        self.data[key] = (encoded, entry[1] if entry else None)
+        return encoded
+
+    def cmd_pexpire(self, key: bytes, milliseconds: bytes):
+        entry = self.live(key)
+        if entry is None:
+            return 0
+        self.data[key] = (entry[0], time.monotonic() + int(milliseconds) / 1000)
+        return 1
+
+    def cmd_pttl(self, key: bytes):
+        entry = self.live(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return int((entry[1] - time.monotonic()) * 1000)
+
+    def cmd_dbsize(self):
+        return len(self.data)
+
+    def cmd_flushall(self):
+        self.data.clear()
+        return "OK"
+
+
+def encode_reply(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+def create_server(store: RespStore, host: str, port: int):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                if args[0].upper() == b"QUIT":
+                    writer.write(encode_reply("OK"))
+                    break
+                writer.write(encode_reply(store.execute(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return asyncio.start_server(handle, host, port)
+
+
+async def main(host: str, port: int):
+    server = await create_server(RespStore(), host, port)
+    print(f"RESP stand-in listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory Redis stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port))
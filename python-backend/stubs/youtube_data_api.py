@@ -0,0 +1,105 @@
+"""
+Local stub of the YouTube Data API v3 (search.list and videos.list)
+
+Returns deterministic synthetic results so the search service can be
+exercised offline. Point the backend at it with:
+
+    python -m stubs.youtube_data_api --port 8081
+    YOUTUBE_API_KEY=stub YOUTUBE_API_BASE_URL=http://127.0.0.1:8081/youtube/v3 uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+from typing import Dict
+from aiohttp import web
+
+
+def _video_id(seed: str) -> str:
+    """Stable 11-character video ID derived from a seed string"""
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    return "".join(alphabet[b % 64] for b in digest[:11])
+
+
+def _snippet(video_id: str, title: str, thumbnail_size: str) -> Dict:
+    return {
+        "title": title,
+        "description": f"Synthetic description for {title}",
+        "thumbnails": {thumbnail_size: {"url": f"https://i.ytimg.com/vi/{video_id}/{thumbnail_size}.jpg"}},
+        "channelTitle": f"Channel {video_id[:3]}",
+        "publishedAt": "2024-01-01T00:00:00Z",
+    }
+
+
+def create_app(latency_ms: float = 0.0, fail_rate: float = 0.0) -> web.Application:
+    """Build the stub app; latency and failure rate simulate a real backend"""
+    stats = {"search": 0, "videos": 0}
+
+    async def _simulate(request: web.Request):
+        if not request.query.get("key"):
+            raise web.HTTPForbidden(
+                text='{"error": {"code": 403, "message": "API key missing", "errors": [{"reason": "forbidden"}]}}',
+                content_type="application/json",
+            )
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000.0)
+        if fail_rate and random.random() < fail_rate:
+            raise web.HTTPServiceUnavailable(
+                text='{"error": {"code": 503, "message": "Backend error", "errors": [{"reason": "backendError"}]}}',
+                content_type="application/json",
+            )
+
+    async def search(request: web.Request) -> web.Response:
+        await _simulate(request)
+        stats["search"] += 1
+        query = request.query.get("q", "")
+        page = int(request.query.get("pageToken", "P0")[1:] or 0)
+        max_results = min(int(request.query.get("maxResults", "5")), 50)
+        items = []
+        for i in range(max_results):
+            video_id = _video_id(f"{query}:{page}:{i}")
+            items.append({
+                "id": {"kind": "youtube#video", "videoId": video_id},
+                "snippet": _snippet(video_id, f"{query} result {page * max_results + i + 1}", "default"),
+            })
+        body = {"items": items, "nextPageToken": f"P{page + 1}"}
+        if page > 0:
+            body["prevPageToken"] = f"P{page - 1}"
+        return web.json_response(body)
+
+    async def videos(request: web.Request) -> web.Response:
+        await _simulate(request)
+        stats["videos"] += 1
+        items = []
+        for video_id in request.query.get("id", "").split(","):
+            if not video_id:
+                continue
+            seed = int(hashlib.sha256(video_id.encode("utf-8")).hexdigest()[:8], 16)
+            items.append({
+                "id": video_id,
+                "snippet": _snippet(video_id, f"Video {video_id}", "high"),
+                "contentDetails": {"duration": f"PT{seed % 3}H{seed % 60}M{seed % 59}S"},
+                "statistics": {"viewCount": str(seed % 10_000_000), "likeCount": str(seed % 100_000)},
+            })
+        return web.json_response({"items": items})
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_get("/youtube/v3/search", search)
+    app.router.add_get("/youtube/v3/videos", videos)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local YouTube Data API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency_ms, args.fail_rate), host=args.host, port=args.port)
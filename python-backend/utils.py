@@ -67,28 +67,6 @@ def get_file_size_estimate(url: str, format_id: str) -> float:
     except Exception:
         return 0.0
 
-def cleanup_temp_files(max_age_hours: int = 24) -> None:
-    """Clean up old temporary files"""
-    settings = get_settings()
-    temp_dir = settings.TEMP_DOWNLOAD_DIR
-    
-    if not os.path.exists(temp_dir):
-        return
-    
-    import time
-    current_time = time.time()
-    max_age_seconds = max_age_hours * 3600
-    
-    for filename in os.listdir(temp_dir):
-        filepath = os.path.join(temp_dir, filename)
-        if os.path.isfile(filepath):
-            file_age = current_time - os.path.getmtime(filepath)
-            if file_age > max_age_seconds:
-                try:
-                    os.remove(filepath)
-                except Exception as e:
-                    print(f"Error removing temp file {filepath}: {e}")
-
 def extract_video_id(url: str) -> str:
     """Extract video ID from YouTube URL"""
     patterns = [